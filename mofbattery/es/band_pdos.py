@@ -6,6 +6,8 @@ from matplotlib.lines import Line2D
 from matplotlib.gridspec import GridSpec
 from mofbattery.es.plot_dos import PDOSPlotter, ATOM_COLORS
 from mofbattery.es.band_structure import BandStructure, filter_xticks_and_labels
+from mofbattery.es.projection import PDOSProjection
+from mofbattery.es.results import load_result
 
 
 def plot_combined(rkf_path, ylim=(-5, 5), shift_to_fermi=True, energy_window=0.2, save_path='combined.png'):
@@ -18,7 +20,9 @@ def plot_combined(rkf_path, ylim=(-5, 5), shift_to_fermi=True, energy_window=0.2
     ax_band = fig.add_subplot(gs[0])
     ax_pdos = fig.add_subplot(gs[1], sharey=ax_band)
 
-    band_plotter = BandStructure(rkf_path, ylim=ylim, shift_to_fermi=shift_to_fermi)
+    # one memoized reader for the band and the DOS part
+    result = load_result(rkf_path)
+    band_plotter = BandStructure(rkf_path, ylim=ylim, shift_to_fermi=shift_to_fermi, result=result)
     energies = band_plotter.get_energies()
     kpath, xtick_locs, xtick_labels_raw = band_plotter.get_kpoints_and_labels()
     fermi = band_plotter.get_fermi_energy()
@@ -50,9 +54,12 @@ def plot_combined(rkf_path, ylim=(-5, 5), shift_to_fermi=True, energy_window=0.2
     gap_label = f'Gap: {gap:.2f} eV'
 
     # --- PDOS ---
-    pdos_plotter = PDOSPlotter(rkf_path, ylim=ylim, shift_to_fermi=shift_to_fermi)
+    pdos_plotter = PDOSPlotter(rkf_path, ylim=ylim, shift_to_fermi=shift_to_fermi, result=result)
     energies_ev, full_energies_ev, raw_pdos, atoms, lvals, symbols, energy_mask, fermi_ev = pdos_plotter.load_data()
 
+    projection = PDOSProjection(symbols, atoms=atoms)
+    element_pdos = projection.by_element(raw_pdos[:, energy_mask])
+
     bottom = np.zeros_like(energies_ev)
     all_handles = []
     seen = set()
@@ -61,10 +68,7 @@ def plot_combined(rkf_path, ylim=(-5, 5), shift_to_fermi=True, energy_window=0.2
             continue
         seen.add(symbol)
 
-        indices = [i for i, s in enumerate(symbols) if s == symbol]
-        basis_indices = np.concatenate([np.where(atoms == (idx + 1))[0] for idx in indices])
-        pdos = raw_pdos[basis_indices, :]
-        pdos_sum = pdos.sum(axis=0)[energy_mask]
+        pdos_sum = element_pdos[projection.elements.index(symbol)]
         color = ATOM_COLORS.get(symbol, 'gray')
         ax_pdos.fill_betweenx(energies_ev, bottom, bottom + pdos_sum, color=color, label=symbol)
         bottom += pdos_sum
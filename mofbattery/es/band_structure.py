@@ -11,8 +11,8 @@ import numpy as np
 from ase import Atoms
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
-from read_rkf.parserkf import KFFile
 import seekpath
+from mofbattery.es.results import RKFResult
 
 plt.rcParams.update({'font.family': 'serif', 'font.size': 14})
 
@@ -30,11 +30,15 @@ class BandStructure:
         If True, shifts the Fermi level to 0 eV in the plot.
     save_path : str or None, optional
         If provided, the plot will be saved to the specified path instead of shown.
+    result : RKFResult or None, optional
+        Memoized reader of the RKF file, shared with other plotters of the same calculation.
     """
 
-    def __init__(self, path_to_band, ylim=(-5, 5), shift_to_fermi=True, save_path=None):
+    def __init__(self, path_to_band, ylim=(-5, 5), shift_to_fermi=True, save_path=None, result=None):
         self.path_to_band = path_to_band
-        self.rkf_data = KFFile(path_to_band)
+        self.result = result if result is not None else RKFResult(path_to_band)
+        # KFFile compatible, kept under its old name
+        self.rkf_data = self.result
         self.HaToEv = 27.2113845249047
         self.ylim = ylim
         self.shift_to_fermi = shift_to_fermi
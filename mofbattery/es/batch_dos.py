@@ -0,0 +1,359 @@
+"""
+Headless DOS/PDOS extraction and plotting for many AMS BAND RKF files.
+
+Every RKF file is handled by :class:`PDOSPlotter` in a worker process under
+the non-interactive Agg backend, and matplotlib is only imported by
+workers that plot. A failing file is recorded with its error
+and does not stop the batch. One summary row per file, with the Fermi
+level, the DOS at the Fermi level and the elements contributing most near
+it, is appended to a CSV table as soon as the file finishes.
+"""
+
+import os
+import sys
+import csv
+import glob
+import time
+import logging
+import argparse
+from collections import Counter
+import numpy as np
+from mofbattery.parallel import imap_isolated
+from mofbattery.es.plot_dos import PDOSPlotter
+from mofbattery.es.projection import PDOSProjection, window_integrals
+
+logger = logging.getLogger(__name__)
+
+# file stems that name the program, not the calculation
+GENERIC_STEMS = ('band', 'ams', 'dftb')
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+SUMMARY_FIELDS = ['rkf', 'name', 'status', 'error', 'fermi_ev',
+                  'dos_at_fermi', 'top_elements', 'seconds']
+
+
+def rkf_name(rkf_file):
+    """
+    Name of a calculation, the job folder for the usual
+    ``{job}.results/band.rkf`` layout and the file stem otherwise.
+
+    **parameters:**
+        rkf_file (str): Path to the RKF file.
+
+    **returns:**
+        str: Name used as prefix of the output files.
+    """
+    stem = os.path.splitext(os.path.basename(rkf_file))[0]
+    if stem not in GENERIC_STEMS:
+        return stem
+    folder = os.path.basename(os.path.dirname(os.path.abspath(rkf_file)))
+    return folder[:-len('.results')] if folder.endswith('.results') else folder
+
+
+def unique_names(rkf_files):
+    """
+    :func:`rkf_name` of every file, made unique so no two files write to
+    the same outputs. Clashing names, e.g. ``ams`` for every
+    ``{job}/ams.results/band.rkf``, are prefixed with the folders above the
+    one they were taken from, one level at a time, until they differ.
+
+    **parameters:**
+        rkf_files (list of str): Paths to the RKF files.
+
+    **returns:**
+        list of str: One name per file, in the same order.
+    """
+    names = [rkf_name(f) for f in rkf_files]
+    folders = []
+    for rkf_file in rkf_files:
+        folder = os.path.dirname(os.path.abspath(rkf_file))
+        stem = os.path.splitext(os.path.basename(rkf_file))[0]
+        folders.append(os.path.dirname(folder) if stem in GENERIC_STEMS else folder)
+
+    while True:
+        counts = Counter(names)
+        clashing = [k for k, name in enumerate(names) if counts[name] > 1]
+        if not clashing:
+            return names
+        grown = False
+        for k in clashing:
+            parent = os.path.basename(folders[k])
+            if parent:
+                names[k] = f'{parent}_{names[k]}'
+                folders[k] = os.path.dirname(folders[k])
+                grown = True
+        if not grown:
+            # identical paths up to the root, only possible for repeated files
+            return [f'{name}_{k}' if counts[name] > 1 else name for k, name in enumerate(names)]
+
+
+def headless_worker():
+    """
+    Pool initializer that puts a worker on the non-interactive Agg
+    backend, without touching the backend of the calling process.
+    """
+    # picked up by matplotlib when the worker first imports it
+    os.environ['MPLBACKEND'] = 'Agg'
+    if 'matplotlib' in sys.modules:
+        # inherited from a forked parent that had already imported it
+        sys.modules['matplotlib'].use('Agg')
+
+
+def dos_summary(energies_ev, raw_pdos, atoms, symbols, centre, energy_window=0.2, n_top=3):
+    """
+    DOS at the Fermi level and the elements with the most states around it.
+
+    **parameters:**
+        energies_ev (np.ndarray): Energies of the PDOS columns.
+        raw_pdos (np.ndarray): [n_basis, n_energies] PDOS.
+        atoms (np.ndarray): 1-based atom per basis function.
+        symbols (list): Atomic symbols.
+        centre (float): Fermi level on the same scale as ``energies_ev``.
+        energy_window (float): Half width in eV of the window around the
+            Fermi level.
+        n_top (int): Number of elements to report.
+
+    **returns:**
+        tuple: Total DOS at the Fermi level and a list of ``(element,
+        states)`` sorted by decreasing number of states.
+    """
+    energies_ev = np.asarray(energies_ev)
+    dos_at_fermi = float(np.interp(centre, energies_ev, np.asarray(raw_pdos).sum(axis=0)))
+    projection = PDOSProjection(symbols, atoms=atoms)
+    states = window_integrals(projection.by_element(raw_pdos), energies_ev, centre, [energy_window])[:, 0]
+    order = np.argsort(-states, kind='stable')[:n_top]
+    return dos_at_fermi, [(projection.elements[k], float(states[k])) for k in order]
+
+
+def process_rkf(rkf_file,
+                output_dir,
+                ylim=(-10, 10),
+                shift_to_fermi=False,
+                energy_window=0.2,
+                plot_atoms=True,
+                plot_orbitals=True,
+                n_top=3,
+                cache=True,
+                windowed=False,
+                preview=False,
+                data_only=False,
+                name=None):
+    """
+    Extract the summary and write the plots of a single RKF file.
+
+    **parameters:**
+        rkf_file (str): Path to the RKF file.
+        output_dir (str): Directory of the plots, CSV files and caches.
+        ylim (tuple): Energy range in eV.
+        shift_to_fermi (bool): Put the Fermi level at 0.
+        energy_window (float): Half width in eV of the Fermi window.
+        plot_atoms (bool): Write the atom-wise PDOS plot and contributions.
+        plot_orbitals (bool): Write the orbital-wise PDOS plot.
+        n_top (int): Number of elements in ``top_elements``.
+        cache (bool): Use the binary DOS cache, see :class:`PDOSPlotter`.
+        windowed (bool): Read only the energies inside ``ylim``.
+        preview (bool): Quick low-resolution plots.
+        data_only (bool): Write the projected DOS and atom contributions
+            as CSV instead of plotting.
+        name (str, optional): Prefix of the output files, defaults to
+            :func:`rkf_name`.
+
+    **returns:**
+        dict: Summary row with the fields of ``SUMMARY_FIELDS``.
+    """
+    start = time.perf_counter()
+    if name is None:
+        name = rkf_name(rkf_file)
+    record = dict.fromkeys(SUMMARY_FIELDS)
+    record.update({'rkf': os.path.abspath(rkf_file), 'name': name, 'status': STATUS_FAILED})
+    try:
+        plotter = PDOSPlotter(rkf_file,
+                              ylim=ylim,
+                              save_path=os.path.join(output_dir, name),
+                              shift_to_fermi=shift_to_fermi,
+                              cache=cache,
+                              windowed=windowed,
+                              preview=preview)
+        energies_ev, full_energies_ev, raw_pdos, atoms, lvals, symbols, energy_mask, fermi_ev = \
+            plotter.load_data()
+        centre = 0 if shift_to_fermi else fermi_ev
+        dos_at_fermi, top = dos_summary(full_energies_ev, raw_pdos, atoms, symbols, centre,
+                                        energy_window=energy_window, n_top=n_top)
+        record['fermi_ev'] = round(float(fermi_ev), 6)
+        record['dos_at_fermi'] = round(dos_at_fermi, 6)
+        record['top_elements'] = ';'.join(f'{element}:{states:.4f}' for element, states in top)
+
+        if data_only:
+            plotter.write_projected_dos(energies_ev, raw_pdos, atoms, lvals, symbols, energy_mask)
+            plotter.write_atom_contribution_csv(
+                plotter.atom_contributions(full_energies_ev, raw_pdos, atoms, symbols, fermi_ev, energy_window))
+        elif plot_atoms:
+            _, sorted_top = plotter.plot_by_atom(energies_ev, full_energies_ev, raw_pdos, atoms,
+                                                 symbols, energy_mask, fermi_ev, energy_window)
+            plotter.write_atom_contribution_csv(sorted_top)
+        if plot_orbitals and not data_only:
+            plotter.plot_by_orbital(energies_ev, raw_pdos, lvals, energy_mask, fermi_ev)
+        record['status'] = STATUS_DONE
+    except Exception as error:
+        record['error'] = f'{type(error).__name__}: {error}'
+    finally:
+        # figures are never shown, free them before the next file
+        if 'matplotlib.pyplot' in sys.modules:
+            sys.modules['matplotlib.pyplot'].close('all')
+    record['seconds'] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_batch(rkf_files,
+              output_dir,
+              summary_path=None,
+              n_workers=None,
+              **options):
+    """
+    Process many RKF files in parallel. A file that kills its worker
+    process is rerun alone and only it is recorded as failed, see
+    :func:`mofbattery.parallel.imap_isolated`.
+
+    **parameters:**
+        rkf_files (list of str): RKF files.
+        output_dir (str): Directory of all outputs.
+        summary_path (str, optional): Summary CSV, defaults to
+            ``{output_dir}/dos_summary.csv``.
+        n_workers (int, optional): Worker processes, defaults to the CPU count.
+        **options: Passed on to :func:`process_rkf`. Every file gets its
+            output name from :func:`unique_names`.
+
+    **returns:**
+        dict: Counts of ``done`` and ``failed`` files, the wall time
+        ``seconds`` and the throughput ``files_per_second``.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if summary_path is None:
+        summary_path = os.path.join(output_dir, 'dos_summary.csv')
+    rkf_files = list(dict.fromkeys(os.path.abspath(f) for f in rkf_files))
+    names = dict(zip(rkf_files, unique_names(rkf_files)))
+    summary = {STATUS_DONE: 0, STATUS_FAILED: 0}
+
+    start = time.perf_counter()
+    busy = 0.0
+    tasks = [(rkf_file, (rkf_file, output_dir), dict(options, name=names[rkf_file]))
+             for rkf_file in rkf_files]
+    with open(summary_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        outcomes = imap_isolated(process_rkf, tasks, n_workers, initializer=headless_worker)
+        for n_done, (rkf_file, record, error) in enumerate(outcomes, 1):
+            if error is not None:
+                # the call itself failed, or the worker died on this file even when run alone
+                record = dict.fromkeys(SUMMARY_FIELDS)
+                record.update({'rkf': rkf_file, 'name': names[rkf_file], 'status': STATUS_FAILED,
+                               'error': f'worker_error: {error}'})
+            writer.writerow(record)
+            f.flush()
+            summary[record['status']] += 1
+            busy += record['seconds'] or 0.0
+            if record['status'] == STATUS_FAILED:
+                logger.warning('failed %s: %s', record['rkf'], record['error'])
+            else:
+                logger.info('[%d/%d] %s E_F = %.3f eV', n_done, len(rkf_files), record['name'], record['fermi_ev'])
+
+    elapsed = time.perf_counter() - start
+    summary['seconds'] = elapsed
+    summary['files_per_second'] = len(rkf_files) / elapsed if elapsed > 0 else 0.0
+    logger.info('%d done, %d failed in %.1f s (%.2f files/s, %.2f s per file in the workers)',
+                summary[STATUS_DONE], summary[STATUS_FAILED], elapsed, summary['files_per_second'],
+                busy / len(rkf_files) if rkf_files else 0.0)
+    logger.info('Summary written to %s', summary_path)
+    return summary
+
+
+def main():
+    """
+    Command line entry point of the batch DOS processing.
+    """
+    parser = argparse.ArgumentParser(description="Extract and plot the PDOS of many AMS BAND RKF files in parallel.")
+    parser.add_argument("rkf_globs",
+                        nargs="+",
+                        help="Glob patterns of the RKF files, e.g. 'jobs/*.results/band.rkf'"
+                        )
+    parser.add_argument("--output_dir",
+                        default="DOS",
+                        help="Directory of the plots, CSV files and summary"
+                        )
+    parser.add_argument("--summary",
+                        default=None,
+                        help="Summary CSV, defaults to {output_dir}/dos_summary.csv"
+                        )
+    parser.add_argument("--workers",
+                        type=int,
+                        default=None,
+                        help="Number of worker processes (default: all CPUs)"
+                        )
+    parser.add_argument("--ylim",
+                        nargs=2,
+                        type=float,
+                        default=[-10, 10],
+                        help="Energy limits in eV"
+                        )
+    parser.add_argument("--shift_to_fermi",
+                        action="store_true",
+                        help="Shift energies so Fermi level is at 0"
+                        )
+    parser.add_argument("--window",
+                        type=float,
+                        default=0.2,
+                        help="Energy window around Fermi level (eV)"
+                        )
+    parser.add_argument("--top",
+                        type=int,
+                        default=3,
+                        help="Number of top contributing elements in the summary"
+                        )
+    parser.add_argument("--windowed",
+                        action="store_true",
+                        help="Read only the energies inside ylim, as float32"
+                        )
+    parser.add_argument("--no_cache",
+                        action="store_true",
+                        help="Always read the RKF files and do not write binary DOS caches"
+                        )
+    parser.add_argument("--preview",
+                        action="store_true",
+                        help="Fast low-resolution plots with rasterized fills"
+                        )
+    parser.add_argument("--data_only",
+                        action="store_true",
+                        help="Write the projected DOS and contributions as CSV without plotting"
+                        )
+    parser.add_argument("--no_atoms",
+                        action="store_true",
+                        help="Skip plotting atom-wise PDOS"
+                        )
+    parser.add_argument("--no_orbitals",
+                        action="store_true",
+                        help="Skip plotting orbital-wise PDOS"
+                        )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    rkf_files = sorted({f for pattern in args.rkf_globs for f in glob.glob(pattern)})
+    if not rkf_files:
+        parser.error(f"No RKF files match {' '.join(args.rkf_globs)}")
+
+    run_batch(rkf_files,
+              output_dir=args.output_dir,
+              summary_path=args.summary,
+              n_workers=args.workers,
+              ylim=tuple(args.ylim),
+              shift_to_fermi=args.shift_to_fermi,
+              energy_window=args.window,
+              plot_atoms=not args.no_atoms,
+              plot_orbitals=not args.no_orbitals,
+              n_top=args.top,
+              cache=not args.no_cache,
+              windowed=args.windowed,
+              preview=args.preview,
+              data_only=args.data_only)
@@ -0,0 +1,415 @@
+"""
+Electronic descriptors from the DOS of AMS BAND RKF files.
+
+All descriptors are computed from the arrays of
+:meth:`PDOSPlotter.load_data` on energies relative to the Fermi level:
+
+- ``dos_at_fermi``: total DOS at the Fermi level.
+- ``vbm``, ``cbm`` and ``gap``: band edges, the top of the valence and
+  the bottom of the conduction band, where the total DOS exceeds a small
+  fraction of its maximum, see :func:`band_edges`.
+- ``{element}_{l}_states``, ``_centre`` and ``_width``: number of states,
+  first moment and square root of the second central moment of every
+  element/angular momentum channel, all channels at once.
+- ``metal_d_centre``/``metal_d_width`` of the summed d PDOS of all
+  d-block metals and ``ligand_p_centre``/``ligand_p_width`` of the summed
+  p PDOS of the non-metals other than hydrogen.
+
+One row per RKF file is added to a wide CSV table. Finished rows are
+written in chunks to part files next to the table and folded into it with
+a single rewrite at the end of a run, so the header can grow when a file
+brings an element/l channel not seen before without rewriting the table
+for every chunk, and the table can be filled incrementally over thousands
+of files.
+"""
+
+import os
+import csv
+import glob
+import time
+import logging
+import argparse
+import numpy as np
+from mofbattery.parallel import imap_isolated
+from mofbattery.es.plot_dos import PDOSPlotter, broaden
+from mofbattery.es.batch_dos import rkf_name
+from ase.data import chemical_symbols
+from mofbattery.es.projection import PDOSProjection, ORBITAL_LABELS, cumulative_trapezoid
+
+logger = logging.getLogger(__name__)
+
+NON_METALS = {'H', 'He', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Si', 'P', 'S', 'Cl', 'Ar',
+              'As', 'Se', 'Br', 'Kr', 'Te', 'I', 'Xe', 'At', 'Rn', 'X'}
+
+# groups 3-12, the metals whose d states form the metal d band
+D_BLOCK_METALS = {chemical_symbols[z] for z in [*range(21, 31), *range(39, 49), 57,
+                                                  *range(72, 81), 89, *range(104, 113)]}
+
+BASE_FIELDS = ['name', 'rkf', 'error', 'fermi_ev', 'dos_at_fermi', 'vbm', 'cbm', 'gap',
+               'metal_d_states', 'metal_d_centre', 'metal_d_width',
+               'ligand_p_states', 'ligand_p_centre', 'ligand_p_width']
+
+
+def band_moments(energies_ev, channels):
+    """
+    Number of states, centre and width of many PDOS channels at once.
+
+    Negative PDOS values, which projections can produce, are ignored.
+
+    **parameters:**
+        energies_ev (np.ndarray): [n_energies] energies.
+        channels (np.ndarray): [n_channels, n_energies] PDOS.
+
+    **returns:**
+        tuple: [n_channels] ``states``, ``centre`` and ``width``; centre and
+        width are NaN for channels without states.
+    """
+    energies_ev = np.asarray(energies_ev, dtype=float)
+    weights = np.clip(np.asarray(channels, dtype=float), 0, None)
+    # trapezoid weights of the energy grid
+    dx = np.zeros_like(energies_ev)
+    dx[1:] += 0.5 * np.diff(energies_ev)
+    dx[:-1] += 0.5 * np.diff(energies_ev)
+    powers = np.stack([np.ones_like(energies_ev), energies_ev, energies_ev ** 2]) * dx
+    m0, m1, m2 = (weights @ powers.T).T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centre = np.where(m0 > 0, m1 / m0, np.nan)
+        width = np.sqrt(np.clip(np.where(m0 > 0, m2 / m0, np.nan) - centre ** 2, 0, None))
+    return m0, centre, width
+
+
+def band_edges(energies_ev, total_dos, edge_tolerance=1e-3, metal_fraction=0.05):
+    """
+    Valence and conduction band edges around the Fermi level at 0.
+
+    The DOS is split into bands, runs of energies where it exceeds
+    ``edge_tolerance`` of its maximum. When the Fermi level lies in a gap,
+    the edges are the nearest band energies below and above it. A band
+    that contains the Fermi level, e.g. through the smeared edge of a
+    filled valence band, only counts as metallic when more than
+    ``metal_fraction`` of its states lie on either side of the Fermi
+    level. Otherwise it is the valence band (mostly occupied) or the
+    conduction band (mostly empty) and the other edge is taken from the
+    next band on the empty or occupied side.
+
+    **parameters:**
+        energies_ev (np.ndarray): Ascending energies relative to the Fermi
+            level.
+        total_dos (np.ndarray): Total DOS.
+        edge_tolerance (float): DOS below this fraction of the maximum
+            counts as a gap.
+        metal_fraction (float): Smallest fraction of the states of the
+            band at the Fermi level on each side for a metal.
+
+    **returns:**
+        tuple: ``vbm``, ``cbm`` and ``gap`` in eV; the gap is zero for a
+        metal, and NaN when an edge lies outside the energy range.
+    """
+    energies_ev = np.asarray(energies_ev, dtype=float)
+    total_dos = np.clip(np.asarray(total_dos, dtype=float), 0, None)
+    occupied = total_dos > edge_tolerance * np.max(total_dos)
+
+    def last_below(k):
+        """Energy of the last band point before index ``k``."""
+        idx = np.nonzero(occupied[:k])[0]
+        return energies_ev[idx[-1]] if len(idx) else np.nan
+
+    def first_above(k):
+        """Energy of the first band point after index ``k``."""
+        idx = np.nonzero(occupied[k + 1:])[0]
+        return energies_ev[k + 1 + idx[0]] if len(idx) else np.nan
+
+    fermi = int(np.clip(np.searchsorted(energies_ev, 0.0), 0, len(energies_ev) - 1))
+    if abs(energies_ev[fermi - 1] if fermi > 0 else np.inf) < abs(energies_ev[fermi]):
+        fermi -= 1
+    if not occupied[fermi]:
+        vbm, cbm = last_below(fermi), first_above(fermi)
+        return float(vbm), float(cbm), float(cbm - vbm)
+
+    # the band containing the Fermi level and its states on either side
+    gaps = np.nonzero(~occupied)[0]
+    start = gaps[gaps < fermi].max() + 1 if (gaps < fermi).any() else 0
+    stop = gaps[gaps > fermi].min() - 1 if (gaps > fermi).any() else len(energies_ev) - 1
+    cumulative = cumulative_trapezoid(total_dos, energies_ev)
+    n_fermi = np.interp(0.0, energies_ev, cumulative)
+    states = cumulative[stop] - cumulative[start]
+    below = (n_fermi - cumulative[start]) / states if states > 0 else 0.5
+    if 1 - below <= metal_fraction:
+        # filled valence band with its smeared edge across the Fermi level
+        vbm, cbm = energies_ev[stop], first_above(stop)
+    elif below <= metal_fraction:
+        # empty conduction band starting at the Fermi level
+        vbm, cbm = last_below(start), energies_ev[start]
+    else:
+        return float(last_below(fermi + 1)), float(first_above(fermi - 1)), 0.0
+    return float(vbm), float(cbm), float(cbm - vbm)
+
+
+def dos_descriptors(energies_ev, raw_pdos, atoms, lvals, symbols, smearing=0.0, edge_tolerance=1e-3):
+    """
+    Descriptors of one DOS, see the module documentation.
+
+    **parameters:**
+        energies_ev (np.ndarray): Energies relative to the Fermi level.
+        raw_pdos (np.ndarray): [n_basis, n_energies] PDOS.
+        atoms (np.ndarray): 1-based atom per basis function.
+        lvals (np.ndarray): Angular momentum per basis function.
+        symbols (list): Atomic symbols.
+        smearing (float): Gaussian width in eV applied to the total DOS
+            before the DOS at the Fermi level and the edges are taken.
+        edge_tolerance (float): See :func:`band_edges`.
+
+    **returns:**
+        dict: Descriptor name to value.
+    """
+    projection = PDOSProjection(symbols, atoms=atoms, lvals=lvals)
+    element_l = projection.by_element_l(raw_pdos)
+    total = np.sum(raw_pdos, axis=0, dtype=float)
+    if smearing > 0:
+        total = broaden(total, energies_ev, smearing)
+
+    vbm, cbm, gap = band_edges(energies_ev, total, edge_tolerance)
+    row = {'dos_at_fermi': float(np.interp(0.0, energies_ev, total)), 'vbm': vbm, 'cbm': cbm, 'gap': gap}
+
+    pairs = projection.element_l_pairs
+    metal_d = np.array([element in D_BLOCK_METALS and l == 2 for element, l in pairs], dtype=bool)
+    ligand_p = np.array([element in NON_METALS and element != 'H' and l == 1 for element, l in pairs], dtype=bool)
+    channels = np.vstack([element_l,
+                          element_l[metal_d].sum(axis=0, keepdims=True),
+                          element_l[ligand_p].sum(axis=0, keepdims=True)])
+    states, centre, width = band_moments(energies_ev, channels)
+
+    names = [f'{element}_{ORBITAL_LABELS.get(l, l)}' for element, l in pairs] + ['metal_d', 'ligand_p']
+    for k, name in enumerate(names):
+        row[f'{name}_states'] = float(states[k])
+        row[f'{name}_centre'] = float(centre[k])
+        row[f'{name}_width'] = float(width[k])
+    return row
+
+
+def rkf_descriptors(rkf_file, ylim=(-10, 10), smearing=0.0, edge_tolerance=1e-3, windowed=True, cache=False):
+    """
+    Descriptor row of one RKF file; errors are recorded in the row.
+
+    **parameters:**
+        rkf_file (str): Path to the RKF file.
+        ylim (tuple): Energy range relative to the Fermi level in eV.
+        smearing (float): See :func:`dos_descriptors`.
+        edge_tolerance (float): See :func:`band_edges`.
+        windowed (bool): Read only the energies inside ``ylim``.
+        cache (bool): Use the binary DOS cache next to the RKF file.
+
+    **returns:**
+        dict: Table row.
+    """
+    row = {'name': rkf_name(rkf_file), 'rkf': os.path.abspath(rkf_file), 'error': ''}
+    try:
+        plotter = PDOSPlotter(rkf_file,
+                              ylim=ylim,
+                              save_path=os.path.splitext(rkf_file)[0],
+                              shift_to_fermi=True,
+                              cache=cache,
+                              windowed=windowed)
+        _, energies_ev, raw_pdos, atoms, lvals, symbols, energy_mask, fermi_ev = plotter.load_data()
+        row['fermi_ev'] = float(fermi_ev)
+        row.update(dos_descriptors(energies_ev[energy_mask], np.asarray(raw_pdos)[:, energy_mask],
+                                   atoms, lvals, symbols, smearing=smearing, edge_tolerance=edge_tolerance))
+    except Exception as error:
+        row['error'] = f'{type(error).__name__}: {error}'
+    return row
+
+
+def read_table(table_path):
+    """
+    Header and rows of a descriptor table.
+
+    **parameters:**
+        table_path (str): Path to the CSV table.
+
+    **returns:**
+        tuple: List of column names and list of row dicts.
+    """
+    if not os.path.exists(table_path):
+        return [], []
+    with open(table_path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        return list(reader.fieldnames or []), list(reader)
+
+
+def write_table(table_path, fieldnames, rows):
+    """Write a whole descriptor table, replacing the file atomically."""
+    tmp_path = f'{table_path}.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, table_path)
+
+
+def parts_dir(table_path):
+    """Directory of the chunk files of a descriptor table."""
+    return f'{table_path}.parts'
+
+
+def write_part(table_path, rows):
+    """
+    Write a chunk of rows to its own CSV file next to the table, with the
+    columns of these rows only.
+
+    **parameters:**
+        table_path (str): Path to the CSV table.
+        rows (list of dict): Rows to add.
+
+    **returns:**
+        str: Path to the chunk file.
+    """
+    directory = parts_dir(table_path)
+    os.makedirs(directory, exist_ok=True)
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    part_path = os.path.join(directory, f'part_{time.time_ns():020d}.csv')
+    write_table(part_path, fieldnames, rows)
+    return part_path
+
+
+def merge_parts(table_path):
+    """
+    Fold all chunk files into the table with a single rewrite, widening its
+    header to every column seen, and remove them.
+
+    **parameters:**
+        table_path (str): Path to the CSV table.
+
+    **returns:**
+        tuple: Header and rows of the table after merging.
+    """
+    fieldnames, rows = read_table(table_path)
+    parts = sorted(glob.glob(os.path.join(parts_dir(table_path), 'part_*.csv')))
+    if not parts:
+        return fieldnames, rows
+    for part_path in parts:
+        part_fields, part_rows = read_table(part_path)
+        fieldnames = fieldnames + [key for key in part_fields if key not in fieldnames]
+        rows.extend(part_rows)
+    fieldnames = list(dict.fromkeys(BASE_FIELDS + fieldnames))
+    write_table(table_path, fieldnames, rows)
+    for part_path in parts:
+        os.remove(part_path)
+    try:
+        os.rmdir(parts_dir(table_path))
+    except OSError:
+        pass
+    return fieldnames, rows
+
+
+def run_descriptors(rkf_files, table_path, n_workers=None, chunk=64, retry_failed=False, **options):
+    """
+    Compute descriptors of many RKF files in parallel and add them to a
+    table. Files already in the table are skipped, failed ones unless
+    ``retry_failed`` is set. Every ``chunk`` rows are written to a part
+    file and all parts are merged into the table once, also when the run
+    is interrupted.
+
+    **parameters:**
+        rkf_files (list of str): RKF files.
+        table_path (str): Path to the CSV table.
+        n_workers (int, optional): Worker processes, defaults to the CPU count.
+        chunk (int): Rows per part file.
+        retry_failed (bool): Recompute files whose row has an error.
+        **options: Passed on to :func:`rkf_descriptors`.
+
+    **returns:**
+        dict: Counts of ``done``, ``failed`` and ``skipped`` files.
+    """
+    # rows of an interrupted run are still in their chunk files
+    fieldnames, existing = merge_parts(table_path)
+    if retry_failed and any(row.get('error') for row in existing):
+        existing = [row for row in existing if not row.get('error')]
+        write_table(table_path, fieldnames, existing)
+    finished = {row['rkf'] for row in existing}
+    pending = [f for f in dict.fromkeys(os.path.abspath(f) for f in rkf_files) if f not in finished]
+    summary = {'done': 0, 'failed': 0, 'skipped': len(rkf_files) - len(pending)}
+    logger.info('%d files, %d already in %s, %d to run', len(rkf_files), summary['skipped'], table_path, len(pending))
+    if not pending:
+        return summary
+
+    start = time.perf_counter()
+    rows = []
+    tasks = [(rkf_file, (rkf_file,), options) for rkf_file in pending]
+    try:
+        for rkf_file, row, error in imap_isolated(rkf_descriptors, tasks, n_workers):
+            if error is not None:
+                # the call itself failed, or the worker died on this file even when run alone
+                row = {'name': rkf_name(rkf_file), 'rkf': rkf_file, 'error': f'worker_error: {error}'}
+            if row['error']:
+                summary['failed'] += 1
+                logger.warning('failed %s: %s', row['rkf'], row['error'])
+            else:
+                summary['done'] += 1
+            rows.append(row)
+            if len(rows) >= chunk:
+                write_part(table_path, rows)
+                rows = []
+    finally:
+        if rows:
+            write_part(table_path, rows)
+        merge_parts(table_path)
+
+    elapsed = time.perf_counter() - start
+    logger.info('%d done, %d failed in %.1f s (%.2f files/s)', summary['done'], summary['failed'],
+                elapsed, len(pending) / elapsed if elapsed > 0 else 0.0)
+    return summary
+
+
+def main():
+    """
+    Command line entry point of the DOS descriptor table.
+    """
+    parser = argparse.ArgumentParser(description="Append DOS descriptors of many AMS BAND RKF files to a CSV table.")
+    parser.add_argument("rkf_globs",
+                        nargs="+",
+                        help="Glob patterns of the RKF files, e.g. 'jobs/*.results/band.rkf'"
+                        )
+    parser.add_argument("--table",
+                        default="dos_descriptors.csv",
+                        help="CSV table the descriptors are appended to"
+                        )
+    parser.add_argument("--workers",
+                        type=int,
+                        default=None,
+                        help="Number of worker processes (default: all CPUs)"
+                        )
+    parser.add_argument("--ylim",
+                        nargs=2,
+                        type=float,
+                        default=[-10, 10],
+                        help="Energy range relative to the Fermi level in eV"
+                        )
+    parser.add_argument("--smearing",
+                        type=float,
+                        default=0.0,
+                        help="Gaussian smearing (eV) of the total DOS for E_F and band edges"
+                        )
+    parser.add_argument("--edge_tolerance",
+                        type=float,
+                        default=1e-3,
+                        help="Fraction of the maximum DOS below which states count as a gap"
+                        )
+    parser.add_argument("--retry_failed",
+                        action="store_true",
+                        help="Recompute files recorded with an error"
+                        )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    rkf_files = sorted({f for pattern in args.rkf_globs for f in glob.glob(pattern)})
+    if not rkf_files:
+        parser.error(f"No RKF files match {' '.join(args.rkf_globs)}")
+
+    run_descriptors(rkf_files,
+                    table_path=args.table,
+                    n_workers=args.workers,
+                    retry_failed=args.retry_failed,
+                    ylim=tuple(args.ylim),
+                    smearing=args.smearing,
+                    edge_tolerance=args.edge_tolerance)
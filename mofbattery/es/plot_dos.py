@@ -1,15 +1,17 @@
 import os
 import argparse
 import numpy as np
-import matplotlib.pyplot as plt
 import csv
 import logging
-from read_rkf.parserkf import KFFile
+from scipy.signal import fftconvolve
 from mofbattery.read_write import filetyper
+from mofbattery.es.projection import PDOSProjection, window_integrals
+from mofbattery.es.results import RKFResult
+# re-exported, HaToEv used to be defined in this module
+from mofbattery.es.results import HaToEv  # noqa: F401
+from mofbattery.es.rigid_band import rigid_band_filling
 # from scm.plams import KFFile
 
-HaToEv = 27.2113845249047
-
 ATOM_COLORS = {
     'H': '#B3E3F5',   # Cyan
     'He': '#D9FFFF',  # Pale cyan
@@ -123,7 +125,107 @@ ATOM_COLORS = {
     'X': 'black'
 }
 
-logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+def energy_grid(start, stop, step):
+    """
+    Uniform energy grid from ``start`` to ``stop`` (inclusive).
+
+    **Parameter:**
+        - start (float): First energy in eV.
+        - stop (float): Last energy in eV, a whole number of steps
+            above ``start``.
+        - step (float): Spacing in eV.
+
+    **Returns:**
+        - np.ndarray: Grid energies.
+    """
+    n_steps = (stop - start) / step if step > 0 else -1
+    if n_steps < 0 or not np.isclose(n_steps, round(n_steps), rtol=0, atol=1e-6):
+        raise ValueError(f"Energy grid {start} to {stop} is not a whole number of positive steps of {step}")
+    return start + step * np.arange(int(round(n_steps)) + 1)
+
+
+def broadening_kernel(spacing, width, kind='gaussian', max_points=None):
+    """
+    Discrete smearing kernel normalised to a unit sum, so that
+    broadening keeps the number of states.
+
+    **Parameter:**
+        - spacing (float): Energy spacing in eV.
+        - width (float): Standard deviation of the Gaussian or half width
+            at half maximum of the Lorentzian, in eV.
+        - kind (str): ``'gaussian'`` or ``'lorentzian'``.
+        - max_points (int, optional): Length of the signal; the kernel is
+            not made longer than needed to cover it.
+
+    **Returns:**
+        - np.ndarray: Odd-length kernel centred on its middle element.
+    """
+    if kind == 'gaussian':
+        half = int(np.ceil(6 * width / spacing))
+    elif kind == 'lorentzian':
+        # slowly decaying tails, truncated and renormalised
+        half = int(np.ceil(50 * width / spacing))
+    else:
+        raise ValueError(f"Unknown smearing: {kind}. Choose from 'gaussian' or 'lorentzian'.")
+    if max_points is not None:
+        half = min(half, max_points - 1)
+    x = spacing * np.arange(-half, half + 1)
+    if kind == 'gaussian':
+        kernel = np.exp(-0.5 * (x / width) ** 2)
+    else:
+        kernel = width / (x ** 2 + width ** 2)
+    return kernel / kernel.sum()
+
+
+def broaden(values, energies_ev, width, kind='gaussian'):
+    """
+    Smear many DOS curves at once by FFT convolution along the last axis.
+
+    **Parameter:**
+        - values (np.ndarray): [..., n_energies] DOS curves.
+        - energies_ev (np.ndarray): [n_energies] uniform, ascending
+            energy grid.
+        - width (float): Smearing width in eV, see :func:`broadening_kernel`.
+        - kind (str): ``'gaussian'`` or ``'lorentzian'``.
+
+    **Returns:**
+        - np.ndarray: Broadened curves on the same grid.
+    """
+    values = np.asarray(values, dtype=float)
+    if width <= 0 or values.shape[-1] < 2:
+        return values.copy()
+    spacing = np.diff(energies_ev)
+    if spacing[0] <= 0:
+        raise ValueError("Broadening needs ascending energies")
+    if not np.allclose(spacing, spacing[0], rtol=1e-4, atol=0):
+        raise ValueError("Broadening needs a uniform energy grid, resample the DOS first")
+    kernel = broadening_kernel(spacing[0], width, kind, max_points=values.shape[-1])
+    return fftconvolve(values, kernel.reshape((1,) * (values.ndim - 1) + (-1,)), mode='same', axes=-1)
+
+
+def resample(values, energies_ev, grid):
+    """
+    Linear interpolation of many DOS curves onto a new energy grid,
+    zero outside the original energy range.
+
+    **Parameter:**
+        - values (np.ndarray): [..., n_energies] DOS curves.
+        - energies_ev (np.ndarray): [n_energies] ascending energies.
+        - grid (np.ndarray): [n_grid] target energies.
+
+    **Returns:**
+        - np.ndarray: [..., n_grid] curves, as ``np.interp(grid,
+            energies_ev, curve, left=0, right=0)`` for every curve.
+    """
+    values = np.asarray(values)
+    energies_ev = np.asarray(energies_ev, dtype=float)
+    grid = np.asarray(grid, dtype=float)
+    idx = np.clip(np.searchsorted(energies_ev, grid, side='right') - 1, 0, len(energies_ev) - 2)
+    weight = (grid - energies_ev[idx]) / (energies_ev[idx + 1] - energies_ev[idx])
+    out = values[..., idx] * (1 - weight) + values[..., idx + 1] * weight
+    out[..., (grid < energies_ev[0]) | (grid > energies_ev[-1])] = 0
+    return out
 
 
 class PDOSPlotter:
@@ -140,16 +242,49 @@ class PDOSPlotter:
         - orbital_labels (dict): Maps angular momentum quantum
             numbers to orbital labels.
         - orbital_colors (dict): Maps orbital labels to plot colors.
+        - cache (bool): Keep the parsed RKF data in a binary
+            array cache and reuse it while the RKF is unchanged. Off
+            by default, as the cache is written next to ``save_path``.
+        - cache_path (str): Path of the cache, defaults to
+            ``{save_path}-dos.cache``.
+        - windowed (bool): Read only the energies inside ``ylim``
+            into a preallocated array of type ``dtype``. Fermi-window
+            integrals are then limited to ``ylim`` as well.
+        - dtype (np.dtype): Type of the windowed PDOS array.
+        - drop_threshold (float, optional): Drop basis functions whose
+            number of states inside ``ylim`` is below this fraction of
+            the largest one.
+        - preview (bool): Render quick previews, with rasterized fills,
+            ``preview_dpi`` and no tight bounding box.
+        - preview_dpi (int): Resolution of the previews.
+        - result (RKFResult): Memoized reader of the RKF file, shared
+            with other plotters of the same calculation.
     """
 
     def __init__(self, path_to_rkf,
                  ylim=(-10, 10),
                  save_path='PDOS_plot',
-                 shift_to_fermi=False):
+                 shift_to_fermi=False,
+                 cache=False,
+                 cache_path=None,
+                 windowed=False,
+                 dtype=np.float32,
+                 drop_threshold=None,
+                 preview=False,
+                 preview_dpi=100,
+                 result=None):
         self.path_to_rkf = path_to_rkf
         self.ylim = ylim
         self.shift_to_fermi = shift_to_fermi
         self.save_path = save_path
+        self.cache = cache
+        self.cache_path = cache_path or f'{save_path}-dos.cache'
+        self.windowed = windowed
+        self.dtype = dtype
+        self.drop_threshold = drop_threshold
+        self.preview = preview
+        self.preview_dpi = preview_dpi
+        self.result = result if result is not None else RKFResult(path_to_rkf)
         self.orbital_labels = {0: 's',
                                1: 'p',
                                2: 'd',
@@ -165,35 +300,174 @@ class PDOSPlotter:
                         'h': '#8c564b'   # brown
                     }
 
+    def _rkf_signature(self):
+        """Identify the RKF file by path, size and modification time."""
+        stat = os.stat(self.path_to_rkf)
+        return {'rkf': os.path.abspath(self.path_to_rkf),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns}
+
+    def read_rkf(self):
+        """
+        Read the DOS data from the RKF file.
+
+        **Returns:**
+            dict: Unshifted energies (eV), raw PDOS, atom and
+            l-value per basis function, symbols and Fermi energy (eV).
+        """
+        result = self.result
+        return {'energies_ev': result.dos_energies(),
+                'raw_pdos': result.pdos(),
+                'atoms': result.basis_atoms(),
+                'lvals': result.basis_lvals(),
+                'symbols': result.symbols(),
+                'fermi_ev': result.dos_fermi_energy()}
+
+    def write_cache(self, data):
+        """
+        Save the parsed RKF data to the binary array cache. A cache
+        that cannot be written is skipped with a warning.
+
+        **Parameter:**
+            - data (dict): Output of :meth:`read_rkf`.
+        """
+        metadata = self._rkf_signature()
+        metadata.update({'symbols': data['symbols'], 'fermi_ev': float(data['fermi_ev'])})
+        try:
+            filetyper.write_array_cache(self.cache_path,
+                                        {'energies_ev': np.asarray(data['energies_ev'], dtype=np.float64),
+                                         'raw_pdos': np.asarray(data['raw_pdos']),
+                                         'atoms': np.asarray(data['atoms'], dtype=np.int32),
+                                         'lvals': np.asarray(data['lvals'], dtype=np.int32)},
+                                        metadata)
+        except OSError as error:
+            logging.warning(f"Could not write DOS cache {self.cache_path}: {error}")
+            return
+        logging.info(f"Saved DOS cache to {self.cache_path}")
+
+    def read_cache(self):
+        """
+        Load the binary array cache if it belongs to the current RKF file.
+
+        **Returns:**
+            dict or None: Same layout as :meth:`read_rkf` with
+            memory-mapped arrays, or None if the cache is missing
+            or stale.
+        """
+        if not os.path.exists(self.cache_path):
+            return None
+        try:
+            header, _ = filetyper.read_array_cache_header(self.cache_path)
+        except (ValueError, OSError):
+            return None
+        metadata = header['metadata']
+        if any(metadata.get(key) != value for key, value in self._rkf_signature().items()):
+            return None
+        arrays, metadata = filetyper.read_array_cache(self.cache_path, mmap=True)
+        arrays['symbols'] = metadata['symbols']
+        arrays['fermi_ev'] = metadata['fermi_ev']
+        return arrays
+
+    def load_raw(self):
+        """
+        Parsed RKF data, from the cache when the RKF is unchanged.
+
+        **Returns:**
+            dict: Same layout as :meth:`read_rkf`.
+        """
+        data = self.read_cache() if self.cache else None
+        if data is None:
+            data = self.read_rkf()
+            if self.cache:
+                self.write_cache(data)
+        return data
+
+    def _energy_window(self, energies_ev, fermi_ev):
+        """Slice of the (ascending) energies inside ``ylim``."""
+        shifted = energies_ev - fermi_ev if self.shift_to_fermi else energies_ev
+        start, stop = np.searchsorted(shifted, self.ylim[0], side='left'), \
+            np.searchsorted(shifted, self.ylim[1], side='right')
+        return slice(int(start), int(max(start, stop)))
+
+    def read_window(self):
+        """
+        Read only the part of the DOS inside ``ylim``.
+
+        The window is cut from the binary cache when it is valid, otherwise
+        it is read block by block from the RKF file straight into a
+        preallocated ``[n_basis, n_window]`` array of type ``dtype``.
+        The full PDOS matrix is never built.
+
+        **Returns:**
+            dict: Same layout as :meth:`read_rkf`, with the energies
+            and PDOS limited to the window.
+        """
+        data = self.read_cache() if self.cache else None
+        if data is not None:
+            window = self._energy_window(np.asarray(data['energies_ev']), data['fermi_ev'])
+            data['energies_ev'] = np.array(data['energies_ev'][window])
+            data['raw_pdos'] = np.array(data['raw_pdos'][:, window], dtype=self.dtype)
+            return data
+
+        result = self.result
+        energies_ev = result.dos_energies()
+        fermi_ev = result.dos_fermi_energy()
+        window = self._energy_window(energies_ev, fermi_ev)
+        raw_pdos = result.matrix_window('DOS', 'DOS per basis function', len(energies_ev),
+                                        window.start, window.stop, dtype=self.dtype)
+        return {'energies_ev': energies_ev[window],
+                'raw_pdos': raw_pdos,
+                'atoms': result.basis_atoms(),
+                'lvals': result.basis_lvals(),
+                'symbols': result.symbols(),
+                'fermi_ev': fermi_ev}
+
+    def drop_negligible(self, raw_pdos, atoms, lvals, energy_mask):
+        """
+        Remove basis functions with negligible weight inside ``ylim``.
+
+        **Parameter:**
+            - raw_pdos (np.ndarray): Raw PDOS array.
+            - atoms (np.ndarray): Atom indices per basis function.
+            - lvals (np.ndarray): Angular momentum per basis function.
+            - energy_mask (np.ndarray): Energy mask.
+
+        **Returns:**
+            - tuple: Raw PDOS, atoms and l-values of the kept basis functions.
+        """
+        # the energy grid is uniform, so the summed PDOS is proportional to the number of states
+        weight = np.abs(raw_pdos[:, energy_mask]).sum(axis=1)
+        keep = weight >= self.drop_threshold * weight.max() if len(weight) else weight.astype(bool)
+        logging.info(f"Keeping {np.count_nonzero(keep)} of {len(keep)} basis functions")
+        return raw_pdos[keep], atoms[keep], lvals[keep]
+
     def load_data(self):
         """
-        Load and preprocess data from the RKF file.
+        Load and preprocess data from the RKF file, or from its
+        binary cache when the RKF is unchanged.
 
         **Returns:**
             tuple: Processed energy values,
             raw PDOS, atomic and orbital assignments,
             symbols, energy mask, and Fermi energy.
         """
-        kf = KFFile(self.path_to_rkf)
-
-        energies_ev = np.array(kf.read('DOS', 'Energies')) * HaToEv
-        fermi_ev = kf.read('DOS', 'Fermi Energy') * HaToEv
+        data = self.read_window() if self.windowed else self.load_raw()
+        energies_ev = np.array(data['energies_ev'])
+        fermi_ev = data['fermi_ev']
         if self.shift_to_fermi:
             energies_ev -= fermi_ev
 
-        raw_pdos_flat = np.array(kf.read('DOS', 'DOS per basis function'))
-        n_energies = len(energies_ev)
-        n_basis_functions = len(raw_pdos_flat) // n_energies
-        raw_pdos = raw_pdos_flat.reshape((n_basis_functions, n_energies))
-
-        atoms = np.array(kf.read('DOS', 'Atom per basis function'))
-        lvals = np.array(kf.read('DOS', 'L-value per basis function'))
-        symbols = kf.read_section('Molecule')['AtomSymbols'].split()
+        raw_pdos = data['raw_pdos']
+        atoms = np.asarray(data['atoms'])
+        lvals = np.asarray(data['lvals'])
+        symbols = data['symbols']
 
         energy_mask = (energies_ev >= self.ylim[0]) &\
             (energies_ev <= self.ylim[1])
 
         full_energies_ev = np.array(energies_ev)
+        if self.drop_threshold is not None:
+            raw_pdos, atoms, lvals = self.drop_negligible(raw_pdos, atoms, lvals, energy_mask)
         energies_ev = energies_ev[energy_mask]
 
         return (energies_ev,
@@ -205,14 +479,283 @@ class PDOSPlotter:
                 energy_mask,
                 fermi_ev)
 
-    def _write_atom_contribution_csv(self, sorted_top):
-        """Save atom-wise contributions to a CSV file."""
+    def write_atom_contribution_csv(self, sorted_top):
+        """
+        Save atom-wise contributions to
+        ``{save_path}-atom_contribution.csv``.
+
+        **Parameter:**
+            - sorted_top (list): ``(atom index, symbol, states)`` as
+                returned by :meth:`atom_contributions`.
+        """
         with open(f'{self.save_path}-atom_contribution.csv', 'w', newline='') as f:
             writer = csv.writer(f)
             writer.writerow(["Atom Index", "Symbol", "Number of States"])
             for idx, sym, contrib in sorted_top:
                 writer.writerow([idx, sym, f"{contrib:.6f}"])
 
+    def fermi_window_contributions(self,
+                                   full_energies_ev,
+                                   raw_pdos,
+                                   atoms,
+                                   symbols,
+                                   fermi_ev,
+                                   energy_windows,
+                                   lvals=None,
+                                   projection=None
+                                   ):
+        """
+        Number of states of every atom, and optionally of every atom and
+        angular momentum, within several energy windows around the Fermi
+        level.
+
+        The PDOS is projected onto atoms once and integrated once with a
+        running trapezoid integral, so every window costs one subtraction.
+
+        **Parameter:**
+            - full_energies_ev (np.ndarray): Full energy values.
+            - raw_pdos (np.ndarray): Raw PDOS array.
+            - atoms (np.ndarray): Atom indices per basis function.
+            - symbols (list): Atomic symbols.
+            - fermi_ev (float): Fermi energy in eV.
+            - energy_windows (list): Half widths of the windows in eV.
+            - lvals (np.ndarray, optional): Angular momentum per basis
+                function, adds the per-atom-per-l integrals.
+            - projection (PDOSProjection, optional): Reused projection.
+
+        **Returns:**
+            - dict: ``atom`` [n_atoms, n_windows], with ``lvals`` also
+                ``atom_l`` [n_atoms, n_l, n_windows] and ``l_labels``.
+        """
+        if projection is None or (lvals is not None and projection.lvals is None):
+            projection = PDOSProjection(symbols, atoms=atoms, lvals=lvals)
+        energies_full = np.array(full_energies_ev)
+        centre = 0 if self.shift_to_fermi else fermi_ev
+        contributions = {'windows': np.asarray(energy_windows, dtype=float)}
+        if lvals is None:
+            contributions['atom'] = window_integrals(projection.by_atom(raw_pdos),
+                                                     energies_full, centre, energy_windows)
+        else:
+            atom_l = window_integrals(projection.by_atom_l(raw_pdos),
+                                      energies_full, centre, energy_windows)
+            contributions['atom_l'] = atom_l
+            contributions['atom'] = atom_l.sum(axis=1)
+            contributions['l_labels'] = projection.orbital_labels()
+        return contributions
+
+    def _write_fermi_window_csv(self, contributions, symbols):
+        """Save per-atom (and per-atom-per-l) contributions of every window to a CSV file."""
+        windows = contributions['windows']
+        l_labels = contributions.get('l_labels', [])
+        with open(f'{self.save_path}-fermi_windows.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            header = ["Atom Index", "Symbol"]
+            for w in windows:
+                header.append(f"States {w:g} eV")
+                header.extend(f"{l} {w:g} eV" for l in l_labels)
+            writer.writerow(header)
+            for idx, sym in enumerate(symbols):
+                row = [idx + 1, sym]
+                for k in range(len(windows)):
+                    row.append(f"{contributions['atom'][idx, k]:.6f}")
+                    if l_labels:
+                        row.extend(f"{v:.6f}" for v in contributions['atom_l'][idx, :, k])
+                writer.writerow(row)
+
+    def _finish_figure(self, fig, path):
+        """Lay out and save a PDOS figure, quickly in preview mode."""
+        if self.preview:
+            fig.subplots_adjust(left=0.15, right=0.75)
+            fig.savefig(path, dpi=self.preview_dpi)
+        else:
+            fig.tight_layout()
+            fig.subplots_adjust(right=0.75)
+            fig.savefig(path, dpi=400, bbox_inches='tight')
+
+    def atom_contributions(self,
+                           full_energies_ev,
+                           raw_pdos,
+                           atoms,
+                           symbols,
+                           fermi_ev,
+                           energy_window,
+                           projection=None
+                           ):
+        """
+        Number of states of every atom within the window around
+        the Fermi level.
+
+        **Parameter:**
+            - full_energies_ev (np.ndarray): Full energy values.
+            - raw_pdos (np.ndarray): Raw PDOS array.
+            - atoms (np.ndarray): Atom indices per basis function.
+            - symbols (list): Atomic symbols.
+            - fermi_ev (float): Fermi energy in eV.
+            - energy_window (float): Energy window around the Fermi level.
+            - projection (PDOSProjection, optional): Reused projection.
+
+        **Returns:**
+            - list: ``(atom index, symbol, states)`` sorted by
+                decreasing number of states.
+        """
+        if projection is None:
+            projection = PDOSProjection(symbols, atoms=atoms)
+        fermi_contribution = self.fermi_window_contributions(full_energies_ev,
+                                                             raw_pdos,
+                                                             atoms,
+                                                             symbols,
+                                                             fermi_ev,
+                                                             [energy_window],
+                                                             projection=projection
+                                                             )['atom'][:, 0]
+        top_atoms = []
+        for k, atom_symbol in enumerate(projection.elements):
+            for idx in np.nonzero(projection.element_of_atom == k)[0]:
+                top_atoms.append((idx + 1, atom_symbol, fermi_contribution[idx]))
+        return sorted(top_atoms, key=lambda x: x[2], reverse=True)
+
+    def broadened_dos(self,
+                      full_energies_ev,
+                      raw_pdos,
+                      atoms,
+                      lvals,
+                      symbols,
+                      grid,
+                      width=0.1,
+                      kind='gaussian',
+                      dtype=np.float32
+                      ):
+        """
+        Total DOS and all projected channels, broadened and resampled
+        onto a shared energy grid.
+
+        The PDOS is first projected onto elements, angular momenta and
+        element/angular momentum pairs; all channels are then smeared in
+        one FFT convolution and interpolated onto ``grid``. With the same
+        grid for every structure the results can be stacked directly.
+
+        **Parameter:**
+            - full_energies_ev (np.ndarray): Full energy values.
+            - raw_pdos (np.ndarray): Raw PDOS array.
+            - atoms (np.ndarray): Atom indices per basis function.
+            - lvals (np.ndarray): Angular momentum indices.
+            - symbols (list): Atomic symbols.
+            - grid (np.ndarray): Shared energy grid in eV, on the same
+                scale as ``full_energies_ev``.
+            - width (float): Smearing width in eV.
+            - kind (str): ``'gaussian'`` or ``'lorentzian'``.
+            - dtype (np.dtype): Type of the returned DOS.
+
+        **Returns:**
+            - dict: ``energies_ev`` (the grid), ``dos`` [n_channels, n_grid]
+                and the channel ``labels``, starting with ``'Total'``.
+        """
+        projection = PDOSProjection(symbols, atoms=atoms, lvals=lvals)
+        channels = np.vstack([np.sum(raw_pdos, axis=0, dtype=float)[None, :],
+                              projection.by_element(raw_pdos),
+                              projection.by_l(raw_pdos),
+                              projection.by_element_l(raw_pdos)])
+        dos = resample(broaden(channels, full_energies_ev, width, kind), full_energies_ev, grid)
+        labels = ['Total'] + projection.elements + projection.orbital_labels() + \
+            [f'{element}-{self.orbital_labels.get(l, l)}' for element, l in projection.element_l_pairs]
+        return {'energies_ev': np.asarray(grid, dtype=float),
+                'dos': dos.astype(dtype),
+                'labels': labels}
+
+    def write_broadened_dos(self, broadened, fermi_ev, width, kind):
+        """
+        Save the output of :meth:`broadened_dos` to
+        ``{save_path}-dos-grid.npz``.
+
+        **Returns:**
+            - str: Path of the file.
+        """
+        path = f'{self.save_path}-dos-grid.npz'
+        np.savez(path,
+                 energies_ev=broadened['energies_ev'],
+                 dos=broadened['dos'],
+                 labels=np.array(broadened['labels']),
+                 fermi_ev=fermi_ev,
+                 shift_to_fermi=self.shift_to_fermi,
+                 width=width,
+                 kind=kind)
+        logging.info(f"Saved broadened DOS on {len(broadened['energies_ev'])} points to {path}")
+        return path
+
+    def rigid_band(self,
+                   full_energies_ev,
+                   raw_pdos,
+                   atoms,
+                   symbols,
+                   fermi_ev,
+                   added_electrons,
+                   electrons_per_state=1.0
+                   ):
+        """
+        Rigid-band Fermi levels and element filling after adding
+        electrons, see :func:`rigid_band_filling`.
+
+        **Parameter:**
+            - full_energies_ev (np.ndarray): Full energy values.
+            - raw_pdos (np.ndarray): Raw PDOS array.
+            - atoms (np.ndarray): Atom indices per basis function.
+            - symbols (list): Atomic symbols.
+            - fermi_ev (float): Fermi energy in eV.
+            - added_electrons (list): Electrons added per cell.
+            - electrons_per_state (float): Electrons per state of the DOS.
+
+        **Returns:**
+            - dict: Output of :func:`rigid_band_filling`, with the Fermi
+                levels on the scale of ``full_energies_ev``.
+        """
+        centre = 0 if self.shift_to_fermi else fermi_ev
+        return rigid_band_filling(full_energies_ev, raw_pdos, atoms, symbols, centre,
+                                  added_electrons, electrons_per_state=electrons_per_state)
+
+    def _write_rigid_band_csv(self, rigid):
+        """Save rigid-band Fermi levels and element filling to a CSV file."""
+        with open(f'{self.save_path}-rigid_band.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Added Electrons", "Fermi (eV)", "Shift (eV)"] + rigid['elements'])
+            for k, n in enumerate(rigid['added_electrons']):
+                writer.writerow([f"{n:g}", f"{rigid['fermi'][k]:.6f}", f"{rigid['shift'][k]:.6f}"] +
+                                [f"{v:.6f}" for v in rigid['element_filling'][k]])
+
+    def write_projected_dos(self,
+                            energies_ev,
+                            raw_pdos,
+                            atoms,
+                            lvals,
+                            symbols,
+                            energy_mask
+                            ):
+        """
+        Save the total, element-wise and orbital-wise PDOS inside
+        ``ylim`` to ``{save_path}-pdos.csv``.
+
+        **Parameter:**
+            - energies_ev (np.ndarray): Energy values (masked).
+            - raw_pdos (np.ndarray): Raw PDOS array.
+            - atoms (np.ndarray): Atom indices per basis function.
+            - lvals (np.ndarray): Angular momentum indices.
+            - symbols (list): Atomic symbols.
+            - energy_mask (np.ndarray): Energy mask.
+
+        **Returns:**
+            - str: Path of the CSV file.
+        """
+        projection = PDOSProjection(symbols, atoms=atoms, lvals=lvals)
+        window = np.asarray(raw_pdos)[:, energy_mask]
+        columns = [np.asarray(energies_ev, dtype=float)[None, :],
+                   window.sum(axis=0)[None, :],
+                   projection.by_element(window),
+                   projection.by_l(window)]
+        header = ["Energy (eV)", "Total DOS"] + projection.elements + projection.orbital_labels()
+        path = f'{self.save_path}-pdos.csv'
+        np.savetxt(path, np.vstack(columns).T, fmt='%.6f', delimiter=',',
+                   header=','.join(header), comments='')
+        return path
+
     def plot_by_atom(self,
                      energies_ev,
                      full_energies_ev,
@@ -240,43 +783,31 @@ class PDOSPlotter:
 
         **Returns:**
             - matplotlib.axes.Axes: Axes of the plot.
-            - list: Sorted list of atom contributions
-                to the Fermi level.
+            - list: Sorted list of the number of states
+                of every atom within the window around the Fermi level.
         """
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots(figsize=(6, 10))
         bottom = np.zeros_like(energies_ev)
-        top_atoms = []
 
-        unique_symbols = list(dict.fromkeys(symbols))
-        # colors = plt.cm.tab10(np.linspace(0, 1, len(unique_symbols)))
-        # colors = [ATOM_COLORS.get(sym, 'gray') for sym in unique_symbols]
-
-        energies_full = np.array(full_energies_ev)
-        near_fermi_mask = np.abs(energies_full - fermi_ev) <= energy_window
+        projection = PDOSProjection(symbols, atoms=atoms)
+        element_pdos = projection.by_element(raw_pdos)
+        sorted_top = self.atom_contributions(full_energies_ev,
+                                             raw_pdos,
+                                             atoms,
+                                             symbols,
+                                             fermi_ev,
+                                             energy_window,
+                                             projection=projection
+                                             )
 
         atom_contributions = {}
-        for atom_symbol in unique_symbols:
-            atom_indices = [i for i, sym in enumerate(symbols)
-                            if sym == atom_symbol]
-            basis_indices = np.\
-                concatenate([np.where(atoms == (idx + 1))[0]
-                             for idx in atom_indices]
-                            )
-            pdos_total = np.sum(raw_pdos[basis_indices, :], axis=0)
-            pdos_sum = pdos_total[energy_mask]
-            atom_contributions[atom_symbol] = pdos_sum
-
-            # fermi_contribution = (np.trapz(pdos_total[near_fermi_mask], x=energies_full[near_fermi_mask])
-            #                       if np.sum(near_fermi_mask) >= 2 else np.sum(pdos_total[near_fermi_mask]))
-            fermi_contribution = np.trapz(pdos_total[near_fermi_mask],
-                                          x=energies_full[near_fermi_mask])
-            for idx in atom_indices:
-                top_atoms.append((idx + 1, atom_symbol, fermi_contribution))
+        for k, atom_symbol in enumerate(projection.elements):
+            atom_contributions[atom_symbol] = element_pdos[k][energy_mask]
 
         # sorted_atoms = sorted(atom_contributions.items(), key=lambda x: np.max(x[1]), reverse=True)
         sorted_atoms = sorted(atom_contributions.items(),
                               key=lambda x: np.max(x[1]))
-        sorted_top = sorted(top_atoms, key=lambda x: x[2], reverse=True)
         index = 0
         for atom_symbol, pdos_sum in sorted_atoms:
             color = ATOM_COLORS.get(atom_symbol, 'gray')
@@ -284,7 +815,8 @@ class PDOSPlotter:
                              bottom,
                              bottom + pdos_sum, color=color,
                              alpha=0.9-index,
-                             label=atom_symbol)
+                             label=atom_symbol,
+                             rasterized=self.preview)
             bottom += pdos_sum
             index += 0.1
 
@@ -337,10 +869,7 @@ class PDOSPlotter:
         ax.tick_params(labelsize=14)
         ax.set_xlim(left=0)
         ax.set_ylim(*self.ylim)
-        fig.tight_layout()
-        plt.subplots_adjust(right=0.75)
-        fig.savefig(f'{self.save_path}-by-atoms.png',
-                    dpi=400, bbox_inches='tight')
+        self._finish_figure(fig, f'{self.save_path}-by-atoms.png')
         # plt.show()
 
         return ax, sorted_top
@@ -364,21 +893,23 @@ class PDOSPlotter:
         Returns:
             matplotlib.axes.Axes: Axes of the plot.
         """
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots(figsize=(6, 10))
         bottom = np.zeros_like(energies_ev)
 
-        for orb in self.orbital_labels.values():
-            indices =\
-                np.where(lvals==list(self.orbital_labels.keys())[list(self.orbital_labels.values()).index(orb)])[0]
-            if len(indices) > 0:
-                pdos_sum =\
-                    np.sum(raw_pdos[indices, :], axis=0)[energy_mask]
+        projection = PDOSProjection([], lvals=lvals)
+        orbital_pdos = projection.by_l(raw_pdos)
+        for l, pdos_total in zip(projection.l_values, orbital_pdos):
+            if l in self.orbital_labels:
+                orb = self.orbital_labels[l]
+                pdos_sum = pdos_total[energy_mask]
                 ax.fill_betweenx(energies_ev,
                                  bottom,
                                  bottom + pdos_sum,
                                  color=self.orbital_colors[orb],
                                  alpha=0.9,
-                                 label=orb)
+                                 label=orb,
+                                 rasterized=self.preview)
                 bottom += pdos_sum
         total_dos = np.sum(raw_pdos, axis=0)[energy_mask]
         ax.plot(total_dos, energies_ev, color='black', linewidth=1.5, label='Total DOS')
@@ -400,12 +931,7 @@ class PDOSPlotter:
         ax.tick_params(labelsize=14)
         ax.set_xlim(left=0)
         ax.set_ylim(*self.ylim)
-        fig.tight_layout()
-        plt.subplots_adjust(right=0.75)
-        fig.savefig(f'{self.save_path}-by-orbitals.png',
-                    dpi=400,
-                    bbox_inches='tight'
-                    )
+        self._finish_figure(fig, f'{self.save_path}-by-orbitals.png')
         # plt.show()
 
         return ax
@@ -413,7 +939,14 @@ class PDOSPlotter:
     def plot(self,
              energy_window=0.2,
              plot_atoms=True,
-             plot_orbitals=True
+             plot_orbitals=True,
+             sweep_windows=None,
+             data_only=False,
+             grid=None,
+             smearing=0.1,
+             smearing_kind='gaussian',
+             added_electrons=None,
+             electrons_per_state=1.0
              ):
         """
         Main method to generate plots for atom-wise
@@ -426,23 +959,44 @@ class PDOSPlotter:
                 atom-wise PDOS plot.
             - plot_orbitals (bool): Whether to generate
                 orbital-wise PDOS plot.
+            - sweep_windows (list, optional): Energy windows (in eV)
+                for which per-atom and per-atom-per-l contributions
+                are written to ``{save_path}-fermi_windows.csv``.
+            - data_only (bool): Write the projected DOS to
+                ``{save_path}-pdos.csv`` and the atom contributions
+                instead of plotting; matplotlib is not imported.
+            - grid (np.ndarray, optional): Shared energy grid; the
+                broadened DOS on it is written to
+                ``{save_path}-dos-grid.npz``.
+            - smearing (float): Smearing width in eV for ``grid``.
+            - smearing_kind (str): ``'gaussian'`` or ``'lorentzian'``.
+            - added_electrons (list, optional): Electron counts for
+                which rigid-band Fermi levels and element filling are
+                written to ``{save_path}-rigid_band.csv``.
+            - electrons_per_state (float): Electrons per state of the
+                DOS for ``added_electrons``, see :meth:`rigid_band`.
         """
-        data_json = {}
         energies_ev, full_energies_ev, raw_pdos, atoms, lvals, symbols, energy_mask, fermi_ev =\
             self.load_data()
-        data_json['energies_ev'] = energies_ev.tolist()
-        data_json['full_energies_ev'] = full_energies_ev.tolist()
-        data_json['raw_pdos'] = raw_pdos
-        data_json['atoms'] = atoms
-        data_json['lvals'] = lvals
-        data_json['symbols'] = symbols
-        data_json['energy_mask'] = energy_mask
-        data_json['fermi_ev'] = fermi_ev
-        filetyper.write_minified_json_gz(data_json, f'{self.save_path}-json.gz')
-
-
-
 
+        if added_electrons is not None:
+            self._write_rigid_band_csv(self.rigid_band(full_energies_ev, raw_pdos, atoms, symbols,
+                                                       fermi_ev, added_electrons,
+                                                       electrons_per_state=electrons_per_state))
+        if grid is not None:
+            broadened = self.broadened_dos(full_energies_ev, raw_pdos, atoms, lvals, symbols,
+                                           grid, width=smearing, kind=smearing_kind)
+            self.write_broadened_dos(broadened, fermi_ev, smearing, smearing_kind)
+        if data_only:
+            self.write_projected_dos(energies_ev, raw_pdos, atoms, lvals, symbols, energy_mask)
+            self.write_atom_contribution_csv(self.atom_contributions(full_energies_ev,
+                                                                      raw_pdos,
+                                                                      atoms,
+                                                                      symbols,
+                                                                      fermi_ev,
+                                                                      energy_window
+                                                                      ))
+            plot_atoms = plot_orbitals = False
         if plot_atoms:
             ax, sorted_top = self.plot_by_atom(energies_ev,
                                                full_energies_ev,
@@ -453,7 +1007,17 @@ class PDOSPlotter:
                                                fermi_ev,
                                                energy_window
                                                )
-            self._write_atom_contribution_csv(sorted_top)
+            self.write_atom_contribution_csv(sorted_top)
+        if sweep_windows:
+            contributions = self.fermi_window_contributions(full_energies_ev,
+                                                            raw_pdos,
+                                                            atoms,
+                                                            symbols,
+                                                            fermi_ev,
+                                                            sweep_windows,
+                                                            lvals=lvals
+                                                            )
+            self._write_fermi_window_csv(contributions, symbols)
         if plot_orbitals:
             self.plot_by_orbital(energies_ev,
                                  raw_pdos,
@@ -489,6 +1053,62 @@ def main():
                         default=0.2,
                         help="Energy window around Fermi level (eV)"
                         )
+    parser.add_argument("--sweep",
+                        nargs="+",
+                        type=float,
+                        default=None,
+                        help="Energy windows (eV) for the per-atom contribution sweep"
+                        )
+    parser.add_argument("--no_cache",
+                        action="store_true",
+                        help="Always read the RKF file and do not write the binary DOS cache"
+                        )
+    parser.add_argument("--windowed",
+                        action="store_true",
+                        help="Read only the energies inside ylim, as float32"
+                        )
+    parser.add_argument("--drop_threshold",
+                        type=float,
+                        default=None,
+                        help="Drop basis functions with fewer states inside ylim than this fraction of the largest"
+                        )
+    parser.add_argument("--grid",
+                        nargs=3,
+                        type=float,
+                        default=None,
+                        metavar=("EMIN", "EMAX", "STEP"),
+                        help="Write the broadened DOS on this shared energy grid (eV)"
+                        )
+    parser.add_argument("--smearing",
+                        type=float,
+                        default=0.1,
+                        help="Smearing width (eV) for --grid"
+                        )
+    parser.add_argument("--smearing_kind",
+                        choices=["gaussian", "lorentzian"],
+                        default="gaussian",
+                        help="Line shape for --grid"
+                        )
+    parser.add_argument("--add_electrons",
+                        nargs="+",
+                        type=float,
+                        default=None,
+                        help="Electrons added per cell for rigid-band Fermi level shifts"
+                        )
+    parser.add_argument("--electrons_per_state",
+                        type=float,
+                        default=1.0,
+                        help="Electrons held by one state of the DOS for --add_electrons, "
+                             "e.g. 2 for spin-restricted calculations"
+                        )
+    parser.add_argument("--preview",
+                        action="store_true",
+                        help="Fast low-resolution plots with rasterized fills"
+                        )
+    parser.add_argument("--data_only",
+                        action="store_true",
+                        help="Write the projected DOS and contributions as CSV without plotting"
+                        )
     parser.add_argument("--no_atoms",
                         action="store_true",
                         help="Skip plotting atom-wise PDOS"
@@ -500,14 +1120,34 @@ def main():
 
     args = parser.parse_args()
 
+    grid = None
+    if args.grid is not None:
+        try:
+            grid = energy_grid(*args.grid)
+        except ValueError as error:
+            parser.error(str(error))
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
     plotter = PDOSPlotter(
         path_to_rkf=args.rkf_path,
         ylim=tuple(args.ylim),
         save_path=args.save_path,
-        shift_to_fermi=args.shift_to_fermi
+        shift_to_fermi=args.shift_to_fermi,
+        cache=not args.no_cache,
+        windowed=args.windowed,
+        drop_threshold=args.drop_threshold,
+        preview=args.preview
         )
 
     plotter.plot(energy_window=args.window,
                  plot_atoms=not args.no_atoms,
-                 plot_orbitals=not args.no_orbitals
+                 plot_orbitals=not args.no_orbitals,
+                 sweep_windows=args.sweep,
+                 data_only=args.data_only,
+                 grid=grid,
+                 smearing=args.smearing,
+                 smearing_kind=args.smearing_kind,
+                 added_electrons=args.add_electrons,
+                 electrons_per_state=args.electrons_per_state
                  )
\ No newline at end of file
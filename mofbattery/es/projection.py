@@ -0,0 +1,203 @@
+"""
+Sparse grouping of basis-function PDOS into atom, element and orbital views.
+
+AMS BAND writes the DOS per basis function together with the atom and the
+angular momentum of every basis function. Each view of the projected DOS
+is a sum over groups of basis functions, so it is written here as one
+sparse ``[n_groups, n_basis]`` 0/1 matrix, built once, times the
+``[n_basis, n_energies]`` PDOS matrix. Integrals of the views over energy
+windows come from one running trapezoid integral per curve.
+"""
+
+import numpy as np
+from scipy import sparse
+
+ORBITAL_LABELS = {0: 's', 1: 'p', 2: 'd', 3: 'f', 4: 'g', 5: 'h'}
+
+
+def grouping_matrix(group_of_basis, n_groups=None):
+    """
+    Sparse matrix summing basis functions into groups.
+
+    **parameters:**
+        group_of_basis (array-like): [n_basis] group index of every basis
+            function, from 0.
+        n_groups (int, optional): Number of groups, defaults to the largest
+            index plus one.
+
+    **returns:**
+        scipy.sparse.csr_matrix: [n_groups, n_basis] with a one at
+        ``(group_of_basis[b], b)``.
+    """
+    group_of_basis = np.asarray(group_of_basis, dtype=np.int64)
+    n_basis = len(group_of_basis)
+    if n_groups is None:
+        n_groups = int(group_of_basis.max()) + 1 if n_basis else 0
+    return sparse.csr_matrix((np.ones(n_basis), (group_of_basis, np.arange(n_basis))),
+                             shape=(n_groups, n_basis))
+
+
+class PDOSProjection:
+    """
+    Projection of the DOS per basis function onto atoms, elements, angular
+    momenta and element/angular momentum pairs.
+
+    The grouping matrices are built on first use and reused for every
+    PDOS matrix projected afterwards.
+
+    **parameters:**
+        symbols (list): Atomic symbols, one per atom.
+        atoms (array-like, optional): 1-based atom index per basis function,
+            as in ``Atom per basis function``.
+        lvals (array-like, optional): Angular momentum per basis function,
+            as in ``L-value per basis function``.
+    """
+
+    def __init__(self, symbols, atoms=None, lvals=None):
+        self.symbols = list(symbols)
+        self.atoms = None if atoms is None else np.asarray(atoms, dtype=np.int64) - 1
+        self.lvals = None if lvals is None else np.asarray(lvals, dtype=np.int64)
+        # elements in order of first appearance
+        self.elements = list(dict.fromkeys(self.symbols))
+        self.element_of_atom = np.array([self.elements.index(sym) for sym in self.symbols], dtype=np.int64)
+        self.l_values = [] if self.lvals is None else np.unique(self.lvals).tolist()
+        # (element, l) of every row of the element_l view, set when it is built
+        self.element_l_pairs = None
+        self._matrices = {}
+
+    def _require(self, name):
+        if getattr(self, name) is None:
+            raise ValueError(f"PDOSProjection was built without '{name}'")
+
+    def _matrix(self, key):
+        """Build and cache the grouping matrix of a view."""
+        if key in self._matrices:
+            return self._matrices[key]
+        if key == 'atom':
+            self._require('atoms')
+            matrix = grouping_matrix(self.atoms, len(self.symbols))
+        elif key == 'element':
+            self._require('atoms')
+            matrix = grouping_matrix(self.element_of_atom[self.atoms], len(self.elements))
+        elif key == 'l':
+            self._require('lvals')
+            matrix = grouping_matrix(np.searchsorted(self.l_values, self.lvals), len(self.l_values))
+        elif key == 'element_l':
+            self._require('atoms')
+            self._require('lvals')
+            pair = self.element_of_atom[self.atoms] * len(self.l_values) + \
+                np.searchsorted(self.l_values, self.lvals)
+            present, group = np.unique(pair, return_inverse=True)
+            self.element_l_pairs = [(self.elements[p // len(self.l_values)], self.l_values[p % len(self.l_values)])
+                                    for p in present]
+            matrix = grouping_matrix(group, len(present))
+        elif key == 'atom_l':
+            self._require('atoms')
+            self._require('lvals')
+            matrix = grouping_matrix(self.atoms * len(self.l_values) + np.searchsorted(self.l_values, self.lvals),
+                                     len(self.symbols) * len(self.l_values))
+        else:
+            raise KeyError(key)
+        self._matrices[key] = matrix
+        return matrix
+
+    def project(self, raw_pdos, key):
+        """
+        Sum the rows of a basis-function matrix into the groups of a view.
+
+        **parameters:**
+            raw_pdos (np.ndarray): [n_basis, ...] PDOS or integrated PDOS.
+            key (str): ``'atom'``, ``'element'``, ``'l'``, ``'element_l'``
+                or ``'atom_l'``.
+
+        **returns:**
+            np.ndarray: [n_groups, ...] projected values.
+        """
+        raw_pdos = np.asarray(raw_pdos)
+        matrix = self._matrix(key)
+        return np.asarray(matrix @ raw_pdos.reshape(len(raw_pdos), -1)).reshape((matrix.shape[0],) + raw_pdos.shape[1:])
+
+    def by_atom(self, raw_pdos):
+        """PDOS per atom, [n_atoms, n_energies] in atom order."""
+        return self.project(raw_pdos, 'atom')
+
+    def by_element(self, raw_pdos):
+        """PDOS per element, [n_elements, n_energies] in ``elements`` order."""
+        return self.project(raw_pdos, 'element')
+
+    def by_l(self, raw_pdos):
+        """PDOS per angular momentum, [n_l, n_energies] in ``l_values`` order."""
+        return self.project(raw_pdos, 'l')
+
+    def by_element_l(self, raw_pdos):
+        """PDOS per element and angular momentum in ``element_l_pairs`` order."""
+        return self.project(raw_pdos, 'element_l')
+
+    def by_atom_l(self, raw_pdos):
+        """PDOS per atom and angular momentum, [n_atoms, n_l, n_energies]."""
+        values = self.project(raw_pdos, 'atom_l')
+        return values.reshape((len(self.symbols), len(self.l_values)) + values.shape[1:])
+
+    def orbital_labels(self):
+        """Orbital letters of ``l_values``."""
+        return [ORBITAL_LABELS.get(l, str(l)) for l in self.l_values]
+
+
+def cumulative_trapezoid(values, x):
+    """
+    Running trapezoid integral along the last axis, starting at zero.
+
+    **parameters:**
+        values (np.ndarray): [..., n] samples.
+        x (np.ndarray): [n] sample positions.
+
+    **returns:**
+        np.ndarray: [..., n] integral from ``x[0]`` to every ``x[k]``.
+    """
+    values = np.asarray(values, dtype=float)
+    steps = 0.5 * (values[..., 1:] + values[..., :-1]) * np.diff(x)
+    cumulative = np.zeros(values.shape)
+    np.cumsum(steps, axis=-1, out=cumulative[..., 1:])
+    return cumulative
+
+
+def window_bounds(x, centre, windows):
+    """
+    First and last sample inside every window ``|x - centre| <= window``.
+
+    **parameters:**
+        x (np.ndarray): [n] ascending sample positions.
+        centre (float): Window centre, e.g. the Fermi energy.
+        windows (array-like): [n_windows] half widths.
+
+    **returns:**
+        tuple: [n_windows] ``start`` and ``stop`` indices (inclusive) and a
+        boolean ``valid`` marking windows with at least two samples.
+    """
+    inside = np.abs(np.asarray(x)[None, :] - centre) <= np.asarray(windows, dtype=float).reshape(-1, 1)
+    start = np.argmax(inside, axis=1)
+    stop = inside.shape[1] - 1 - np.argmax(inside[:, ::-1], axis=1)
+    valid = inside.sum(axis=1) >= 2
+    return start, stop, valid
+
+
+def window_integrals(values, x, centre, windows):
+    """
+    Trapezoid integrals of many curves over many windows around ``centre``.
+
+    The running integral is computed once, so every window costs one
+    subtraction. Each window integrates the samples with
+    ``|x - centre| <= window``, as ``np.trapz(values[mask], x[mask])``.
+
+    **parameters:**
+        values (np.ndarray): [..., n] curves, e.g. PDOS per atom.
+        x (np.ndarray): [n] ascending sample positions.
+        centre (float): Window centre.
+        windows (array-like): [n_windows] half widths.
+
+    **returns:**
+        np.ndarray: [..., n_windows] integrals.
+    """
+    cumulative = cumulative_trapezoid(values, x)
+    start, stop, valid = window_bounds(x, centre, windows)
+    return np.where(valid, cumulative[..., stop] - cumulative[..., start], 0.0)
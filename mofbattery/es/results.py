@@ -0,0 +1,171 @@
+"""
+Memoized access to the results in an AMS BAND RKF file.
+
+:class:`RKFResult` opens the file once and keeps every variable it has
+read, so band structure, DOS and combined plots working on the same
+calculation share one object and read every variable at most once.
+``read`` and ``read_section`` behave like those of ``KFFile``, so the
+object can be used wherever a ``KFFile`` is read from. Memoized arrays are
+read-only, as they are shared between all users of the object.
+"""
+
+import os
+from collections import OrderedDict
+import numpy as np
+from read_rkf.parserkf import KFFile
+from mofbattery.read_write.rkf_arrays import read_kf_array, read_kf_matrix_window
+
+HaToEv = 27.2113845249047
+
+
+class RKFResult:
+    """
+    Results of one RKF file, read on first use and kept afterwards.
+
+    **parameters:**
+        path (str): Path to the RKF file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._kf = None
+        self._values = {}
+        self._arrays = {}
+
+    @property
+    def kf(self):
+        """``KFFile`` of the result, opened on first use; raises
+        ``FileNotFoundError`` when the file does not exist."""
+        if self._kf is None:
+            kf = KFFile(self.path)
+            if kf.reader is None:
+                # KFFile leaves the reader unset for a missing file
+                raise FileNotFoundError(self.path)
+            self._kf = kf
+        return self._kf
+
+    @property
+    def reader(self):
+        """Low level ``KFReader`` of the file, with its index built."""
+        reader = self.kf.reader
+        if reader._sections is None:
+            reader._create_index()
+        return reader
+
+    def variables(self, section):
+        """Names of the variables of a section."""
+        return list(self.reader._sections.get(section, {}))
+
+    def read(self, section, variable):
+        """
+        Value of a variable as returned by ``KFFile.read``, memoized.
+
+        **parameters:**
+            section (str): Section name.
+            variable (str): Variable name.
+
+        **returns:**
+            Number, bool, string or list, see ``KFFile.read``.
+        """
+        key = (section, variable)
+        if key not in self._values:
+            self._values[key] = self.kf.read(section, variable)
+        return self._values[key]
+
+    def read_section(self, section):
+        """
+        All variables of a section, as ``KFFile.read_section``, memoized
+        per variable.
+
+        **parameters:**
+            section (str): Section name.
+
+        **returns:**
+            dict: Variable name to value.
+        """
+        return {variable: self.read(section, variable) for variable in self.variables(section)}
+
+    def array(self, section, variable, dtype=None):
+        """
+        Numeric variable as a NumPy array read straight from the file,
+        memoized per dtype.
+
+        **parameters:**
+            section (str): Section name.
+            variable (str): Variable name.
+            dtype (np.dtype, optional): See ``read_kf_array``.
+
+        **returns:**
+            np.ndarray: [n] read-only values.
+        """
+        key = (section, variable, None if dtype is None else np.dtype(dtype).str)
+        if key not in self._arrays:
+            values = read_kf_array(self.reader, section, variable, dtype=dtype)
+            values.setflags(write=False)
+            self._arrays[key] = values
+        return self._arrays[key]
+
+    def matrix_window(self, section, variable, n_columns, start=0, stop=None, dtype=np.float32):
+        """Columns of a matrix variable, see ``read_kf_matrix_window``; not memoized."""
+        return read_kf_matrix_window(self.reader, section, variable, n_columns, start, stop, dtype=dtype)
+
+    def symbols(self):
+        """Atomic symbols of the system."""
+        return self.read('Molecule', 'AtomSymbols').split()
+
+    def dos_energies(self):
+        """DOS energies in eV."""
+        return self.array('DOS', 'Energies') * HaToEv
+
+    def dos_fermi_energy(self):
+        """Fermi energy of the DOS section in eV."""
+        return self.read('DOS', 'Fermi Energy') * HaToEv
+
+    def pdos(self):
+        """[n_basis, n_energies] DOS per basis function."""
+        return self.array('DOS', 'DOS per basis function').reshape(-1, len(self.array('DOS', 'Energies')))
+
+    def basis_atoms(self):
+        """1-based atom of every basis function."""
+        return self.array('DOS', 'Atom per basis function')
+
+    def basis_lvals(self):
+        """Angular momentum of every basis function."""
+        return self.array('DOS', 'L-value per basis function')
+
+    def clear(self):
+        """Forget all memoized values, e.g. after the file was rewritten."""
+        self._kf = None
+        self._values.clear()
+        self._arrays.clear()
+
+
+# results of the most recently requested files, oldest first
+_RESULTS = OrderedDict()
+MAX_RESULTS = 4
+
+
+def load_result(path):
+    """
+    Shared :class:`RKFResult` of a file, created on first request and
+    replaced when the file changes on disk. Only the ``MAX_RESULTS`` most
+    recently requested files are kept, so a loop over many files does not
+    hold all their arrays.
+
+    **parameters:**
+        path (str): Path to the RKF file.
+
+    **returns:**
+        RKFResult: Result object of the file.
+    """
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _RESULTS.get(key)
+    if cached is None or cached[0] != signature:
+        cached = (signature, RKFResult(path))
+        _RESULTS[key] = cached
+    _RESULTS.move_to_end(key)
+    if len(_RESULTS) > MAX_RESULTS:
+        _RESULTS.popitem(last=False)
+    return cached[1]
@@ -0,0 +1,111 @@
+"""
+Rigid-band estimates of where the Fermi level moves when electrons are
+added to (or removed from) a framework, e.g. by inserted Li or Na.
+
+The bands are assumed not to change on insertion. The integrated DOS
+``N(E)`` is built once; every electron count ``n`` is then converted to the
+energy where ``N`` has grown by ``n`` from its value at the Fermi level,
+for all counts at once. The electrons gained by every element follow from
+the integrated element PDOS between the old and the new Fermi level.
+Negative PDOS values are clipped per element and the total integrated
+DOS is the sum of the element ones, so the element filling always adds
+up to the electrons added.
+"""
+
+import numpy as np
+from mofbattery.es.projection import PDOSProjection, cumulative_trapezoid
+
+
+def _interpolation_weights(x, points):
+    """Left index and weight of linear interpolation of ``points`` on ``x``."""
+    idx = np.clip(np.searchsorted(x, points, side='right') - 1, 0, len(x) - 2)
+    weight = (points - x[idx]) / (x[idx + 1] - x[idx])
+    return idx, np.clip(weight, 0, 1)
+
+
+def rigid_band_fermi_levels(energies_ev, cumulative, fermi, added_electrons, electrons_per_state=1.0):
+    """
+    Fermi levels after adding electrons, for many electron counts at once.
+
+    **parameters:**
+        energies_ev (np.ndarray): [n_energies] ascending energies.
+        cumulative (np.ndarray): [n_energies] non-decreasing integrated
+            DOS, e.g. the running integral of the clipped DOS.
+        fermi (float): Fermi level on the scale of ``energies_ev``.
+        added_electrons (array-like): [n_counts] electrons added per cell,
+            negative for removed electrons.
+        electrons_per_state (float): Electrons held by one state of the
+            DOS, e.g. 2 when the DOS of a spin-restricted calculation
+            counts spatial orbitals only.
+
+    **returns:**
+        np.ndarray: [n_counts] shifted Fermi levels; NaN where the
+        electrons do not fit into the energy range of the DOS.
+    """
+    energies_ev = np.asarray(energies_ev, dtype=float)
+    added = np.atleast_1d(np.asarray(added_electrons, dtype=float))
+    idx, weight = _interpolation_weights(energies_ev, np.array([fermi]))
+    n_fermi = cumulative[idx] * (1 - weight) + cumulative[idx + 1] * weight
+    target = n_fermi + added / electrons_per_state
+
+    # first energy at which the target count is reached, so a filling that
+    # ends in a gap lands on the band edge the electrons go to
+    right = np.clip(np.searchsorted(cumulative, target, side='left'), 1, len(energies_ev) - 1)
+    left = right - 1
+    rise = cumulative[right] - cumulative[left]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(rise > 0, (target - cumulative[left]) / rise, 1.0)
+    levels = energies_ev[left] + np.clip(fraction, 0, 1) * (energies_ev[right] - energies_ev[left])
+    levels = np.where(added == 0, fermi, levels)
+    outside = (target < cumulative[0]) | (target > cumulative[-1])
+    return np.where(outside, np.nan, levels)
+
+
+def rigid_band_filling(energies_ev,
+                       raw_pdos,
+                       atoms,
+                       symbols,
+                       fermi,
+                       added_electrons,
+                       electrons_per_state=1.0,
+                       projection=None):
+    """
+    Shifted Fermi levels and the electrons taken up by every element.
+
+    **parameters:**
+        energies_ev (np.ndarray): [n_energies] ascending energies.
+        raw_pdos (np.ndarray): [n_basis, n_energies] PDOS.
+        atoms (np.ndarray): 1-based atom per basis function.
+        symbols (list): Atomic symbols.
+        fermi (float): Fermi level on the scale of ``energies_ev``.
+        added_electrons (array-like): [n_counts] electrons added per cell.
+        electrons_per_state (float): See :func:`rigid_band_fermi_levels`.
+        projection (PDOSProjection, optional): Reused projection.
+
+    **returns:**
+        dict: ``added_electrons``, ``fermi`` ([n_counts] new Fermi
+        levels), ``shift`` (new minus old Fermi level), ``elements`` and
+        ``element_filling`` ([n_counts, n_elements] electrons gained by
+        every element, NaN where the Fermi level is NaN).
+    """
+    if projection is None:
+        projection = PDOSProjection(symbols, atoms=atoms)
+    energies_ev = np.asarray(energies_ev, dtype=float)
+    added = np.atleast_1d(np.asarray(added_electrons, dtype=float))
+
+    # both integrals from the same clipped element PDOS, so the element
+    # filling sums to the electrons added
+    element_cumulative = cumulative_trapezoid(np.clip(projection.by_element(raw_pdos), 0, None), energies_ev)
+    cumulative = element_cumulative.sum(axis=0)
+    levels = rigid_band_fermi_levels(energies_ev, cumulative, fermi, added, electrons_per_state)
+
+    # element occupation at the old and at every new Fermi level in one gather
+    idx, weight = _interpolation_weights(energies_ev, np.append(np.nan_to_num(levels, nan=fermi), fermi))
+    occupation = element_cumulative[:, idx] * (1 - weight) + element_cumulative[:, idx + 1] * weight
+    filling = (occupation[:, :-1] - occupation[:, -1:]).T * electrons_per_state
+    filling[np.isnan(levels)] = np.nan
+    return {'added_electrons': added,
+            'fermi': levels,
+            'shift': levels - fermi,
+            'elements': list(projection.elements),
+            'element_filling': filling}
@@ -0,0 +1,193 @@
+"""
+Cascaded deduplication of large structure libraries.
+
+Pairs of structures are filtered by three increasingly expensive stages:
+
+1. exact composition hash buckets,
+2. cosine similarity of cheap descriptors or GNN embeddings,
+3. graph edit distance on the surviving near-duplicates.
+
+Only pairs inside the same bucket are ever compared, so the cost grows
+with the bucket sizes rather than with the square of the library size.
+"""
+
+import time
+import hashlib
+from functools import reduce
+from math import gcd
+import numpy as np
+from ase.data import chemical_symbols
+from mofbattery.graph.similarity import GraphSimilarityCalculator, graph_descriptor
+from mofbattery.graph.pairwise import pair_list_edit_distance, STATUS_OK, STATUS_TIMEOUT
+
+
+def composition_key(graph, reduced=False):
+    """
+    Hash the chemical composition of a graph. For coarse-grained graphs the
+    composition is the multiset of building unit labels.
+
+    **parameters**
+        graph (Data): Graph whose first node feature is the atomic number.
+        reduced (bool): Divide the element counts by their greatest common
+            divisor, so supercells share the key of their primitive cell.
+
+    **returns**
+        str: Hex digest of the alphabetically ordered formula.
+    """
+    node_label = getattr(graph, 'node_label', None)
+    if node_label is not None:
+        present, values = np.unique(node_label.cpu().numpy(), return_counts=True)
+        names = [str(label) for label in present]
+    else:
+        counts = np.bincount(graph.x[:, 0].cpu().numpy().astype(np.int64))
+        present = np.nonzero(counts)[0]
+        values = counts[present]
+        names = [chemical_symbols[z] for z in present]
+    if reduced and len(values) > 0:
+        values = values // reduce(gcd, values.tolist())
+    formula = ''.join(f"{name}{n}" for name, n in sorted(zip(names, values)))
+    return hashlib.sha1(formula.encode()).hexdigest()
+
+
+def _stage_report(name, pairs_in, pairs_out, start):
+    """Summarise how many pairs a stage removed."""
+    pruned = pairs_in - pairs_out
+    return {'stage': name,
+            'pairs_in': int(pairs_in),
+            'pairs_out': int(pairs_out),
+            'pruned': int(pruned),
+            'pruned_fraction': float(pruned / pairs_in) if pairs_in else 0.0,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def _bucket_candidate_pairs(members, embeddings, threshold, chunk_size):
+    """Pairs inside one bucket whose embedding cosine similarity reaches threshold."""
+    vectors = embeddings[members]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    found = []
+    for start in range(0, len(members), chunk_size):
+        block = vectors[start:start + chunk_size] @ vectors.T
+        rows, cols = np.nonzero(block >= threshold)
+        rows = rows + start
+        keep = rows < cols
+        found.append(np.stack([members[rows[keep]], members[cols[keep]]], axis=1))
+    return np.concatenate(found) if found else np.empty((0, 2), dtype=np.int64)
+
+
+def _union_find_labels(n_items, pairs):
+    """Connected-component labels for the duplicate pairs."""
+    parent = np.arange(n_items)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    return np.array([find(i) for i in range(n_items)])
+
+
+def deduplicate(graphs,
+                descriptor='descriptor',
+                descriptor_threshold=0.98,
+                ged_threshold=0.95,
+                reduced_composition=False,
+                calculator=None,
+                ged_timeout=10.0,
+                n_workers=None,
+                checkpoint_dir=None,
+                chunk_size=2048,
+                verbose=True):
+    """
+    Group near-duplicate structures with a composition / descriptor / edit
+    distance cascade.
+
+    **parameters**
+        graphs (list of Data): Graphs from ``ase_to_pytorch_geometric``.
+        descriptor (str): ``'descriptor'`` for :func:`graph_descriptor` or
+            ``'gnn'`` for GNN embeddings from the calculator's session.
+        descriptor_threshold (float): Minimum cosine similarity for a pair
+            to reach the edit distance stage.
+        ged_threshold (float): Minimum edit distance similarity for a pair
+            to count as a duplicate. Timed-out pairs only count when their
+            lower-bound similarity already reaches the threshold.
+        reduced_composition (bool): Bucket by reduced formula.
+        calculator (GraphSimilarityCalculator, optional): Supplies the GNN
+            encoder when ``descriptor='gnn'``.
+        ged_timeout (float): Per-pair edit distance time limit in seconds.
+        n_workers (int, optional): Worker processes for the edit distance stage.
+        checkpoint_dir (str, optional): Checkpoint directory for the edit
+            distance stage.
+        chunk_size (int): Rows per block in the descriptor similarity stage.
+        verbose (bool): Print the per-stage pruning report.
+
+    **returns**
+        dict: ``labels`` (cluster representative per structure),
+        ``representatives`` (indices of unique structures), ``duplicates``
+        (accepted pairs) and ``stages`` (per-stage pruning reports).
+    """
+    n_graphs = len(graphs)
+    stages = []
+
+    # Stage 1: exact composition buckets
+    start = time.perf_counter()
+    buckets = {}
+    for idx, graph in enumerate(graphs):
+        buckets.setdefault(composition_key(graph, reduced_composition), []).append(idx)
+    buckets = [np.array(members) for members in buckets.values() if len(members) > 1]
+    all_pairs = n_graphs * (n_graphs - 1) // 2
+    bucket_pairs = sum(len(m) * (len(m) - 1) // 2 for m in buckets)
+    stages.append(_stage_report('composition', all_pairs, bucket_pairs, start))
+
+    # Stage 2: cheap descriptor or embedding similarity inside buckets
+    start = time.perf_counter()
+    in_buckets = np.concatenate(buckets) if buckets else np.empty(0, dtype=np.int64)
+    embeddings = np.zeros((n_graphs, 1), dtype=np.float32)
+    if len(in_buckets) > 0:
+        if descriptor == 'descriptor':
+            vectors = np.stack([graph_descriptor(graphs[i]) for i in in_buckets])
+        elif descriptor == 'gnn':
+            calculator = calculator or GraphSimilarityCalculator()
+            vectors = calculator.inference_session().embed_many([graphs[i] for i in in_buckets]).numpy()
+        else:
+            raise ValueError(f"Unknown descriptor: {descriptor}. Choose from 'descriptor' or 'gnn'.")
+        embeddings = np.zeros((n_graphs, vectors.shape[1]), dtype=np.float32)
+        embeddings[in_buckets] = vectors
+
+    candidates = [_bucket_candidate_pairs(members, embeddings, descriptor_threshold, chunk_size)
+                  for members in buckets]
+    candidates = np.concatenate(candidates) if candidates else np.empty((0, 2), dtype=np.int64)
+    stages.append(_stage_report(descriptor, bucket_pairs, len(candidates), start))
+
+    # Stage 3: graph edit distance on surviving near-duplicates
+    start = time.perf_counter()
+    duplicates = np.empty((0, 2), dtype=np.int64)
+    if len(candidates) > 0:
+        result = pair_list_edit_distance(graphs,
+                                         candidates,
+                                         n_workers=n_workers,
+                                         timeout=ged_timeout,
+                                         checkpoint_dir=checkpoint_dir)
+        accepted = np.isin(result.status, (STATUS_OK, STATUS_TIMEOUT)) & \
+            (np.nan_to_num(result.similarity) >= ged_threshold)
+        duplicates = result.pairs[accepted]
+    stages.append(_stage_report('edit_distance', len(candidates), len(duplicates), start))
+
+    labels = _union_find_labels(n_graphs, duplicates)
+    representatives = np.unique(labels)
+
+    if verbose:
+        for report in stages:
+            print(f"{report['stage']:>14}: {report['pairs_in']} -> {report['pairs_out']} pairs "
+                  f"({100 * report['pruned_fraction']:.1f}% pruned, {report['seconds']} s)")
+        print(f"{n_graphs} structures, {len(representatives)} unique")
+
+    return {'labels': labels,
+            'representatives': representatives,
+            'duplicates': duplicates,
+            'stages': stages}
@@ -0,0 +1,508 @@
+"""
+Parallel, checkpointed driver for pairwise graph edit distance.
+
+The upper triangle of the pair matrix (or an explicit list of pairs) is
+split into blocks that are evaluated in a process pool. Every finished
+block is written to a checkpoint directory, so an interrupted run can be
+resumed, and each pair carries a status code instead of a silent 0.0.
+"""
+
+import os
+import json
+import time
+import hashlib
+from functools import partial
+import numpy as np
+import networkx as nx
+from networkx.algorithms.similarity import graph_edit_distance
+from torch_geometric.data import Data
+from torch_geometric.utils import to_networkx
+from mofbattery.parallel import imap_isolated
+
+STATUS_PENDING = 0
+STATUS_OK = 1
+STATUS_TIMEOUT = 2
+STATUS_FAILED = 3
+STATUS_NAMES = {STATUS_PENDING: 'pending',
+                STATUS_OK: 'ok',
+                STATUS_TIMEOUT: 'timeout',
+                STATUS_FAILED: 'failed'}
+
+_WORKER_GRAPHS = None
+
+
+def to_nx_graph(graph):
+    """
+    Convert a PyTorch Geometric graph to an undirected NetworkX graph.
+    NetworkX graphs are returned unchanged. Coarse-grained graphs keep their
+    ``node_label`` as node attribute so the edit distance can match on it.
+
+    **parameters**
+        graph (Data or networkx.Graph): Input graph.
+
+    **returns**
+        networkx.Graph: Undirected graph.
+    """
+    if isinstance(graph, nx.Graph):
+        return graph
+    if isinstance(graph, Data):
+        if getattr(graph, 'node_label', None) is not None:
+            return to_networkx(graph, node_attrs=['node_label'], to_undirected=True)
+        return to_networkx(graph, to_undirected=True)
+    raise TypeError(f"Unsupported graph type: {type(graph).__name__}")
+
+
+def _same_node_label(n1, n2):
+    """Node match used for labelled (coarse-grained) graphs."""
+    return n1.get('node_label') == n2.get('node_label')
+
+
+def _is_labelled(G):
+    """Whether every node of a NetworkX graph carries a ``node_label``."""
+    return G.number_of_nodes() > 0 and all('node_label' in d for _, d in G.nodes(data=True))
+
+
+def edit_distance_pair(G1, G2, timeout=None):
+    """
+    Compute the normalised graph edit distance similarity of two graphs
+    and report how the computation ended.
+
+    **parameters**
+        G1 (networkx.Graph): First graph.
+        G2 (networkx.Graph): Second graph.
+        timeout (float, optional): Time limit in seconds. When it is hit,
+            NetworkX returns the best edit distance found so far, which is an
+            upper bound, and the pair is flagged as timed out.
+
+    Nodes are only matched on their ``node_label`` when both graphs are
+    labelled, e.g. coarse-grained building unit graphs.
+
+    **returns**
+        dict: ``similarity``, ``ged``, ``status`` (one of the ``STATUS_*``
+        codes), ``error`` (str or None) and ``elapsed`` seconds.
+    """
+    node_match = _same_node_label if _is_labelled(G1) and _is_labelled(G2) else None
+    start = time.perf_counter()
+    try:
+        ged = graph_edit_distance(G1, G2, node_match=node_match, timeout=timeout)
+    except Exception as e:
+        return {'similarity': np.nan,
+                'ged': np.nan,
+                'status': STATUS_FAILED,
+                'error': f"{type(e).__name__}: {e}",
+                'elapsed': time.perf_counter() - start}
+    elapsed = time.perf_counter() - start
+
+    status, error = STATUS_OK, None
+    if timeout is not None and elapsed >= timeout:
+        status, error = STATUS_TIMEOUT, 'timeout reached, ged is an upper bound'
+    if ged is None:
+        return {'similarity': np.nan,
+                'ged': np.nan,
+                'status': STATUS_TIMEOUT,
+                'error': 'no edit path found before timeout',
+                'elapsed': elapsed}
+
+    max_nodes = max(G1.number_of_nodes(), G2.number_of_nodes(), 1)
+    return {'similarity': 1.0 - min(ged / max_nodes, 1.0),
+            'ged': float(ged),
+            'status': status,
+            'error': error,
+            'elapsed': elapsed}
+
+
+class PairwiseResult:
+    """
+    Container for the outcome of a pairwise edit distance run.
+
+    Attributes:
+        - similarity (np.ndarray): Symmetric [n, n] similarity matrix. Pairs
+            that were not computed or failed are NaN.
+        - ged (np.ndarray): Symmetric [n, n] graph edit distances.
+        - status (np.ndarray): Symmetric [n, n] ``STATUS_*`` codes.
+        - failures (list): One dict per failed or timed-out pair with the
+            indices, status name, error message and elapsed time.
+    """
+
+    def __init__(self, n_graphs):
+        self.similarity = np.full((n_graphs, n_graphs), np.nan)
+        self.ged = np.full((n_graphs, n_graphs), np.nan)
+        self.status = np.zeros((n_graphs, n_graphs), dtype=np.int8)
+        self.failures = []
+
+    def _update(self, rows, cols, similarity, ged, status, failures):
+        """Insert a finished block into the symmetric matrices."""
+        for matrix, values in ((self.similarity, similarity),
+                               (self.ged, ged),
+                               (self.status, status)):
+            matrix[rows, cols] = values
+            matrix[cols, rows] = values
+        self.failures.extend(failures)
+
+    def summary(self):
+        """
+        Count the computed pairs per status.
+
+        **returns**
+            dict: Mapping of status name to number of pairs.
+        """
+        upper = self.status[np.triu_indices_from(self.status, k=1)]
+        return {name: int(np.sum(upper == code))
+                for code, name in STATUS_NAMES.items()}
+
+
+class PairListResult:
+    """
+    Edit distance outcome for an explicit list of pairs, stored per pair
+    rather than as dense [n, n] matrices.
+
+    Attributes:
+        - pairs (np.ndarray): [m, 2] sorted, unique pairs with ``i < j``.
+        - similarity (np.ndarray): [m] similarities, NaN where not computed
+            or failed.
+        - ged (np.ndarray): [m] graph edit distances.
+        - status (np.ndarray): [m] ``STATUS_*`` codes.
+        - failures (list): One dict per failed or timed-out pair with the
+            indices, status name, error message and elapsed time.
+    """
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.similarity = np.full(len(pairs), np.nan)
+        self.ged = np.full(len(pairs), np.nan)
+        self.status = np.zeros(len(pairs), dtype=np.int8)
+        self.failures = []
+
+    def _update(self, start, similarity, ged, status, failures):
+        """Insert a finished block that starts at row ``start``."""
+        stop = start + len(status)
+        self.similarity[start:stop] = similarity
+        self.ged[start:stop] = ged
+        self.status[start:stop] = status
+        self.failures.extend(failures)
+
+    def summary(self):
+        """
+        Count the pairs per status.
+
+        **returns**
+            dict: Mapping of status name to number of pairs.
+        """
+        return {name: int(np.sum(self.status == code))
+                for code, name in STATUS_NAMES.items()}
+
+
+def _init_worker(graphs):
+    """Store the graph list once per worker process."""
+    global _WORKER_GRAPHS
+    _WORKER_GRAPHS = graphs
+
+
+def _run_block(block_id, pairs, timeout):
+    """Evaluate one block of pairs in a worker process."""
+    n_pairs = len(pairs)
+    similarity = np.full(n_pairs, np.nan)
+    ged = np.full(n_pairs, np.nan)
+    status = np.zeros(n_pairs, dtype=np.int8)
+    failures = []
+    for k, (i, j) in enumerate(pairs):
+        result = edit_distance_pair(_WORKER_GRAPHS[i], _WORKER_GRAPHS[j], timeout)
+        similarity[k] = result['similarity']
+        ged[k] = result['ged']
+        status[k] = result['status']
+        if result['status'] != STATUS_OK:
+            failures.append({'i': int(i),
+                             'j': int(j),
+                             'status': STATUS_NAMES[result['status']],
+                             'error': result['error'],
+                             'elapsed': round(result['elapsed'], 3)})
+    return block_id, pairs, similarity, ged, status, failures
+
+
+def _failed_block(block_id, pairs, error):
+    """Block output with every pair marked as failed with ``error``."""
+    n_pairs = len(pairs)
+    failures = [{'i': int(i), 'j': int(j), 'status': STATUS_NAMES[STATUS_FAILED],
+                 'error': error, 'elapsed': None}
+                for i, j in pairs]
+    return (block_id, pairs, np.full(n_pairs, np.nan), np.full(n_pairs, np.nan),
+            np.full(n_pairs, STATUS_FAILED, dtype=np.int8), failures)
+
+
+def upper_triangle_blocks(n_graphs, block_size):
+    """
+    Split the strict upper triangle of an [n, n] pair matrix into square
+    blocks.
+
+    **parameters**
+        n_graphs (int): Number of graphs.
+        block_size (int): Edge length of a block.
+
+    **returns**
+        list of tuple: ``(block_id, pairs)`` where pairs is an [m, 2] array.
+    """
+    blocks = []
+    starts = range(0, n_graphs, block_size)
+    for bi, row_start in enumerate(starts):
+        for bj, col_start in enumerate(starts):
+            if bj < bi:
+                continue
+            rows = np.arange(row_start, min(row_start + block_size, n_graphs))
+            cols = np.arange(col_start, min(col_start + block_size, n_graphs))
+            ii, jj = np.meshgrid(rows, cols, indexing='ij')
+            keep = ii < jj
+            if keep.any():
+                pairs = np.stack([ii[keep], jj[keep]], axis=1)
+                blocks.append((f"{bi}_{bj}", pairs))
+    return blocks
+
+
+def pair_list_blocks(pairs, block_size):
+    """
+    Split an explicit list of pairs into blocks of ``block_size ** 2`` pairs.
+
+    **parameters**
+        pairs (array-like): [m, 2] pair indices.
+        block_size (int): Block size used for the all-pairs layout.
+
+    **returns**
+        list of tuple: ``(block_id, pairs)`` where pairs is an [k, 2] array.
+    """
+    pairs = np.unique(np.sort(np.asarray(pairs, dtype=np.int64).reshape(-1, 2), axis=1), axis=0)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    chunk = max(block_size * block_size, 1)
+    return [(f"pairs_{k}", pairs[start:start + chunk])
+            for k, start in enumerate(range(0, len(pairs), chunk))]
+
+
+def _block_path(checkpoint_dir, block_id):
+    return os.path.join(checkpoint_dir, f"block_{block_id}.npz")
+
+
+def _save_block(checkpoint_dir, block_id, pairs, similarity, ged, status, failures):
+    """Atomically write a finished block to the checkpoint directory."""
+    path = _block_path(checkpoint_dir, block_id)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path,
+             pairs=pairs,
+             similarity=similarity,
+             ged=ged,
+             status=status,
+             failures=np.array(json.dumps(failures)))
+    os.replace(tmp_path, path)
+
+
+def _load_block(checkpoint_dir, block_id):
+    """Read a finished block from the checkpoint directory."""
+    with np.load(_block_path(checkpoint_dir, block_id)) as data:
+        return (data['pairs'],
+                data['similarity'],
+                data['ged'],
+                data['status'],
+                json.loads(str(data['failures'])))
+
+
+def graphs_digest(graphs):
+    """
+    Hash the contents the edit distance depends on: the node count, node
+    labels and edges of every graph, in order.
+
+    **parameters**
+        graphs (list of networkx.Graph): Input graphs.
+
+    **returns**
+        str: Hex digest of the graph list.
+    """
+    digest = hashlib.sha1()
+    for G in graphs:
+        nodes = list(G.nodes)
+        position = {node: k for k, node in enumerate(nodes)}
+        labels = [G.nodes[node].get('node_label') for node in nodes]
+        edges = np.array(sorted(tuple(sorted((position[u], position[v]))) for u, v in G.edges),
+                         dtype=np.int64).reshape(-1, 2)
+        digest.update(json.dumps([len(nodes), labels], default=str).encode())
+        digest.update(edges.tobytes())
+    return digest.hexdigest()
+
+
+def _check_manifest(checkpoint_dir, fingerprint):
+    """Make sure a checkpoint directory belongs to the same run layout."""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            previous = json.load(f)
+        if previous != fingerprint:
+            raise ValueError(f"Checkpoint directory {checkpoint_dir} was written "
+                             f"for a different run: {previous} != {fingerprint}")
+    else:
+        with open(manifest_path, 'w') as f:
+            json.dump(fingerprint, f)
+
+
+def _evaluate_blocks(worker_graphs, pending, timeout, n_workers, collect):
+    """
+    Run the pending blocks serially or in a process pool and hand every
+    finished block to ``collect``. ``worker_graphs`` is indexed by the pair
+    indices, so it may be a list or a dict of a subset of the graphs. A
+    block that kills its worker process, even when rerun alone, is handed
+    on with all its pairs failed, see
+    :func:`mofbattery.parallel.imap_isolated`.
+    """
+    if n_workers == 1 or len(pending) <= 1:
+        _init_worker(worker_graphs)
+        try:
+            for block_id, block_pairs in pending:
+                collect(_run_block(block_id, block_pairs, timeout))
+        finally:
+            _init_worker(None)
+        return
+
+    blocks = dict(pending)
+    tasks = [(block_id, (block_id, block_pairs, timeout), {}) for block_id, block_pairs in pending]
+    for block_id, output, error in imap_isolated(_run_block, tasks, n_workers,
+                                                 initializer=partial(_init_worker, worker_graphs)):
+        if error is not None:
+            # the block killed its worker even when run alone, e.g. out of
+            # memory on a large graph; record it so a resume does not retry it
+            output = _failed_block(block_id, blocks[block_id], f"{type(error).__name__}: {error}")
+        collect(output)
+
+
+def _pending_blocks(checkpoint_dir, blocks, fingerprint, load):
+    """
+    Load blocks already present in the checkpoint directory through
+    ``load`` and return the ones that still have to be computed.
+    ``fingerprint`` is a callable returning the run settings, so the graph
+    digest is only computed when a checkpoint directory is used.
+    """
+    if checkpoint_dir is None:
+        return blocks
+    digest = hashlib.sha1()
+    for _, block_pairs in blocks:
+        digest.update(block_pairs.tobytes())
+    _check_manifest(checkpoint_dir, dict(fingerprint(), pairs_sha1=digest.hexdigest()))
+    pending = []
+    for block_id, block_pairs in blocks:
+        if os.path.exists(_block_path(checkpoint_dir, block_id)):
+            load(block_id, *_load_block(checkpoint_dir, block_id))
+        else:
+            pending.append((block_id, block_pairs))
+    return pending
+
+
+def pairwise_edit_distance(graphs,
+                           pairs=None,
+                           block_size=32,
+                           n_workers=None,
+                           timeout=None,
+                           checkpoint_dir=None):
+    """
+    Compute graph edit distance similarities for many pairs in parallel.
+
+    **parameters**
+        graphs (list): PyTorch Geometric ``Data`` or NetworkX graphs.
+        pairs (array-like, optional): [m, 2] pairs to evaluate. Defaults to
+            the full upper triangle.
+        block_size (int): Edge length of the square blocks the upper
+            triangle is split into; explicit pairs are chunked into blocks
+            of ``block_size ** 2`` pairs.
+        n_workers (int, optional): Number of worker processes. ``1`` runs in
+            the current process. Defaults to ``os.cpu_count()``.
+        timeout (float, optional): Per-pair time limit in seconds.
+        checkpoint_dir (str, optional): Directory for finished blocks. Blocks
+            already present are loaded instead of recomputed, provided the
+            graphs, pairs and settings are those the directory was written
+            for.
+
+    **returns**
+        PairwiseResult: Similarities, edit distances, status codes and
+        failure records.
+    """
+    nx_graphs = [to_nx_graph(g) for g in graphs]
+    n_graphs = len(nx_graphs)
+    if pairs is None:
+        blocks = upper_triangle_blocks(n_graphs, block_size)
+    else:
+        blocks = pair_list_blocks(pairs, block_size)
+
+    result = PairwiseResult(n_graphs)
+    diagonal = np.arange(n_graphs)
+    result.similarity[diagonal, diagonal] = 1.0
+    result.ged[diagonal, diagonal] = 0.0
+    result.status[diagonal, diagonal] = STATUS_OK
+
+    def load(block_id, block_pairs, similarity, ged, status, failures):
+        result._update(block_pairs[:, 0], block_pairs[:, 1], similarity, ged, status, failures)
+
+    def collect(output):
+        block_id, block_pairs, similarity, ged, status, failures = output
+        if checkpoint_dir is not None:
+            _save_block(checkpoint_dir, block_id, block_pairs, similarity, ged, status, failures)
+        load(block_id, block_pairs, similarity, ged, status, failures)
+
+    pending = _pending_blocks(checkpoint_dir, blocks,
+                              lambda: {'n_graphs': n_graphs,
+                                       'block_size': block_size,
+                                       'timeout': timeout,
+                                       'graphs_sha1': graphs_digest(nx_graphs)},
+                              load)
+    _evaluate_blocks(nx_graphs, pending, timeout, n_workers, collect)
+    return result
+
+
+def pair_list_edit_distance(graphs,
+                            pairs,
+                            block_size=32,
+                            n_workers=None,
+                            timeout=None,
+                            checkpoint_dir=None):
+    """
+    Compute graph edit distance similarities for a sparse list of pairs.
+    Only the graphs that appear in ``pairs`` are converted and sent to the
+    workers, and the result is kept per pair, so memory scales with the
+    number of candidate pairs instead of the square of the library size.
+
+    **parameters**
+        graphs (list): PyTorch Geometric ``Data`` or NetworkX graphs.
+        pairs (array-like): [m, 2] indices into ``graphs``.
+        block_size (int): Pairs are chunked into blocks of
+            ``block_size ** 2`` pairs.
+        n_workers (int, optional): Number of worker processes. ``1`` runs in
+            the current process. Defaults to ``os.cpu_count()``.
+        timeout (float, optional): Per-pair time limit in seconds.
+        checkpoint_dir (str, optional): Directory for finished blocks.
+
+    **returns**
+        PairListResult: Per-pair similarities, edit distances, status codes
+        and failure records.
+    """
+    blocks = pair_list_blocks(pairs, block_size)
+    all_pairs = np.concatenate([block_pairs for _, block_pairs in blocks]) \
+        if blocks else np.empty((0, 2), dtype=np.int64)
+    result = PairListResult(all_pairs)
+    offsets, start = {}, 0
+    for block_id, block_pairs in blocks:
+        offsets[block_id] = start
+        start += len(block_pairs)
+
+    used = np.unique(all_pairs)
+    nx_graphs = {int(i): to_nx_graph(graphs[i]) for i in used}
+
+    def load(block_id, block_pairs, similarity, ged, status, failures):
+        result._update(offsets[block_id], similarity, ged, status, failures)
+
+    def collect(output):
+        block_id, block_pairs, similarity, ged, status, failures = output
+        if checkpoint_dir is not None:
+            _save_block(checkpoint_dir, block_id, block_pairs, similarity, ged, status, failures)
+        load(block_id, block_pairs, similarity, ged, status, failures)
+
+    pending = _pending_blocks(checkpoint_dir, blocks,
+                              lambda: {'n_graphs': len(graphs),
+                                       'block_size': block_size,
+                                       'timeout': timeout,
+                                       'graphs_sha1': graphs_digest(list(nx_graphs.values()))},
+                              load)
+    _evaluate_blocks(nx_graphs, pending, timeout, n_workers, collect)
+    return result
@@ -1,11 +1,72 @@
+import copy
+import logging
+from collections import OrderedDict
+import numpy as np
 import torch
 import torch.nn.functional as F
 from torch.nn import Linear, Module
 from torch_geometric.data import Data
 from torch_geometric.nn import GCNConv, global_mean_pool
-from networkx.algorithms.similarity import graph_edit_distance
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
 import networkx as nx
-from torch_geometric.utils import to_networkx
+from mofbattery.graph.pairwise import (edit_distance_pair,
+                                       pairwise_edit_distance,
+                                       to_nx_graph,
+                                       STATUS_NAMES)
+from mofbattery.graph.sparse_graph import topk_similarity_graph
+
+logger = logging.getLogger(__name__)
+
+
+def graph_descriptor(graph: Data, max_degree=12, bond_bins=None, label_bins=256) -> np.ndarray:
+    """
+    Cheap, size-independent descriptor of a graph built by
+    :func:`mofbattery.read_write.coordinates.ase_to_pytorch_geometric`.
+
+    The vector concatenates the element fractions (indexed by atomic number),
+    the normalised node degree histogram and, when edge distances are
+    present, the normalised bond length histogram. For coarse-grained graphs
+    the element fractions are replaced by a hashed histogram of the
+    building unit labels over ``label_bins`` bins, and the edge histogram
+    covers centroid distances instead of bond lengths, so their descriptors
+    are only comparable with those of other coarse-grained graphs.
+
+    Parameters:
+        graph (Data): Input graph whose first node feature is the atomic number.
+        max_degree (int): Degrees above this value share the last bin.
+        bond_bins (np.ndarray, optional): Bin edges for the edge distance
+            histogram in Å. Defaults to 15 bins between 0.5 and 3.5 Å, or
+            18 bins between 2 and 20 Å for coarse-grained graphs.
+        label_bins (int): Bins of the building unit label histogram. Two
+            different units share a bin with probability ``1 / label_bins``.
+
+    Returns:
+        np.ndarray: Descriptor vector of dtype float32.
+    """
+    node_label = getattr(graph, 'node_label', None)
+    coarse = node_label is not None
+    if bond_bins is None:
+        bond_bins = np.linspace(2.0, 20.0, 19) if coarse else np.linspace(0.5, 3.5, 16)
+    if coarse:
+        labels = node_label.cpu().numpy() % label_bins
+        n_nodes = max(len(labels), 1)
+        composition = np.bincount(labels, minlength=label_bins) / n_nodes
+    else:
+        numbers = graph.x[:, 0].cpu().numpy().astype(np.int64)
+        n_nodes = max(len(numbers), 1)
+        composition = np.bincount(numbers, minlength=119)[:119] / n_nodes
+
+    edge_index = graph.edge_index.cpu().numpy()
+    degree = np.bincount(edge_index.ravel(), minlength=graph.num_nodes)
+    degree = np.bincount(np.minimum(degree, max_degree), minlength=max_degree + 1) / n_nodes
+
+    bonds = np.zeros(len(bond_bins) - 1)
+    edge_attr = getattr(graph, 'edge_attr', None)
+    if edge_attr is not None and edge_attr.numel() > 0:
+        bonds, _ = np.histogram(edge_attr[:, 0].cpu().numpy(), bins=bond_bins)
+        bonds = bonds / max(edge_attr.size(0), 1)
+
+    return np.concatenate([composition, degree, bonds]).astype(np.float32)
 
 
 class GNNEncoder(Module):
@@ -26,7 +87,7 @@ class GNNEncoder(Module):
         self.conv2 = GCNConv(hidden_channels, hidden_channels)
         self.lin = Linear(hidden_channels, out_channels)
 
-    def forward(self, x, edge_index, batch):
+    def forward(self, x, edge_index, batch, edge_weight=None):
         """
         Forward pass through the GNN encoder.
 
@@ -34,16 +95,208 @@ class GNNEncoder(Module):
             x (Tensor): Node feature matrix [num_nodes, in_channels].
             edge_index (LongTensor): Edge indices [2, num_edges].
             batch (LongTensor): Batch vector [num_nodes] to group nodes into graphs.
+            edge_weight (Tensor, optional): Edge weights [num_edges]. When the
+                convolutions are built with ``normalize=False`` these are the
+                precomputed GCN normalisation coefficients.
 
         Returns:
             Tensor: Graph-level embedding vector [batch_size, out_channels].
         """
-        x = F.relu(self.conv1(x, edge_index))
-        x = F.relu(self.conv2(x, edge_index))
+        x = F.relu(self.conv1(x, edge_index, edge_weight))
+        x = F.relu(self.conv2(x, edge_index, edge_weight))
         x = global_mean_pool(x, batch)
         return self.lin(x)
 
 
+class GNNInferenceSession:
+    """
+    A long-lived inference session around a :class:`GNNEncoder`.
+
+    The encoder is copied, moved to the target device and switched to
+    evaluation mode once. The GCN normalisation (self loops and symmetric
+    degree scaling) is computed once per graph and cached together with the
+    device-resident node features, so repeated embeddings of the same graph
+    only pay for the two convolutions. A cached graph is prepared again
+    when its node features or edges were replaced or modified in place.
+
+    Parameters:
+        encoder (GNNEncoder): Trained or randomly initialised encoder. The
+            session works on a frozen copy; :meth:`is_stale` tells whether
+            the weights of ``encoder`` changed since.
+        device (str or torch.device, optional): Target device. Defaults to
+            CUDA when available, otherwise CPU.
+        num_threads (int, optional): Intra-op thread count for CPU inference.
+        num_interop_threads (int, optional): Inter-op thread count. PyTorch
+            only accepts this before any parallel work has started, so it is
+            ignored with a message if it can no longer be changed.
+        compile_mode (str, optional): ``'script'`` to TorchScript the encoder,
+            ``'compile'`` to wrap it with ``torch.compile``, or None.
+        cache_size (int): Maximum number of graphs whose normalised adjacency
+            is kept in the cache.
+    """
+
+    def __init__(self, encoder, device=None, num_threads=None,
+                 num_interop_threads=None, compile_mode=None,
+                 cache_size=1024):
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
+
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        if num_interop_threads is not None:
+            try:
+                torch.set_num_interop_threads(num_interop_threads)
+            except RuntimeError as e:
+                logger.warning("Could not set inter-op threads: %s", e)
+
+        self.encoder = encoder
+        self._weights = self._weight_versions(encoder)
+        model = copy.deepcopy(encoder)
+        for conv in (model.conv1, model.conv2):
+            conv.normalize = False
+        model.to(self.device)
+        model.eval()
+        for param in model.parameters():
+            param.requires_grad_(False)
+        self.out_channels = model.lin.out_features
+        self.model = self._compile(model, compile_mode)
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def _weight_versions(encoder):
+        """Identity and in-place version counter of every encoder tensor."""
+        return [(id(t), t._version) for t in encoder.state_dict(keep_vars=True).values()]
+
+    def is_stale(self):
+        """
+        Whether the weights of the encoder the session was built from were
+        replaced or updated in place, e.g. by an optimizer step or
+        ``load_state_dict``, since the session copied them.
+
+        Returns:
+            bool: True if the session no longer matches the encoder.
+        """
+        return self._weight_versions(self.encoder) != self._weights
+
+    @staticmethod
+    def _compile(model, compile_mode):
+        """
+        Optionally TorchScript or ``torch.compile`` the encoder, falling back
+        to eager execution when compilation is not possible.
+        """
+        if compile_mode is None:
+            return model
+        try:
+            if compile_mode == 'script':
+                return torch.jit.script(model)
+            elif compile_mode == 'compile':
+                return torch.compile(model)
+        except Exception as e:
+            logger.warning("Encoder compilation failed, using eager mode: %s", e)
+            return model
+        raise ValueError(f"Unknown compile_mode: {compile_mode}. Choose from 'script', 'compile' or None.")
+
+    def prepare(self, graph: Data):
+        """
+        Move a graph to the session device and compute its GCN normalisation.
+        The result is cached per graph object and reused while the graph
+        holds the same, unmodified ``x`` and ``edge_index`` tensors.
+
+        Parameters:
+            graph (Data): Input graph.
+
+        Returns:
+            Tuple[Tensor, LongTensor, Tensor]: Node features, edge indices
+            with self loops and normalised edge weights.
+        """
+        key = id(graph)
+        source = (graph.x, graph.edge_index, graph.x._version, graph.edge_index._version)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] is graph and entry[1][0] is source[0] \
+                and entry[1][1] is source[1] and entry[1][2:] == source[2:]:
+            self._cache.move_to_end(key)
+            return entry[2]
+
+        x = graph.x.to(self.device, dtype=torch.float)
+        edge_index = graph.edge_index.to(self.device)
+        edge_index, edge_weight = gcn_norm(edge_index, None, x.size(0),
+                                           add_self_loops=True, dtype=x.dtype)
+        prepared = (x, edge_index, edge_weight)
+
+        # Keep a reference to the graph so its id cannot be reused while cached
+        self._cache[key] = (graph, source, prepared)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return prepared
+
+    def clear_cache(self):
+        """Drop all cached graph normalisations."""
+        self._cache.clear()
+
+    def embed(self, graph: Data) -> torch.Tensor:
+        """
+        Compute the embedding of a single graph.
+
+        Parameters:
+            graph (Data): Input graph.
+
+        Returns:
+            Tensor: Embedding of shape [1, out_channels].
+        """
+        return self.embed_many([graph])
+
+    def embed_many(self, graphs, batch_size=256) -> torch.Tensor:
+        """
+        Compute embeddings for many graphs by packing them into disjoint
+        mini-batches.
+
+        Parameters:
+            graphs (list of Data): Input graphs.
+            batch_size (int): Number of graphs evaluated per forward pass.
+
+        Returns:
+            Tensor: Embeddings of shape [len(graphs), out_channels] on CPU.
+        """
+        if len(graphs) == 0:
+            return torch.empty((0, self.out_channels))
+        embeddings = []
+        with torch.inference_mode():
+            for start in range(0, len(graphs), batch_size):
+                chunk = [self.prepare(g) for g in graphs[start:start + batch_size]]
+                xs, edges, weights, counts = [], [], [], []
+                offset = 0
+                for x, edge_index, edge_weight in chunk:
+                    xs.append(x)
+                    edges.append(edge_index + offset)
+                    weights.append(edge_weight)
+                    counts.append(x.size(0))
+                    offset += x.size(0)
+                batch = torch.repeat_interleave(
+                    torch.arange(len(chunk), device=self.device),
+                    torch.tensor(counts, device=self.device))
+                emb = self.model(torch.cat(xs), torch.cat(edges, dim=1),
+                                 batch, torch.cat(weights))
+                embeddings.append(emb.cpu())
+        return torch.cat(embeddings)
+
+    def similarity(self, g1: Data, g2: Data) -> float:
+        """
+        Cosine similarity between the embeddings of two graphs.
+
+        Parameters:
+            g1 (Data): First graph.
+            g2 (Data): Second graph.
+
+        Returns:
+            float: Cosine similarity in [-1, 1].
+        """
+        emb = self.embed_many([g1, g2])
+        return F.cosine_similarity(emb[0:1], emb[1:2]).item()
+
+
 class GraphSimilarityCalculator:
     """
     A class for computing similarity between two graphs represented as
@@ -65,6 +318,28 @@ class GraphSimilarityCalculator:
             gnn_out (int): Output embedding dimension from GNN.
         """
         self.gnn_encoder = GNNEncoder(gnn_in, gnn_hidden, gnn_out)
+        self._session = None
+        self._session_options = {}
+
+    def inference_session(self, **kwargs) -> GNNInferenceSession:
+        """
+        Inference session used by :meth:`gnn_embedding_similarity` and
+        :meth:`embeddings`. It is created on first use, rebuilt when
+        ``kwargs`` are given, and rebuilt with the previous options when
+        ``gnn_encoder`` was replaced or its weights changed.
+
+        Parameters:
+            **kwargs: Forwarded to :class:`GNNInferenceSession`.
+
+        Returns:
+            GNNInferenceSession: Session matching the current encoder.
+        """
+        if kwargs:
+            self._session_options = kwargs
+        if kwargs or self._session is None or self._session.encoder is not self.gnn_encoder \
+                or self._session.is_stale():
+            self._session = GNNInferenceSession(self.gnn_encoder, **self._session_options)
+        return self._session
 
     @staticmethod
     def _pad_features(x1, x2):
@@ -99,27 +374,43 @@ class GraphSimilarityCalculator:
         x1, x2 = self._pad_features(g1.x, g2.x)
         return F.cosine_similarity(x1.unsqueeze(0), x2.unsqueeze(0)).item()
 
-    def edit_distance_similarity(self, g1: Data, g2: Data) -> float:
+    def edit_distance_similarity(self, g1: Data, g2: Data, timeout=None) -> float:
         """
         Compute similarity using normalized graph edit distance.
 
         Parameters:
             g1 (Data): First graph.
             g2 (Data): Second graph.
+            timeout (float, optional): Time limit in seconds for the search.
 
         Returns:
-            float: Normalized similarity in [0, 1].
+            float: Normalized similarity in [0, 1], or NaN with a logged
+            warning when the edit distance failed or no edit path was found
+            before the timeout. A timeout after a path was found gives the
+            similarity of the best path so far, a lower bound.
         """
-        G1 = to_networkx(g1, to_undirected=True)
-        G2 = to_networkx(g2, to_undirected=True)
+        G1 = to_nx_graph(g1)
+        G2 = to_nx_graph(g2)
 
-        try:
-            ged = graph_edit_distance(G1, G2)
-            max_nodes = max(G1.number_of_nodes(), G2.number_of_nodes())
-            return 1.0 - min(ged / max_nodes, 1.0)
-        except Exception as e:
-            print(f"Edit distance failed: {e}")
-            return 0.0
+        result = edit_distance_pair(G1, G2, timeout=timeout)
+        if np.isnan(result['similarity']):
+            logger.warning("Edit distance %s: %s", STATUS_NAMES[result['status']], result['error'])
+        return result['similarity']
+
+    def pairwise_edit_distance(self, graphs, **kwargs):
+        """
+        Compute edit distance similarities for many graphs in parallel with
+        checkpointing and per-pair failure records.
+
+        Parameters:
+            graphs (list of Data): Input graphs.
+            **kwargs: Forwarded to
+                :func:`mofbattery.graph.pairwise.pairwise_edit_distance`.
+
+        Returns:
+            PairwiseResult: Similarity matrix, status codes and failures.
+        """
+        return pairwise_edit_distance(graphs, **kwargs)
 
     def gnn_embedding_similarity(self, g1: Data, g2: Data) -> float:
         """
@@ -132,21 +423,52 @@ class GraphSimilarityCalculator:
         Returns:
             float: Cosine similarity in [0, 1].
         """
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.gnn_encoder.to(device)
-        self.gnn_encoder.eval()
+        return self.inference_session().similarity(g1, g2)
 
-        g1 = g1.to(device)
-        g2 = g2.to(device)
+    def embeddings(self, graphs, method='gnn', batch_size=256) -> np.ndarray:
+        """
+        Compute one fixed-size vector per graph.
 
-        batch1 = torch.zeros(g1.num_nodes, dtype=torch.long, device=device)
-        batch2 = torch.zeros(g2.num_nodes, dtype=torch.long, device=device)
+        Parameters:
+            graphs (list of Data): Input graphs.
+            method (str): 'gnn' for GNN embeddings or 'descriptor' for
+                :func:`graph_descriptor`.
+            batch_size (int): Graphs per forward pass for 'gnn'.
+
+        Returns:
+            np.ndarray: [len(graphs), d] matrix.
+        """
+        if method == 'gnn':
+            return self.inference_session().embed_many(graphs, batch_size=batch_size).numpy()
+        elif method == 'descriptor':
+            return np.stack([graph_descriptor(g) for g in graphs])
+        raise ValueError(f"Unknown method: {method}. Choose from 'gnn' or 'descriptor'.")
+
+    def topk_similarity_graph(self, graphs, k=10, threshold=0.0, method='gnn',
+                              chunk_size=512, symmetric=False):
+        """
+        Build a sparse k-nearest-neighbour cosine similarity graph over many
+        structures without materialising the dense N x N matrix.
 
-        with torch.no_grad():
-            emb1 = self.gnn_encoder(g1.x, g1.edge_index, batch1)
-            emb2 = self.gnn_encoder(g2.x, g2.edge_index, batch2)
+        Parameters:
+            graphs (list of Data): Input graphs.
+            k (int): Neighbours kept per structure.
+            threshold (float): Minimum similarity for an edge.
+            method (str): 'gnn' or 'descriptor', see :meth:`embeddings`.
+            chunk_size (int): Rows compared at once.
+            symmetric (bool): Keep an edge if either endpoint selects it.
 
-        return F.cosine_similarity(emb1, emb2).item()
+        Returns:
+            scipy.sparse.csr_matrix: [N, N] similarity graph. Use
+            :func:`mofbattery.graph.sparse_graph.save_similarity_graph` and
+            :func:`mofbattery.graph.sparse_graph.similarity_graph_to_pyg` to
+            store it or feed it to PyTorch Geometric.
+        """
+        return topk_similarity_graph(self.embeddings(graphs, method=method),
+                                     k=k,
+                                     threshold=threshold,
+                                     chunk_size=chunk_size,
+                                     symmetric=symmetric)
 
     def compute(self, g1: Data, g2: Data, method='cosine') -> float:
         """
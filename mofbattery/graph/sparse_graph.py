@@ -0,0 +1,114 @@
+"""
+Sparse k-nearest-neighbour similarity graphs for large structure libraries.
+
+Instead of a dense N x N similarity matrix, only the k most similar
+structures above a threshold are kept per row. Rows are processed in
+blocks and the top-k selection uses ``np.argpartition``, so peak memory is
+bounded by ``chunk_size * N`` similarities.
+"""
+
+import numpy as np
+import torch
+from scipy import sparse
+from torch_geometric.data import Data
+
+
+def topk_similarity_graph(embeddings, k=10, threshold=0.0, chunk_size=512, symmetric=False):
+    """
+    Build a sparse cosine similarity graph keeping the k nearest neighbours
+    of every row.
+
+    **parameters**
+        embeddings (np.ndarray): [n, d] embedding or descriptor matrix.
+        k (int): Number of neighbours kept per structure.
+        threshold (float): Minimum cosine similarity for an edge.
+        chunk_size (int): Number of rows compared against the library at once.
+        symmetric (bool): Keep an edge when either endpoint selects the other.
+
+    **returns**
+        scipy.sparse.csr_matrix: [n, n] float32 similarity graph without
+        self loops.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    n_items = len(vectors)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    k = min(k, n_items - 1)
+    if k <= 0:
+        return sparse.csr_matrix((n_items, n_items), dtype=np.float32)
+
+    rows, cols, values = [], [], []
+    for start in range(0, n_items, chunk_size):
+        block = vectors[start:start + chunk_size] @ vectors.T
+        local = np.arange(len(block))
+        block[local, start + local] = -np.inf
+
+        top = np.argpartition(block, -k, axis=1)[:, -k:]
+        top_values = np.take_along_axis(block, top, axis=1)
+        keep = top_values >= threshold
+
+        rows.append(np.broadcast_to((start + local)[:, None], top.shape)[keep])
+        cols.append(top[keep])
+        values.append(top_values[keep])
+
+    rows, cols, values = np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+    if symmetric:
+        # union of both directions on the stored values, so negative and
+        # zero similarities survive; cosine similarity is symmetric, so a
+        # pair selected from both ends keeps one copy of the same value
+        rows, cols = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+        values = np.concatenate([values, values])
+        _, first = np.unique(rows.astype(np.int64) * n_items + cols, return_index=True)
+        rows, cols, values = rows[first], cols[first], values[first]
+    graph = sparse.csr_matrix((values, (rows, cols)),
+                              shape=(n_items, n_items),
+                              dtype=np.float32)
+    graph.sort_indices()
+    return graph
+
+
+def save_similarity_graph(path, graph):
+    """
+    Save a sparse similarity graph as a compressed ``.npz`` file.
+
+    **parameters**
+        path (str): Output path.
+        graph (scipy.sparse.spmatrix): Similarity graph.
+    """
+    sparse.save_npz(path, graph.tocsr(), compressed=True)
+
+
+def load_similarity_graph(path):
+    """
+    Load a sparse similarity graph written by :func:`save_similarity_graph`.
+
+    **parameters**
+        path (str): Path to the ``.npz`` file.
+
+    **returns**
+        scipy.sparse.csr_matrix: Similarity graph.
+    """
+    return sparse.load_npz(path).tocsr()
+
+
+def similarity_graph_to_pyg(graph, node_features=None):
+    """
+    Convert a sparse similarity graph to a PyTorch Geometric graph for
+    clustering or diversity sampling.
+
+    **parameters**
+        graph (scipy.sparse.spmatrix): Similarity graph.
+        node_features (array-like, optional): [n, d] node features, e.g. the
+            embeddings the graph was built from.
+
+    **returns**
+        torch_geometric.data.Data: Graph with ``edge_index`` and the
+        similarities as ``edge_attr`` [num_edges, 1].
+    """
+    coo = graph.tocoo()
+    edge_index = torch.tensor(np.vstack([coo.row, coo.col]), dtype=torch.long)
+    edge_attr = torch.tensor(coo.data, dtype=torch.float).unsqueeze(1)
+    data = Data(edge_index=edge_index, edge_attr=edge_attr, num_nodes=graph.shape[0])
+    if node_features is not None:
+        data.x = torch.as_tensor(np.asarray(node_features), dtype=torch.float)
+    return data
@@ -0,0 +1,73 @@
+"""
+Process pool driver that survives worker crashes.
+
+When a worker process dies, e.g. killed for memory or by a segfault in a
+compiled extension, ``ProcessPoolExecutor`` marks every pending future as
+failed with ``BrokenProcessPool``. :func:`imap_isolated` keeps at most one
+task per worker in flight, so after a crash only those tasks are suspects.
+The pool is rebuilt for the remaining tasks and every suspect is rerun on
+its own, so only the task that really kills a worker is reported as
+crashed.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _run_pool(function, queue, n_workers, initializer):
+    """
+    Run tasks from ``queue`` with at most ``n_workers`` in flight and yield
+    their outcomes. Returns the tasks that were in flight when the pool
+    broke, or an empty list.
+    """
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=initializer) as executor:
+        running = {}
+        while queue or running:
+            while queue and len(running) < n_workers:
+                task = queue.popleft()
+                key, args, kwargs = task
+                running[executor.submit(function, *args, **kwargs)] = task
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = []
+            for future in done:
+                task = running.pop(future)
+                error = future.exception()
+                if isinstance(error, BrokenProcessPool):
+                    broken.append(task)
+                elif error is not None:
+                    yield task[0], None, error
+                else:
+                    yield task[0], future.result(), None
+            if broken:
+                return broken + list(running.values())
+    return []
+
+
+def imap_isolated(function, tasks, n_workers=None, initializer=None):
+    """
+    Call ``function`` for every task in a process pool and yield the
+    outcomes as they finish.
+
+    **parameters:**
+        function (callable): Picklable function run in the workers.
+        tasks (iterable): ``(key, args, kwargs)`` per call; ``key``
+            identifies the task in the outcomes.
+        n_workers (int, optional): Worker processes, defaults to the CPU count.
+        initializer (callable, optional): Worker initializer, run again in
+            every rebuilt pool.
+
+    **yields:**
+        tuple: ``(key, result, error)``. ``error`` is the exception the call
+        raised, or a ``BrokenProcessPool`` when the task killed its worker
+        even when run alone; ``result`` is None whenever ``error`` is set.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    queue = deque(tasks)
+    while queue:
+        suspects = yield from _run_pool(function, queue, n_workers, initializer)
+        for task in suspects:
+            crashed = yield from _run_pool(function, deque([task]), 1, initializer)
+            if crashed:
+                yield task[0], None, BrokenProcessPool(f'worker died while running {task[0]}')
@@ -0,0 +1,212 @@
+import numpy as np
+from ase import Atoms
+from ase.data import covalent_radii
+from scipy.ndimage import maximum_filter
+from mofbattery.prop.host_index import HostSpatialIndex, CONTACT_EPS
+
+
+class ClearanceGrid:
+    """
+    Precomputed clearance map of the void space of a host framework.
+
+    The unit cell is divided into voxels of roughly ``spacing`` Å and for
+    every voxel centre the distance to the nearest host atom surface,
+    ``d - r_host`` with covalent radii, is computed once from a periodic
+    KD-tree of the host (see :class:`HostSpatialIndex`). Values are capped
+    at ``cutoff``, which only limits how deep inside a pore the map is
+    resolved.
+
+    A point lies at most ``max_error`` (half a voxel diagonal) from the
+    voxel centre it is looked up at, and the clearance changes at most as
+    fast as the position, so ``lookup(p) - max_error`` is a lower and
+    ``lookup(p) + max_error`` an upper bound of the exact clearance. This
+    makes the grid safe as a prefilter before exact overlap checks.
+
+    **parameters:**
+        host (Atoms): Host framework with a unit cell.
+        spacing (float): Target voxel edge length in Å.
+        cutoff (float): Largest clearance resolved, in Å.
+        tolerance (float): Extra clearance in Å, same meaning as in
+            ``check_no_overlap``.
+        chunk_size (int): Voxels evaluated per KD-tree query.
+    """
+
+    def __init__(self, host: Atoms, spacing=0.5, cutoff=6.0, tolerance=0.4, chunk_size=65536):
+        self.cell = np.array(host.get_cell())
+        if abs(np.linalg.det(self.cell)) < 1e-8:
+            raise ValueError("ClearanceGrid requires a host with a three dimensional cell")
+        self.spacing = spacing
+        self.cutoff = cutoff
+        self.tolerance = tolerance
+        self.index = HostSpatialIndex(host, tolerance=tolerance,
+                                      padding=cutoff + covalent_radii[host.numbers].max())
+        self.pbc = self.index.pbc
+        self.inverse_cell = np.linalg.inv(self.cell)
+
+        self.shape = tuple(int(n) for n in np.maximum(np.ceil(np.linalg.norm(self.cell, axis=1) / spacing), 1))
+        voxel = self.cell / np.array(self.shape)[:, None]
+        self.max_error = 0.5 * max(np.linalg.norm(voxel.T @ np.array(corner))
+                                   for corner in [(1, 1, 1), (1, 1, -1), (1, -1, 1), (-1, 1, 1)])
+
+        frac = np.stack(np.meshgrid(*[(np.arange(n) + 0.5) / n for n in self.shape],
+                                    indexing='ij'), axis=-1).reshape(-1, 3)
+        self.values = self._surface_distance(frac @ self.cell, chunk_size).reshape(self.shape)
+
+    def _surface_distance(self, points, chunk_size, k=8):
+        """
+        Distance of points to the nearest host atom surface, capped at cutoff.
+
+        The nearest surface belongs to an atom whose centre lies within
+        ``d_1 + (max_r - min_r)`` of the point, where ``d_1`` is the
+        distance to the nearest centre. The ``k`` nearest centres cover
+        that shell for almost every point; only the points where they do
+        not are completed with a ball query.
+        """
+        distance = np.full(len(points), float(self.cutoff))
+        radii = self.index.radii[self.index.image_atoms]
+        spread = self.index.max_radius - self.index.radii.min()
+        search = self.cutoff + self.index.max_radius
+        k = min(k, len(radii))
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start:start + chunk_size]
+            d, image = self.index.tree.query(chunk, k=k, distance_upper_bound=search)
+            d, image = d.reshape(len(chunk), k), image.reshape(len(chunk), k)
+            found = np.isfinite(d)
+            values = np.where(found, d - radii[np.where(found, image, 0)], np.inf)
+            distance[start:start + len(chunk)] = np.minimum(distance[start:start + len(chunk)], values.min(axis=1))
+
+            # the k-th neighbour still lies inside the shell, more atoms may
+            incomplete = np.nonzero(found[:, -1] & (d[:, -1] <= d[:, 0] + spread))[0]
+            if len(incomplete) == 0:
+                continue
+            shells = self.index.tree.query_ball_point(chunk[incomplete], d[incomplete, 0] + spread)
+            query = np.repeat(incomplete, [len(shell) for shell in shells])
+            neighbours = np.concatenate([np.asarray(shell, dtype=np.int64) for shell in shells])
+            values = np.linalg.norm(self.index.image_positions[neighbours] - chunk[query], axis=1) - radii[neighbours]
+            np.minimum.at(distance, start + query, values)
+        return distance
+
+    def voxel_index(self, points):
+        """
+        Voxel of each point; periodic directions wrap, the others clip.
+
+        **parameters:**
+            points (np.ndarray): [n, 3] Cartesian positions.
+
+        **returns:**
+            np.ndarray: [n, 3] integer voxel indices.
+        """
+        frac = np.asarray(points, dtype=float).reshape(-1, 3) @ self.inverse_cell
+        shape = np.array(self.shape)
+        idx = np.floor(frac * shape).astype(np.int64)
+        return np.where(self.pbc, idx % shape, np.clip(idx, 0, shape - 1))
+
+    def lookup(self, points):
+        """
+        Clearance of the voxels containing the points.
+
+        **parameters:**
+            points (np.ndarray): [n, 3] Cartesian positions.
+
+        **returns:**
+            np.ndarray: [n] distance to the nearest host atom surface in Å,
+            within ``max_error`` of the exact value.
+        """
+        idx = self.voxel_index(points)
+        return self.values[idx[:, 0], idx[:, 1], idx[:, 2]]
+
+    def positions(self, idx):
+        """Cartesian voxel centres of [n, 3] voxel indices."""
+        idx = np.asarray(idx).reshape(-1, 3)
+        return ((idx + 0.5) / np.array(self.shape)) @ self.cell
+
+    def surely_overlapping(self, points, radii):
+        """
+        Points that overlap the host according to the grid bound alone.
+
+        **parameters:**
+            points (np.ndarray): [n, 3] Cartesian positions.
+            radii (np.ndarray or float): Radii of the query spheres in Å.
+
+        **returns:**
+            np.ndarray: [n] bool, True where even the upper clearance bound
+            is below ``radii + tolerance``. False does not guarantee a
+            feasible point.
+        """
+        values = self.lookup(points)
+        required = np.asarray(radii, dtype=float) + self.tolerance
+        return (values < self.cutoff) & (values + self.max_error < required - CONTACT_EPS)
+
+    def feasible_mask(self, radius):
+        """
+        Voxels whose centre can hold a sphere of ``radius`` without overlap.
+
+        **parameters:**
+            radius (float): Radius of the guest atom in Å.
+
+        **returns:**
+            np.ndarray: Boolean array of the grid shape.
+        """
+        return self.values >= radius + self.tolerance
+
+    def feasible_sites(self, radius, n_sites=None):
+        """
+        Voxel centres that can hold a sphere of ``radius``, most open first.
+
+        **parameters:**
+            radius (float): Radius of the guest atom in Å.
+            n_sites (int, optional): Keep only the ``n_sites`` most open.
+
+        **returns:**
+            tuple: [n, 3] Cartesian positions and their [n] clearances.
+        """
+        idx = np.argwhere(self.feasible_mask(radius))
+        values = self.values[tuple(idx.T)]
+        order = np.argsort(-values, kind='stable')[:n_sites]
+        return self.positions(idx[order]), values[order]
+
+    def pore_centres(self, min_clearance=None, size=3, min_separation=2.0):
+        """
+        Local maxima of the clearance map, i.e. the centres of pores and
+        channels, ordered from the most open.
+
+        Values are capped at ``cutoff``, so large pores give plateaus of
+        equal maxima. Maxima closer than ``min_separation`` (periodic
+        distance) to a more open one already kept are suppressed, which
+        leaves one centre per plateau.
+
+        **parameters:**
+            min_clearance (float, optional): Discard maxima below this
+                clearance, defaults to ``tolerance``.
+            size (int): Neighbourhood in voxels of the maximum filter.
+            min_separation (float): Smallest distance in Å between two
+                returned centres.
+
+        **returns:**
+            tuple: [n, 3] Cartesian positions and their [n] clearances.
+        """
+        if min_clearance is None:
+            min_clearance = self.tolerance
+        mode = ['wrap' if p else 'nearest' for p in self.pbc]
+        local_max = maximum_filter(self.values, size=size, mode=mode)
+        idx = np.argwhere((self.values == local_max) & (self.values >= min_clearance))
+        values = self.values[tuple(idx.T)]
+        order = np.argsort(-values, kind='stable')
+        positions, values = self.positions(idx[order]), values[order]
+
+        if min_separation <= 0 or len(positions) == 0:
+            return positions, values
+
+        # greedy non-maximum suppression, most open first, over a periodic
+        # index of the candidates
+        candidates = HostSpatialIndex(Atoms(positions=positions, cell=self.cell, pbc=self.pbc),
+                                      tolerance=0.0, padding=min_separation)
+        wrapped = candidates.wrap(positions)
+        suppressed = np.zeros(len(positions), dtype=bool)
+        kept = []
+        for k in range(len(positions)):
+            if suppressed[k]:
+                continue
+            kept.append(k)
+            suppressed[candidates.image_atoms[candidates.tree.query_ball_point(wrapped[k], min_separation)]] = True
+        return positions[kept], values[kept]
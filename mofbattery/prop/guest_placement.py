@@ -0,0 +1,418 @@
+import logging
+import numpy as np
+import spglib
+from ase import Atoms
+from ase.data import covalent_radii
+from ase.geometry import find_mic
+from mofbattery.prop.host_index import HostSpatialIndex, CONTACT_EPS
+from mofbattery.prop.clearance_grid import ClearanceGrid
+
+logger = logging.getLogger(__name__)
+
+
+def axis_directions():
+    """
+    The six Cartesian axis directions +x, +y, +z, -x, -y, -z.
+
+    **returns:**
+        np.ndarray: [6, 3] unit vectors.
+    """
+    return np.vstack([np.eye(3), -np.eye(3)])
+
+
+def legacy_directions():
+    """
+    The 13 hand-picked trial directions used by ``generate_guest_complexes3``.
+
+    **returns:**
+        np.ndarray: [13, 3] unit vectors.
+    """
+    directions = np.array([
+        [1, 0, 0], [0, 1, 0], [0, 0, 1],
+        [-1, 0, 0], [0, -1, 0], [0, 0, -1],
+        [1, 1, 0], [-1, 1, 0], [1, -1, 0], [0, 1, 1],
+        [1, 0, 1], [1, 1, 1], [-1, -1, -1]
+    ], dtype=float)
+    return directions / np.linalg.norm(directions, axis=1, keepdims=True)
+
+
+def fibonacci_sphere(n_directions=32):
+    """
+    Nearly uniform directions on the unit sphere from a Fibonacci lattice.
+
+    **parameters:**
+        n_directions (int): Number of directions.
+
+    **returns:**
+        np.ndarray: [n_directions, 3] unit vectors.
+    """
+    k = np.arange(n_directions) + 0.5
+    z = 1.0 - 2.0 * k / n_directions
+    r = np.sqrt(1.0 - z * z)
+    phi = np.pi * (3.0 - np.sqrt(5.0)) * k
+    return np.column_stack([r * np.cos(phi), r * np.sin(phi), z])
+
+
+def fixed_direction(direction):
+    """
+    Build a sampler that always proposes a single direction.
+
+    **parameters:**
+        direction (array-like): Direction vector, normalised internally.
+
+    **returns:**
+        callable: Sampler returning a [1, 3] unit vector.
+    """
+    direction = np.asarray(direction, dtype=float)
+    direction = direction / np.linalg.norm(direction)
+
+    def sampler(n_directions=None):
+        return direction[None, :]
+    return sampler
+
+
+DIRECTION_SAMPLERS = {
+    'axes': axis_directions,
+    'legacy': legacy_directions,
+    'fibonacci': fibonacci_sphere,
+}
+
+# named samplers that take ``n_directions``, the others have a fixed set
+SIZED_SAMPLERS = {'fibonacci'}
+
+
+def get_directions(sampler, n_directions=32):
+    """
+    Resolve a sampler specification into unit direction vectors.
+
+    **parameters:**
+        sampler (str, callable or array-like): Name in
+            ``DIRECTION_SAMPLERS``, a callable taking ``n_directions`` or an
+            explicit [n, 3] array of directions.
+        n_directions (int): Number of directions for samplers that accept
+            it, see ``SIZED_SAMPLERS``.
+
+    **returns:**
+        np.ndarray: [n, 3] unit vectors.
+    """
+    if isinstance(sampler, str):
+        if sampler not in DIRECTION_SAMPLERS:
+            raise ValueError(f"Unknown sampler: {sampler}. Choose from {list(DIRECTION_SAMPLERS)}.")
+        if sampler in SIZED_SAMPLERS:
+            directions = DIRECTION_SAMPLERS[sampler](n_directions)
+        else:
+            directions = DIRECTION_SAMPLERS[sampler]()
+    elif callable(sampler):
+        directions = sampler(n_directions)
+    else:
+        directions = sampler
+    directions = np.asarray(directions, dtype=float).reshape(-1, 3)
+    return directions / np.linalg.norm(directions, axis=1, keepdims=True)
+
+
+def symmetry_orbits(host: Atoms, symprec=0.1):
+    """
+    Symmetry-equivalence classes (Wyckoff orbits) of the host atoms from
+    spglib.
+
+    The host counts as periodic when it has three non-zero lattice vectors,
+    whatever its ``pbc`` flags, so structures read without them are still
+    reduced.
+
+    **parameters:**
+        host (Atoms): Periodic host framework.
+        symprec (float): Distance tolerance of the symmetry search in Å.
+            Relaxed DFT cells are rarely symmetric to better than ~0.01 Å.
+
+    **returns:**
+        np.ndarray: [n_atoms] index of the representative atom of each
+        atom's orbit. Every atom is its own orbit, with a warning, when no
+        symmetry is found or the host has no unit cell.
+    """
+    if host.cell.rank < 3:
+        logger.warning('%s has no unit cell, symmetry reduction skipped', host.get_chemical_formula())
+        return np.arange(len(host))
+    cell = (np.array(host.get_cell()), host.get_scaled_positions(), host.get_atomic_numbers())
+    dataset = spglib.get_symmetry_dataset(cell, symprec=symprec)
+    if dataset is None:
+        logger.warning('spglib found no symmetry for %s at symprec=%g, symmetry reduction skipped',
+                       host.get_chemical_formula(), symprec)
+        return np.arange(len(host))
+    # spglib >= 2.0 returns an object, older releases a dict
+    equivalent = getattr(dataset, 'equivalent_atoms', None)
+    if equivalent is None:
+        equivalent = dataset['equivalent_atoms']
+    return np.asarray(equivalent)
+
+
+def select_host_sites(host: Atoms, charges, exclude=('H',), min_atoms=3, symmetry_reduce=False, symprec=0.1):
+    """
+    Pick candidate host atoms per element: the most positive, the median and
+    the most negative charge of every element with at least ``min_atoms``
+    atoms.
+
+    With ``symmetry_reduce`` the atoms are first grouped into symmetry
+    orbits (:func:`symmetry_orbits`) and the selection runs over one
+    representative per orbit, carrying the mean charge of the orbit, so
+    symmetry-equivalent atoms never yield duplicate complexes.
+
+    **parameters:**
+        host (Atoms): Host framework.
+        charges (list): Atomic charges of the host.
+        exclude (tuple): Element symbols that are never selected.
+        min_atoms (int): Elements with fewer atoms are skipped.
+        symmetry_reduce (bool): Select among symmetry orbits instead of
+            atoms.
+        symprec (float): Distance tolerance of the symmetry search in Å.
+
+    **returns:**
+        list of tuple: ``(index, charge, symbol)`` per selected site.
+    """
+    assert len(host) == len(charges), "Host and charges must be the same length"
+
+    symbols = host.get_chemical_symbols()
+    grouped_by_symbol = {}
+    if symmetry_reduce:
+        orbits = symmetry_orbits(host, symprec)
+        charges = np.asarray(charges, dtype=float)
+        counts = {}
+        for sym in symbols:
+            counts[sym] = counts.get(sym, 0) + 1
+        for rep in np.unique(orbits):
+            sym = symbols[rep]
+            if sym not in exclude and counts[sym] >= min_atoms:
+                grouped_by_symbol.setdefault(sym, []).append((int(rep), float(charges[orbits == rep].mean())))
+    else:
+        for i, sym in enumerate(symbols):
+            if sym not in exclude:
+                grouped_by_symbol.setdefault(sym, []).append((i, charges[i]))
+
+    sites = []
+    for symbol, atoms in grouped_by_symbol.items():
+        if not symmetry_reduce and len(atoms) < min_atoms:
+            continue
+        atoms.sort(key=lambda x: x[1], reverse=True)
+        picked = [atoms[0], atoms[len(atoms) // 2], atoms[-1]]
+        if symmetry_reduce:
+            # an element with fewer than three orbits must not repeat a site
+            picked = list(dict.fromkeys(picked))
+        for idx, charge in picked:
+            sites.append((idx, charge, symbol))
+    return sites
+
+
+def spaced_selection(placements, n_complexes=7):
+    """
+    Sort placements by charge (most positive first) and pick ``n_complexes``
+    evenly spaced ones.
+
+    **parameters:**
+        placements (list of tuple): ``(charge, Atoms)`` pairs.
+        n_complexes (int): Number of structures to keep.
+
+    **returns:**
+        list of Atoms: Selected complexes.
+    """
+    placements = sorted(placements, key=lambda x: x[0], reverse=True)
+    if len(placements) >= n_complexes:
+        indices = np.linspace(0, len(placements) - 1, n_complexes, dtype=int)
+        return [placements[i][1] for i in indices]
+    return [x[1] for x in placements]
+
+
+def place_guest_at_sites(host: Atoms,
+                         guest: Atoms,
+                         sites,
+                         sampler='fibonacci',
+                         n_directions=32,
+                         selection='best',
+                         tolerance=0.4,
+                         host_index=None,
+                         grid=None):
+    """
+    Evaluate every site x direction candidate in one batched query and keep
+    one placement per site. With a :class:`ClearanceGrid` the candidates
+    the grid already rules out are dropped before the exact query.
+
+    The guest centre of mass is placed at ``host_position + direction *
+    (r_host + r_guest + tolerance)`` where ``r_guest`` is the largest
+    covalent radius in the guest.
+
+    **parameters:**
+        host (Atoms): Host framework.
+        guest (Atoms): Guest to insert.
+        sites (list of tuple): ``(index, charge, symbol)`` from
+            :func:`select_host_sites`.
+        sampler: Direction sampler, see :func:`get_directions`.
+        n_directions (int): Number of directions for sized samplers.
+        selection (str): ``'best'`` keeps the feasible direction with the
+            largest clearance to every host atom but the anchor, which the
+            guest touches by construction, ``'first'`` the first feasible one
+            in sampler order.
+        tolerance (float): Extra clearance in Å added to radius sums.
+        host_index (HostSpatialIndex, optional): Prebuilt index of the host,
+            built with the same ``tolerance``.
+        grid (ClearanceGrid, optional): Precomputed clearance grid of the
+            host, built with the same ``tolerance``.
+
+    **returns:**
+        tuple: ``placements`` as a list of ``(charge, Atoms)`` and
+        ``failed`` as a list of the sites without a feasible direction.
+    """
+    if selection not in ('best', 'first'):
+        raise ValueError(f"Unknown selection: {selection}. Choose from 'best' or 'first'.")
+    if grid is not None and grid.tolerance != tolerance:
+        raise ValueError("The clearance grid was built with a different tolerance")
+    if host_index is not None and host_index.tolerance != tolerance:
+        raise ValueError("The host index was built with a different tolerance")
+    if host_index is None:
+        host_index = grid.index if grid is not None else HostSpatialIndex(host, tolerance=tolerance)
+    if len(sites) == 0:
+        return [], []
+
+    directions = get_directions(sampler, n_directions)
+    guest_radii = covalent_radii[guest.numbers]
+    guest_offsets = guest.positions - guest.get_center_of_mass()
+
+    site_indices = np.array([site[0] for site in sites])
+    site_positions = host.positions[site_indices]
+    radius = covalent_radii[host.numbers[site_indices]] + guest_radii.max() + tolerance
+
+    # candidates: [sites, directions, guest atoms, 3]
+    centres = site_positions[:, None, :] + directions[None, :, :] * radius[:, None, None]
+    points = centres[:, :, None, :] + guest_offsets[None, None, :, :]
+    points = points.reshape(-1, 3)
+    radii = np.tile(guest_radii, len(sites) * len(directions))
+    candidate = np.ones(len(points), dtype=bool)
+    if grid is not None:
+        rejected = grid.surely_overlapping(points, radii).reshape(-1, len(guest)).any(axis=1)
+        candidate = np.repeat(~rejected, len(guest))
+    # the anchor touches the guest in every direction, so it is left out of
+    # the clearance used for ranking and checked on its own
+    anchors = np.repeat(site_indices, len(directions) * len(guest))
+    anchor_vectors, _ = find_mic(points - host.positions[anchors], host.cell, host.pbc)
+    anchor_clearance = np.linalg.norm(anchor_vectors, axis=1) - (covalent_radii[host.numbers[anchors]]
+                                                                  + radii + tolerance)
+    clearance = np.full(len(points), -np.inf)
+    clearance[candidate] = host_index.clearance(points[candidate], radii[candidate], exclude=anchors[candidate])
+    clearance = clearance.reshape(len(sites), len(directions), len(guest)).min(axis=2)
+    anchor_clearance = anchor_clearance.reshape(len(sites), len(directions), len(guest)).min(axis=2)
+    feasible = np.minimum(clearance, anchor_clearance) >= -CONTACT_EPS
+    # the feasibility clearance is capped, so rank on the uncapped distance
+    # to the nearest atoms instead
+    ranking = np.full(feasible.shape, -np.inf)
+    if selection == 'best' and feasible.any():
+        ranked = np.repeat(feasible.reshape(-1), len(guest))
+        nearest = host_index.nearest_clearance(points[ranked], radii[ranked], exclude=anchors[ranked])
+        ranking[feasible] = nearest.reshape(-1, len(guest)).min(axis=1)
+
+    placements, failed = [], []
+    for s, (idx, charge, symbol) in enumerate(sites):
+        if not feasible[s].any():
+            failed.append((idx, charge, symbol))
+            continue
+        if selection == 'first':
+            d = np.argmax(feasible[s])
+        else:
+            d = np.argmax(ranking[s])
+        guest_shifted = guest.copy()
+        guest_shifted.positions = centres[s, d] + guest_offsets
+        placements.append((charge, host + guest_shifted))
+    return placements, failed
+
+
+def place_guests(host: Atoms,
+                 guest: Atoms,
+                 charges,
+                 sampler='fibonacci',
+                 n_directions=32,
+                 selection='best',
+                 n_complexes=7,
+                 tolerance=0.4,
+                 host_index=None,
+                 grid=None,
+                 symmetry_reduce=False,
+                 symprec=0.1,
+                 verbose=False):
+    """
+    Generate host-guest complexes next to charge-selected host atoms.
+
+    Candidate host atoms are chosen per element by charge
+    (:func:`select_host_sites`), every candidate direction of every site is
+    tested in one batched spatial-index query, and ``n_complexes`` complexes
+    spread over the charge range are returned.
+
+    **parameters:**
+        host (Atoms): Host framework.
+        guest (Atoms): Guest to insert.
+        charges (list): Atomic charges of the host.
+        sampler: Direction sampler, see :func:`get_directions`.
+        n_directions (int): Number of directions for sized samplers.
+        selection (str): ``'best'`` or ``'first'``, see
+            :func:`place_guest_at_sites`.
+        n_complexes (int): Number of complexes returned.
+        tolerance (float): Extra clearance in Å added to radius sums.
+        host_index (HostSpatialIndex, optional): Prebuilt index of the host.
+        grid (ClearanceGrid, optional): Prefilter, see
+            :func:`place_guest_at_sites`.
+        symmetry_reduce (bool): Place one guest per symmetry orbit, see
+            :func:`select_host_sites`.
+        symprec (float): Tolerance of the symmetry search in Å.
+        verbose (bool): Print the sites where no direction was feasible.
+
+    **returns:**
+        list of Atoms: Host + guest complexes ordered from the most positive
+        to the most negative site charge.
+    """
+    sites = select_host_sites(host, charges, symmetry_reduce=symmetry_reduce, symprec=symprec)
+    placements, failed = place_guest_at_sites(host, guest, sites,
+                                              sampler=sampler,
+                                              n_directions=n_directions,
+                                              selection=selection,
+                                              tolerance=tolerance,
+                                              host_index=host_index,
+                                              grid=grid)
+    if verbose:
+        for _, charge, symbol in failed:
+            print(f"Could not place guest near {symbol} (charge: {charge:.2f}) due to overlap.")
+    return spaced_selection(placements, n_complexes)
+
+
+def place_guest_in_pores(host: Atoms,
+                         guest: Atoms,
+                         grid=None,
+                         n_complexes=7,
+                         spacing=0.5,
+                         tolerance=0.4):
+    """
+    Place the guest centre of mass at the most open pore centres of the
+    host, looked up from a clearance grid instead of trial directions.
+
+    **parameters:**
+        host (Atoms): Host framework with a unit cell.
+        guest (Atoms): Guest to insert.
+        grid (ClearanceGrid, optional): Precomputed clearance grid, built
+            with ``spacing`` and ``tolerance`` when not given.
+        n_complexes (int): Maximum number of complexes returned.
+        spacing (float): Voxel size in Å when the grid is built here.
+        tolerance (float): Extra clearance in Å added to radius sums.
+
+    **returns:**
+        list of Atoms: Host + guest complexes from the most open pore down.
+    """
+    if grid is None:
+        grid = ClearanceGrid(host, spacing=spacing, tolerance=tolerance)
+    guest_radii = covalent_radii[guest.numbers]
+    guest_offsets = guest.positions - guest.get_center_of_mass()
+
+    centres, _ = grid.pore_centres(min_clearance=guest_radii.max() + grid.tolerance)
+    complexes = []
+    for centre in centres:
+        points = centre + guest_offsets
+        if grid.index.no_overlap(points, guest.numbers):
+            guest_shifted = guest.copy()
+            guest_shifted.positions = points
+            complexes.append(host + guest_shifted)
+            if len(complexes) == n_complexes:
+                break
+    return complexes
@@ -0,0 +1,244 @@
+import copy
+import numpy as np
+from ase import Atoms
+from ase.data import covalent_radii
+from scipy.spatial import cKDTree
+
+# Guests are placed exactly at contact distance of their anchor atom, so a
+# clearance within round-off of zero must count as touching, not overlapping.
+CONTACT_EPS = 1e-8
+
+# Contacts are searched this far (Å) beyond the largest radius sum, so a
+# contact at exactly zero clearance is never lost to round-off at the
+# search radius. Clearances up to this margin are exact.
+SEARCH_MARGIN = 0.5
+
+
+class HostSpatialIndex:
+    """
+    Periodic spatial index of a host framework for fast overlap queries.
+
+    The host atoms are wrapped into the unit cell and replicated into the
+    periodic images that lie within ``padding`` of the cell faces. A KD-tree
+    over these points is built once per host, so every trial guest position
+    is only compared against nearby host atoms instead of the whole host.
+    Queries follow the same convention as ``check_no_overlap``: a guest atom
+    overlaps a host atom when their distance is below the sum of the covalent
+    radii plus ``tolerance``, and periodic images are only used along the
+    host's periodic directions.
+
+    **parameters:**
+        host (Atoms): Host framework.
+        tolerance (float): Extra clearance in Å added to the radius sum.
+        padding (float, optional): Width in Å of the image shell around the
+            cell. Defaults to the largest host radius plus the largest
+            covalent radius plus ``tolerance`` and ``SEARCH_MARGIN``, which
+            covers any guest atom.
+    """
+
+    def __init__(self, host: Atoms, tolerance=0.4, padding=None):
+        self.tolerance = tolerance
+        self.numbers = host.get_atomic_numbers()
+        self.radii = covalent_radii[self.numbers]
+        self.pbc = np.array(host.get_pbc(), dtype=bool)
+        self.cell = np.array(host.get_cell())
+        self.inverse_cell = np.linalg.inv(self.cell) if self.pbc.any() else None
+        self.max_radius = self.radii.max() if len(self.radii) else 0.0
+        if padding is None:
+            padding = self.max_radius + covalent_radii.max() + tolerance + SEARCH_MARGIN
+        self.padding = padding
+
+        self.n_host = len(self.numbers)
+        self.image_positions, self.image_atoms = self._images(host.positions)
+        self.tree = cKDTree(self.image_positions)
+
+        # atoms inserted after construction live in a small secondary tree
+        self.added_positions = np.empty((0, 3))
+        self.added_image_positions = np.empty((0, 3))
+        self.added_image_atoms = np.empty(0, dtype=np.int64)
+        self.added_tree = None
+
+    def _images(self, positions, offset=0):
+        """Wrapped positions and their periodic images within the padding."""
+        positions = self.wrap(positions)
+        image_positions, image_atoms = [positions], [np.arange(len(positions)) + offset]
+        if self.pbc.any():
+            frac = positions @ self.inverse_cell
+            pad_frac = self._padding_fraction(self.padding)
+            n_shift = np.where(self.pbc, np.ceil(pad_frac).astype(int), 0)
+            for shift in np.stack(np.meshgrid(*[np.arange(-n, n + 1) for n in n_shift],
+                                              indexing='ij'), axis=-1).reshape(-1, 3):
+                if not shift.any():
+                    continue
+                shifted = frac + shift
+                inside = np.all((shifted >= -pad_frac) & (shifted < 1 + pad_frac), axis=1)
+                image_positions.append(shifted[inside] @ self.cell)
+                image_atoms.append(np.nonzero(inside)[0] + offset)
+        return np.concatenate(image_positions), np.concatenate(image_atoms)
+
+    def add_atoms(self, positions, numbers):
+        """
+        Insert atoms, e.g. an accepted guest, so later queries also avoid
+        them. Only the small secondary tree of inserted atoms is rebuilt.
+        Inserted atoms get indices after the host atoms.
+
+        **parameters:**
+            positions (np.ndarray): [n, 3] Cartesian positions.
+            numbers (array-like): Atomic numbers.
+        """
+        numbers = np.asarray(numbers, dtype=int).reshape(-1)
+        offset = len(self.numbers)
+        self.numbers = np.concatenate([self.numbers, numbers])
+        self.radii = covalent_radii[self.numbers]
+        self.max_radius = self.radii.max()
+        # the host images stay valid, inserted atoms may need a wider shell
+        self.padding = max(self.padding, self.max_radius + covalent_radii.max() + self.tolerance + SEARCH_MARGIN)
+
+        image_positions, image_atoms = self._images(positions, offset)
+        self.added_positions = np.concatenate([self.added_positions, self.wrap(positions)])
+        self.added_image_positions = np.concatenate([self.added_image_positions, image_positions])
+        self.added_image_atoms = np.concatenate([self.added_image_atoms, image_atoms])
+        self.added_tree = cKDTree(self.added_image_positions)
+
+    def copy(self):
+        """
+        Copy of the index to insert atoms into without changing this one.
+        The host tree and its images are never modified and are shared;
+        the atom arrays and the inserted atoms are copied.
+
+        **returns:**
+            HostSpatialIndex: Independent index of the same atoms.
+        """
+        clone = copy.copy(self)
+        clone.numbers = self.numbers.copy()
+        clone.radii = self.radii.copy()
+        clone.added_positions = self.added_positions.copy()
+        clone.added_image_positions = self.added_image_positions.copy()
+        clone.added_image_atoms = self.added_image_atoms.copy()
+        return clone
+
+    def _padding_fraction(self, padding):
+        """Padding per lattice direction in fractional units."""
+        volume = abs(np.linalg.det(self.cell))
+        heights = np.array([volume / np.linalg.norm(np.cross(self.cell[(k + 1) % 3], self.cell[(k + 2) % 3]))
+                            for k in range(3)])
+        return np.where(self.pbc, padding / heights, 0.0)
+
+    def wrap(self, points):
+        """
+        Wrap Cartesian points into the unit cell along periodic directions.
+
+        **parameters:**
+            points (np.ndarray): [n, 3] Cartesian positions.
+
+        **returns:**
+            np.ndarray: [n, 3] wrapped positions.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if not self.pbc.any():
+            return points
+        frac = points @ self.inverse_cell
+        frac[:, self.pbc] %= 1.0
+        return frac @ self.cell
+
+    def clearance(self, points, radii, return_index=False, exclude=None):
+        """
+        Surface-to-surface clearance of query spheres to the host.
+
+        **parameters:**
+            points (np.ndarray): [n, 3] Cartesian query positions.
+            radii (np.ndarray or float): Radii of the query spheres in Å,
+                e.g. the covalent radii of the guest atoms.
+            return_index (bool): Also return the host atom index of the
+                closest contact (-1 if none within ``SEARCH_MARGIN``).
+                Inserted atoms count from ``n_host``.
+            exclude (np.ndarray, optional): [n] atom index per point whose
+                contacts, including those of its periodic images, are
+                ignored, or -1 to keep all contacts.
+
+        **returns:**
+            np.ndarray: [n] clearance ``d - r_host - r_query - tolerance``.
+            Only contacts up to ``SEARCH_MARGIN`` beyond the radius sum are
+            searched, so larger clearances are capped at ``SEARCH_MARGIN``.
+            A value below ``-CONTACT_EPS`` means overlap.
+        """
+        points = self.wrap(points)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(points),))
+        clearance = np.full(len(points), SEARCH_MARGIN)
+        closest = np.full(len(points), -1, dtype=np.int64)
+        if len(points) == 0 or len(self.image_positions) == 0:
+            return (clearance, closest) if return_index else clearance
+
+        search = self.max_radius + radii.max() + self.tolerance + SEARCH_MARGIN
+        query_tree = cKDTree(points)
+        trees = [(self.tree, self.image_atoms)]
+        if self.added_tree is not None:
+            trees.append((self.added_tree, self.added_image_atoms))
+        for tree, image_atoms in trees:
+            pairs = query_tree.sparse_distance_matrix(tree, search, output_type='ndarray')
+            if len(pairs) == 0:
+                continue
+            query, image, distance = pairs['i'], pairs['j'], pairs['v']
+            host_atom = image_atoms[image]
+            values = distance - (self.radii[host_atom] + radii[query] + self.tolerance)
+            if exclude is not None:
+                values[host_atom == exclude[query]] = np.inf
+            np.minimum.at(clearance, query, values)
+            if return_index:
+                best = values == clearance[query]
+                closest[query[best]] = host_atom[best]
+        return (clearance, closest) if return_index else clearance
+
+    def nearest_clearance(self, points, radii, exclude=None, k=8):
+        """
+        Uncapped surface-to-surface clearance of query spheres to their
+        nearest atoms, for ranking placements that all clear the
+        ``SEARCH_MARGIN`` cap of :meth:`clearance`.
+
+        **parameters:**
+            points (np.ndarray): [n, 3] Cartesian query positions.
+            radii (np.ndarray or float): Radii of the query spheres in Å.
+            exclude (np.ndarray, optional): [n] atom index per point whose
+                contacts are ignored, or -1 to keep all contacts.
+            k (int): Number of nearest atom images considered per point.
+
+        **returns:**
+            np.ndarray: [n] smallest clearance among the ``k`` nearest atom
+            images, ``inf`` when none remains. Atoms further away than the
+            image ``padding`` may be missed, so larger values are only a
+            lower bound of how open the position is.
+        """
+        points = self.wrap(points)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(points),))
+        clearance = np.full(len(points), np.inf)
+        if len(points) == 0:
+            return clearance
+        trees = [(self.tree, self.image_atoms)]
+        if self.added_tree is not None:
+            trees.append((self.added_tree, self.added_image_atoms))
+        for tree, image_atoms in trees:
+            n_neighbours = min(k, tree.n)
+            if n_neighbours == 0:
+                continue
+            distance, image = tree.query(points, k=n_neighbours)
+            distance = distance.reshape(len(points), n_neighbours)
+            host_atom = image_atoms[image.reshape(len(points), n_neighbours)]
+            values = distance - (self.radii[host_atom] + radii[:, None] + self.tolerance)
+            if exclude is not None:
+                values[host_atom == np.asarray(exclude)[:, None]] = np.inf
+            clearance = np.minimum(clearance, values.min(axis=1))
+        return clearance
+
+    def no_overlap(self, points, numbers):
+        """
+        Check whether a set of guest atoms is free of host overlaps.
+
+        **parameters:**
+            points (np.ndarray): [n, 3] Cartesian guest positions.
+            numbers (array-like): Atomic numbers of the guest atoms.
+
+        **returns:**
+            bool: True if no guest atom overlaps the host.
+        """
+        radii = covalent_radii[np.asarray(numbers, dtype=int)]
+        return bool(np.all(self.clearance(points, radii) >= -CONTACT_EPS))
@@ -0,0 +1,335 @@
+"""
+Parallel, resumable generation of AMS NEB inputs for many host frameworks.
+
+Every host output file is parsed, guest complexes are generated next to
+charge-selected host atoms and an NEB run script is written to
+``{output_dir}/{folder}``. Hosts are distributed over a process pool and the
+outcome of every host is appended to a JSON lines manifest, so a rerun of
+the same campaign skips the hosts that already finished.
+"""
+
+import os
+import glob
+import json
+import time
+import logging
+import argparse
+from ase.io import read
+from mofbattery.parallel import imap_isolated
+from mofbattery.read_write.ams_output import AMSOutputIndex
+from mofbattery.prop.neb_complexes import (generate_guest_complexes,
+                                           generate_guest_complexes3,
+                                           generate_ams_neb_input)
+
+logger = logging.getLogger(__name__)
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class CampaignError(Exception):
+    """Failure of a single host with a machine readable reason."""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def host_names(host_file):
+    """
+    Names derived from the host path, following the
+    ``{folder}/{basename}_..._opt.out`` layout where the folder name starts
+    with the guest element, e.g. ``Al_cluster_1``.
+
+    **parameters:**
+        host_file (str): Path to the host output file.
+
+    **returns:**
+        tuple: ``basename``, ``foldername`` and ``atom_name``.
+    """
+    basename = os.path.basename(host_file).split('_')[0]
+    foldername = os.path.basename(os.path.dirname(os.path.abspath(host_file)))
+    atom_name = foldername.split('_c')[0]
+    return basename, foldername, atom_name
+
+
+def read_host(host_file, output_format='adf'):
+    """
+    Host structure and atomic charges of an AMS output file.
+
+    **parameters:**
+        host_file (str): Path to the host output file.
+        output_format (str): ``'adf'`` for the AIM charges and the X-Y-Z
+            geometry block, ``'dftb'`` for the Mulliken charges and the
+            DFTB geometry table.
+
+    **returns:**
+        tuple: Host ``Atoms`` and list of charges.
+    """
+    with AMSOutputIndex(host_file) as index:
+        if output_format == 'adf':
+            _, charges = index.get_charge()
+            host = index.get_ase_atom()
+        elif output_format == 'dftb':
+            charges = index.get_test_charges()
+            host = index.get_test_atom()
+        else:
+            raise ValueError(f"Unknown output format: {output_format}. Choose from 'adf' or 'dftb'.")
+    return host, list(charges)
+
+
+def process_host(host_file, guest_path, output_dir, output_format='adf', min_complexes=4, interpolate=None,
+                 symmetry_reduce=False):
+    """
+    Generate the NEB input of a single host.
+
+    Complexes are first generated with the 13 trial directions of
+    ``generate_guest_complexes3``; when fewer than ``min_complexes`` remain
+    the six axis directions of ``generate_guest_complexes`` are used.
+
+    **parameters:**
+        host_file (str): Path to the host output file.
+        guest_path (str): Directory with one ``{element}.xyz`` per guest.
+        output_dir (str): Root directory of the NEB inputs.
+        output_format (str): ``'adf'`` or ``'dftb'``, see :func:`read_host`.
+        min_complexes (int): Minimum number of complexes before falling back.
+        interpolate (str, optional): ``'linear'`` or ``'idpp'`` initial
+            path, see ``generate_ams_neb_input``.
+        symmetry_reduce (bool): Use one host site per symmetry orbit.
+
+    **returns:**
+        dict: Manifest record with ``host``, ``status``, ``reason``,
+        ``error``, ``n_complexes``, ``neb_input`` and ``seconds``.
+    """
+    start = time.perf_counter()
+    basename, foldername, atom_name = host_names(host_file)
+    record = {'host': os.path.abspath(host_file),
+              'name': basename,
+              'folder': foldername,
+              'guest': atom_name,
+              'status': STATUS_FAILED,
+              'reason': None,
+              'error': None,
+              'n_complexes': 0,
+              'neb_input': None}
+    try:
+        guest_file = os.path.join(guest_path, f'{atom_name}.xyz')
+        if not os.path.isfile(guest_file):
+            raise CampaignError('missing_guest', f'Guest file {guest_file} not found')
+        guest = read(guest_file)
+
+        try:
+            host, charges = read_host(host_file, output_format)
+        except (KeyError, ValueError, IndexError) as error:
+            raise CampaignError('parse_error', error.args[0] if error.args else str(error)) from error
+
+        complexes = generate_guest_complexes3(host, guest, charges, symmetry_reduce=symmetry_reduce)
+        if len(complexes) < min_complexes:
+            complexes = generate_guest_complexes(host, guest, charges, symmetry_reduce=symmetry_reduce)
+        record['n_complexes'] = len(complexes)
+        if len(complexes) < 2:
+            raise CampaignError('too_few_complexes',
+                                f'Only {len(complexes)} overlap-free complexes, at least two required')
+
+        directory = os.path.join(output_dir, foldername)
+        try:
+            generate_ams_neb_input(complexes, neb_name=basename, directory=directory,
+                                   interpolate=interpolate)
+        except OSError as error:
+            raise CampaignError('write_error', str(error)) from error
+
+        record['status'] = STATUS_DONE
+        record['neb_input'] = os.path.join(directory, f'{basename}.run')
+    except CampaignError as error:
+        record['reason'] = error.reason
+        record['error'] = str(error)
+    except Exception as error:
+        record['reason'] = type(error).__name__
+        record['error'] = str(error)
+    record['seconds'] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def load_manifest(manifest_path):
+    """
+    Latest manifest record of every host.
+
+    **parameters:**
+        manifest_path (str): Path to the JSON lines manifest.
+
+    **returns:**
+        dict: Host path to its most recent record.
+    """
+    records = {}
+    if not os.path.exists(manifest_path):
+        return records
+    with open(manifest_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short by an interrupted run
+                continue
+            records[record['host']] = record
+    return records
+
+
+def append_manifest(manifest_path, record):
+    """Append one record to the manifest and flush it to disk."""
+    with open(manifest_path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def run_campaign(host_files,
+                 guest_path,
+                 output_dir,
+                 manifest_path=None,
+                 n_workers=None,
+                 output_format='adf',
+                 min_complexes=4,
+                 retry_failed=False,
+                 interpolate=None,
+                 symmetry_reduce=False):
+    """
+    Generate NEB inputs for many hosts in parallel.
+
+    Hosts recorded as done in the manifest are skipped, as are failed hosts
+    unless ``retry_failed`` is set. Every finished host is appended to the
+    manifest immediately, so an interrupted campaign resumes where it
+    stopped. A host that kills its worker process does not take the hosts
+    queued behind it down with it, see :func:`imap_isolated`.
+
+    **parameters:**
+        host_files (list of str): Host output files.
+        guest_path (str): Directory with one ``{element}.xyz`` per guest.
+        output_dir (str): Root directory of the NEB inputs.
+        manifest_path (str, optional): Defaults to
+            ``{output_dir}/manifest.jsonl``.
+        n_workers (int, optional): Worker processes, defaults to the CPU count.
+        output_format (str): ``'adf'`` or ``'dftb'``, see :func:`read_host`.
+        min_complexes (int): See :func:`process_host`.
+        retry_failed (bool): Rerun hosts that failed before.
+        interpolate (str, optional): See :func:`process_host`.
+        symmetry_reduce (bool): See :func:`process_host`.
+
+    **returns:**
+        dict: Counts of ``done``, ``failed`` and ``skipped`` hosts and the
+        failure ``reasons``.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = os.path.join(output_dir, 'manifest.jsonl')
+    finished = load_manifest(manifest_path)
+
+    pending, skipped = [], 0
+    for host_file in dict.fromkeys(os.path.abspath(h) for h in host_files):
+        previous = finished.get(host_file)
+        if previous is not None and (previous['status'] == STATUS_DONE or not retry_failed):
+            skipped += 1
+            continue
+        pending.append(host_file)
+    logger.info('%d hosts, %d already in manifest, %d to run', len(pending) + skipped, skipped, len(pending))
+
+    summary = {STATUS_DONE: 0, STATUS_FAILED: 0, 'skipped': skipped, 'reasons': {}}
+    if not pending:
+        return summary
+
+    start = time.perf_counter()
+    tasks = [(host_file, (host_file, guest_path, output_dir, output_format, min_complexes,
+                          interpolate, symmetry_reduce), {})
+             for host_file in pending]
+    for n_done, (host_file, record, error) in enumerate(imap_isolated(process_host, tasks, n_workers), 1):
+        if error is not None:
+            # the call itself failed, or the worker died on this host even when run alone
+            basename, foldername, atom_name = host_names(host_file)
+            record = {'host': host_file, 'name': basename, 'folder': foldername,
+                      'guest': atom_name, 'status': STATUS_FAILED,
+                      'reason': 'worker_error', 'error': str(error),
+                      'n_complexes': 0, 'neb_input': None, 'seconds': None}
+        append_manifest(manifest_path, record)
+        summary[record['status']] += 1
+        if record['status'] == STATUS_FAILED:
+            summary['reasons'][record['reason']] = summary['reasons'].get(record['reason'], 0) + 1
+            logger.warning('failed %s (%s): %s', record['host'], record['reason'], record['error'])
+        else:
+            logger.info('[%d/%d] %s %s %s', n_done, len(pending),
+                        record['name'], record['folder'], record['guest'])
+
+    elapsed = time.perf_counter() - start
+    logger.info('%d done, %d failed, %d skipped in %.1f s (%.2f hosts/s)',
+                summary[STATUS_DONE], summary[STATUS_FAILED], skipped,
+                elapsed, len(pending) / elapsed if elapsed > 0 else 0.0)
+    return summary
+
+
+def main():
+    """
+    Command line entry point of the NEB input campaign.
+    """
+    parser = argparse.ArgumentParser(description="Generate AMS NEB inputs for many host frameworks in parallel.")
+    parser.add_argument("host_glob",
+                        help="Glob pattern of the host output files, e.g. 'MOFs/*/*opt.out'"
+                        )
+    parser.add_argument("--guest_path",
+                        required=True,
+                        help="Directory with one {element}.xyz file per guest"
+                        )
+    parser.add_argument("--output_dir",
+                        default="NEB",
+                        help="Root directory of the NEB inputs"
+                        )
+    parser.add_argument("--manifest",
+                        default=None,
+                        help="JSON lines manifest, defaults to {output_dir}/manifest.jsonl"
+                        )
+    parser.add_argument("--workers",
+                        type=int,
+                        default=None,
+                        help="Number of worker processes (default: all CPUs)"
+                        )
+    parser.add_argument("--format",
+                        choices=["adf", "dftb"],
+                        default="adf",
+                        help="Output flavour of the host files"
+                        )
+    parser.add_argument("--min_complexes",
+                        type=int,
+                        default=4,
+                        help="Fall back to the axis directions below this number of complexes"
+                        )
+    parser.add_argument("--interpolate",
+                        choices=["linear", "idpp"],
+                        default=None,
+                        help="Write an interpolated initial path instead of leaving it to AMS"
+                        )
+    parser.add_argument("--symmetry_reduce",
+                        action="store_true",
+                        help="Place one guest per symmetry-equivalent class of host atoms"
+                        )
+    parser.add_argument("--retry_failed",
+                        action="store_true",
+                        help="Rerun hosts recorded as failed in the manifest"
+                        )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    host_files = sorted(glob.glob(args.host_glob))
+    if not host_files:
+        parser.error(f"No host files match {args.host_glob}")
+
+    run_campaign(host_files,
+                 guest_path=args.guest_path,
+                 output_dir=args.output_dir,
+                 manifest_path=args.manifest,
+                 n_workers=args.workers,
+                 output_format=args.format,
+                 min_complexes=args.min_complexes,
+                 retry_failed=args.retry_failed,
+                 interpolate=args.interpolate,
+                 symmetry_reduce=args.symmetry_reduce)
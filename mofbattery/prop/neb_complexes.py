@@ -1,378 +1,275 @@
 import os
 import glob
+import gzip
 from ase import Atoms
 from ase.io import read
 from ase.geometry import get_distances
 from mofstructure import mofdeconstructor, filetyper
 #from ase.geometry import distance
-from ase.data import covalent_radii, atomic_numbers
+from ase.data import covalent_radii
 import numpy as np
 import itertools
-
-
-def check_no_overlap(host: Atoms, guest: Atoms) -> bool:
-    """Check if all guest atoms are far enough from host atoms."""
-    all_positions_host = host.positions
-    all_positions_guest = guest.positions
-    cell = host.get_cell()
-    pbc = host.get_pbc()
-
-    distances = get_distances(all_positions_host, all_positions_guest, cell=cell, pbc=pbc)[1]
-
-    for i, host_atom in enumerate(host):
-        for j, guest_atom in enumerate(guest):
-            min_allowed_dist = covalent_radii[host_atom.number] + covalent_radii[guest_atom.number] + 0.4
-            if distances[i, j] < min_allowed_dist:
-                return False
-    return True
+from mofbattery.prop.guest_placement import (select_host_sites,
+                                             place_guest_at_sites,
+                                             spaced_selection,
+                                             fixed_direction)
+from mofbattery.prop.neb_path import interpolate_path
+from mofbattery.read_write.ams_output import AMSOutputIndex
+
+
+def check_no_overlap(host: Atoms, guest: Atoms, tolerance: float = 0.4, return_report: bool = False):
+    """
+    Check if all guest atoms are far enough from host atoms.
+
+    A host/guest pair overlaps when its (minimum image) distance is below the
+    sum of the covalent radii plus ``tolerance``. All pairs are compared at
+    once against a broadcast radius-sum matrix.
+
+    **parameters:**
+        host (Atoms): Host framework; its cell and pbc are used.
+        guest (Atoms): Guest placed in the host frame.
+        tolerance (float): Extra clearance in Å added to the radius sum.
+        return_report (bool): Return the closest-contact report instead of
+            a bool.
+
+    **returns:**
+        bool: True if no pair overlaps, or with ``return_report`` a dict with
+        ``no_overlap``, ``n_overlaps`` and the closest contact
+        (``host_index``, ``guest_index``, ``distance``, ``min_allowed``,
+        ``clearance``).
+    """
+    distances = get_distances(host.positions, guest.positions,
+                              cell=host.get_cell(), pbc=host.get_pbc())[1]
+
+    min_allowed = covalent_radii[host.numbers][:, None] + \
+        covalent_radii[guest.numbers][None, :] + tolerance
+    clearance = distances - min_allowed
+    overlapping = clearance < 0
+    no_overlap = not overlapping.any()
+    if not return_report:
+        return no_overlap
+
+    i, j = np.unravel_index(np.argmin(clearance), clearance.shape)
+    return {'no_overlap': no_overlap,
+            'n_overlaps': int(overlapping.sum()),
+            'host_index': int(i),
+            'guest_index': int(j),
+            'distance': float(distances[i, j]),
+            'min_allowed': float(min_allowed[i, j]),
+            'clearance': float(clearance[i, j])}
+
+
+def _as_index(data):
+    """An ``AMSOutputIndex`` over the lines of an output, or ``data`` itself if it is one."""
+    return data if isinstance(data, AMSOutputIndex) else AMSOutputIndex.from_lines(data)
 
 
 def get_section(contents, start_key, stop_key, start_offset=0, stop_offset=0):
-    all_start_indices = [i + start_offset for i, line in enumerate(contents) if start_key in line]
-    start_index = all_start_indices[-1]
-    for i in range(start_index, len(contents)):
-        if stop_key in contents[i]:
-            stop_index = i + 1 + stop_offset
-            break
-    return contents[start_index:stop_index]
+    """
+    Lines of the last occurrence of a section, see
+    :meth:`AMSOutputIndex.section_lines`.
+    """
+    index = AMSOutputIndex.from_lines(contents,
+                                      sections={'section': (start_key, stop_key, start_offset, stop_offset)})
+    lines = index.section_lines('section')
+    if contents and contents[0].endswith('\n'):
+        return lines
+    return [line[:-1] if line.endswith('\n') else line for line in lines]
 
 
 def get_charge(data):
-    aim = []
-    elements = []
-    section = get_section(data, 'Atomic Charge Analysis', 'Total:', start_offset=8, stop_offset=-2)
-    for line in section:
-        parts = line.split()
-        aim.append(float(parts[6]))  # AIM charge
-        elements.append(parts[1])
-    return elements, aim
-
+    """
+    Elements and AIM charges of the final geometry. ``data`` is a list of
+    lines or an ``AMSOutputIndex``, which parses all sections from one scan.
+    """
+    elements, aim = _as_index(data).get_charge()
+    return elements, aim.tolist()
 
 
 def get_ase_atom(data):
-    section = get_section(data, 'G E O M E T R Y    I N    X - Y - Z    F O R M A T', 'Total nr. of atoms:', start_offset=3, stop_offset=-2)
-    positions = []
-    elements = []
-    cell = []
-
-    for line in section:
-        if 'VEC' in line:
-            cell.append([float(x) for x in line.split()[1:]])
-        else:
-            parts = line.split()
-            elements.append(parts[0])
-            positions.append([float(x) for x in parts[1:]])
-
-    return Atoms(symbols=elements, positions=positions, cell=cell)
-
-
-def generate_guest_complexes(host: Atoms, guest: Atoms, charges: list) -> list:
-    assert len(host) == len(charges), "Host and charges must be the same length"
-
-    guest_compositions = [atom.symbol for atom in guest]
-    guest_covalent_radius = max(covalent_radii[atomic_numbers[s]] for s in guest_compositions)
-
-    non_h_indices = [i for i, atom in enumerate(host) if atom.symbol != 'H']
-    non_h_charges = [(i, charges[i], host[i].symbol) for i in non_h_indices]
-
-    grouped_by_symbol = {}
-    for i, q, sym in non_h_charges:
-        grouped_by_symbol.setdefault(sym, []).append((i, q))
-
-    placements = []
-
-    for symbol, atoms in grouped_by_symbol.items():
-        if len(atoms) < 3:
-            continue
-        atoms.sort(key=lambda x: x[1], reverse=True)
-
-        selected_atoms = [atoms[0], atoms[len(atoms) // 2], atoms[-1]]
-        for idx, charge in [(a[0], a[1]) for a in selected_atoms]:
-            host_atom = host[idx]
-            pos = host_atom.position
-
-            # Try placing the guest in multiple directions until a valid spot is found
-            directions = np.eye(3).tolist() + (-np.eye(3)).tolist()
-            radius = covalent_radii[host_atom.number] + guest_covalent_radius + 0.4
-
-            for direction in directions:
-                guest_pos = pos + np.array(direction) * radius
-                guest_shifted = guest.copy()
-                guest_shifted.translate(guest_pos - guest.get_center_of_mass())
-
-                if check_no_overlap(host, guest_shifted):
-                    combined = host + guest_shifted
-                    placements.append((charge, combined))
-                    break  # Stop after finding the first valid direction
-
-    # Sort by charge from most positive to most negative
-    placements.sort(key=lambda x: x[0], reverse=True)
-
-    # Choose 7 structures: first (most positive), last (most negative), and 5 intermediates
-    if len(placements) >= 7:
-        indices = np.linspace(0, len(placements) - 1, 7, dtype=int)
-        final_complexes = [placements[i][1] for i in indices]
-    else:
-        final_complexes = [x[1] for x in placements]  # Return as many as found
-
-    return final_complexes
-
-
-def generate_guest_complexes2(host: Atoms, guest: Atoms, charges: list, direction=np.array([1.0, 0.0, 0.0])) -> list:
-    assert len(host) == len(charges), "Host and charges must match"
-
-    guest_compositions = [atom.symbol for atom in guest]
-    guest_covalent_radius = max(covalent_radii[atomic_numbers[s]] for s in guest_compositions)
-
-    # Filter out hydrogens
-    non_h_indices = [i for i, atom in enumerate(host) if atom.symbol != 'H']
-    non_h_charges = [(i, charges[i], host[i].symbol) for i in non_h_indices]
-
-    # Group by element type
-    grouped_by_symbol = {}
-    for i, q, sym in non_h_charges:
-        grouped_by_symbol.setdefault(sym, []).append((i, q))
-
-    placements = []
-
-    for symbol, atoms in grouped_by_symbol.items():
-        if len(atoms) < 3:
-            continue
-
-        atoms.sort(key=lambda x: x[1], reverse=True)
-        selected_atoms = [atoms[0], atoms[len(atoms) // 2], atoms[-1]]  # most+, mid, least+
-
-        for idx, charge in [(a[0], a[1]) for a in selected_atoms]:
-            host_atom = host[idx]
-            pos = host_atom.position
-            radius = covalent_radii[host_atom.number] + guest_covalent_radius + 0.4
-
-            # Place guest in fixed direction
-            guest_pos = pos + direction / np.linalg.norm(direction) * radius
-            guest_shifted = guest.copy()
-            guest_shifted.translate(guest_pos - guest.get_center_of_mass())
-
-            if check_no_overlap(host, guest_shifted):
-                combined = host + guest_shifted
-                placements.append((charge, combined))
-            else:
-                print(f"Overlap detected for atom {symbol} with charge {charge:.2f}, skipping.")
-
-    # Sort all by charge from most positive to most negative
-    placements.sort(key=lambda x: x[0], reverse=True)
-
-    # Select exactly 7 spaced structures
-    if len(placements) >= 7:
-        indices = np.linspace(0, len(placements) - 1, 7, dtype=int)
-        final_complexes = [placements[i][1] for i in indices]
-    else:
-        final_complexes = [x[1] for x in placements]
-
-    return final_complexes
-
-
-def generate_guest_complexes3(host: Atoms, guest: Atoms, charges: list) -> list:
-    assert len(host) == len(charges), "Host and charges must be the same length"
-
-    guest_symbols = [atom.symbol for atom in guest]
-    guest_covalent_radius = max(covalent_radii[atomic_numbers[s]] for s in guest_symbols)
-
-    # Filter out hydrogens
-    non_h_indices = [i for i, atom in enumerate(host) if atom.symbol != 'H']
-    non_h_charges = [(i, charges[i], host[i].symbol) for i in non_h_indices]
-
-    # Group by atom type
-    grouped_by_symbol = {}
-    for i, q, sym in non_h_charges:
-        grouped_by_symbol.setdefault(sym, []).append((i, q))
-
-    placements = []
-
-    # Directions to try, normalized
-    trial_directions = np.array([
-        [1, 0, 0], [0, 1, 0], [0, 0, 1],
-        [-1, 0, 0], [0, -1, 0], [0, 0, -1],
-        [1, 1, 0], [-1, 1, 0], [1, -1, 0], [0, 1, 1],
-        [1, 0, 1], [1, 1, 1], [-1, -1, -1]
-    ])
-    trial_directions = [v / np.linalg.norm(v) for v in trial_directions]
-
-    for symbol, atoms in grouped_by_symbol.items():
-        if len(atoms) < 3:
-            continue
-        atoms.sort(key=lambda x: x[1], reverse=True)
-
-        selected_atoms = [atoms[0], atoms[len(atoms) // 2], atoms[-1]]
-
-        for idx, charge in [(a[0], a[1]) for a in selected_atoms]:
-            host_atom = host[idx]
-            pos = host_atom.position
-            host_radius = covalent_radii[host_atom.number]
-            placement_successful = False
-
-            for direction in trial_directions:
-                radius = host_radius + guest_covalent_radius + 0.4
-                guest_pos = pos + direction * radius
-
-                guest_shifted = guest.copy()
-                guest_shifted.translate(guest_pos - guest.get_center_of_mass())
-
-                if check_no_overlap(host, guest_shifted):
-                    combined = host + guest_shifted
-                    placements.append((charge, combined))
-                    placement_successful = True
-                    break
-
-            if not placement_successful:
-                print(f"Could not place guest near {symbol} (charge: {charge:.2f}) due to overlap.")
-
-    # Sort all placements by charge (descending)
-    placements.sort(key=lambda x: x[0], reverse=True)
-
-    # Choose exactly 7 spaced structures
-    if len(placements) >= 7:
-        indices = np.linspace(0, len(placements) - 1, 7, dtype=int)
-        final_complexes = [placements[i][1] for i in indices]
-    else:
-        final_complexes = [x[1] for x in placements]
-
-    return final_complexes
+    """Final geometry of an ADF output, periodic when a lattice is given."""
+    return _as_index(data).get_ase_atom()
+
+
+def generate_guest_complexes(host: Atoms, guest: Atoms, charges: list, symmetry_reduce=False) -> list:
+    """
+    Place the guest next to charge-selected host atoms, trying the six axis
+    directions and keeping the first one without overlap. With
+    ``symmetry_reduce`` only one site per symmetry orbit is used.
+    """
+    sites = select_host_sites(host, charges, symmetry_reduce=symmetry_reduce)
+    placements, _ = place_guest_at_sites(host, guest, sites, sampler='axes', selection='first')
+    return spaced_selection(placements, 7)
+
+
+def generate_guest_complexes2(host: Atoms, guest: Atoms, charges: list, direction=np.array([1.0, 0.0, 0.0]),
+                              symmetry_reduce=False) -> list:
+    """
+    Place the guest next to charge-selected host atoms along one fixed
+    direction, skipping sites where it overlaps. With ``symmetry_reduce``
+    only one site per symmetry orbit is used.
+    """
+    sites = select_host_sites(host, charges, symmetry_reduce=symmetry_reduce)
+    placements, failed = place_guest_at_sites(host, guest, sites,
+                                              sampler=fixed_direction(direction),
+                                              selection='first')
+    for _, charge, symbol in failed:
+        print(f"Overlap detected for atom {symbol} with charge {charge:.2f}, skipping.")
+    return spaced_selection(placements, 7)
+
+
+def generate_guest_complexes3(host: Atoms, guest: Atoms, charges: list, symmetry_reduce=False) -> list:
+    """
+    Place the guest next to charge-selected host atoms, trying 13
+    hand-picked directions and keeping the first one without overlap. With
+    ``symmetry_reduce`` only one site per symmetry orbit is used.
+    """
+    sites = select_host_sites(host, charges, symmetry_reduce=symmetry_reduce)
+    placements, failed = place_guest_at_sites(host, guest, sites, sampler='legacy', selection='first')
+    for _, charge, symbol in failed:
+        print(f"Could not place guest near {symbol} (charge: {charge:.2f}) due to overlap.")
+    return spaced_selection(placements, 7)
 
 def get_test_charges(data):
-    charge = []
-    section = get_section(data, 'Mulliken Charges', 'Total ', start_offset=3, stop_offset=-1)
-    for lines in section:
-        line = float(lines.split()[2])
-        charge.append(line)
-    return charge
+    """Mulliken charges of the final geometry of a DFTB output."""
+    return _as_index(data).get_test_charges().tolist()
 
 
 def get_test_atom(data):
-    element = []
-    coords = []
-    lattice = []
-    all_data = []
-    indices = []
-
-    section = get_section(data, 'Index Symbol   x (angstrom)   y (angstrom)   z (angstrom)', 'Lattice vectors (angstrom)', 1, -2)
-
-    for lines in section:
-        line = lines.split()
-        element.append(line[1])
-        coords.append([float(i) for i in line[2:]])
-
-    for i, lines in enumerate(data):
-        all_data.append(lines.split())
-        if "Lattice vectors" in lines:
-            indices.append(i)
-    index = indices[-1]
-    vec1 = [float(i) for i in all_data[index+1][1:]]
-    vec2 = [float(i) for i in all_data[index+2][1:]]
-    vec3 = [float(i) for i in all_data[index+3][1:]]
-    lattice = [vec1, vec2, vec3]
-    ase_atom = Atoms(symbols=element, positions=coords, cell=lattice)
-    return ase_atom
-
-
-
-
-def generate_ams_neb_input(complexes: list, neb_name: str = "NEBJob", directory="neb_input"):
+    """Final geometry of a DFTB output, periodic when a lattice is given."""
+    return _as_index(data).get_test_atom()
+
+
+def format_atoms_block(symbols, positions):
+    """
+    Format the ``Atoms`` lines of an AMS system block in one pass.
+
+    **parameters:**
+        symbols (list): Element symbols.
+        positions (np.ndarray): [n, 3] Cartesian positions in Å.
+
+    **returns:**
+        str: One ``symbol x y z`` line per atom.
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    rows = np.empty((len(positions), 4), dtype=object)
+    rows[:, 0] = symbols
+    rows[:, 1:] = positions
+    return ('%-2s %10.6f %10.6f %10.6f\n' * len(rows)) % tuple(rows.ravel().tolist())
+
+
+def format_lattice_block(cell):
+    """Format the ``Lattice`` block of an AMS system block."""
+    cell = np.asarray(cell, dtype=float).reshape(3, 3)
+    return "  Lattice\n" + (' %10.6f %10.6f %10.6f\n' * 3) % tuple(cell.ravel().tolist()) + "  End\n"
+
+
+def format_constraints_block(n_host_atoms):
+    """Format the ``Constraints`` block fixing the first ``n_host_atoms`` atoms."""
+    return ("  Constraints\n"
+            "    Atoms\n"
+            "      " + " ".join(map(str, range(1, n_host_atoms + 1))) + " : Fixed\n"  # AMS uses 1-based indexing
+            "    End\n"
+            "  End\n")
+
+
+def generate_ams_neb_input(complexes: list,
+                           neb_name: str = "NEBJob",
+                           directory="neb_input",
+                           n_images=30,
+                           n_host_atoms=None,
+                           archive=False,
+                           interpolate=None):
+    """
+    Write an AMS NEB run script for a sequence of host-guest complexes.
+
+    The first and last complexes are the initial and final systems, the
+    others are written as intermediates. The whole script is assembled in
+    memory and written at once: the host coordinate lines, the lattice and
+    the fixed-atom constraint list are formatted once and reused by every
+    image that shares them, only the guest lines are formatted per image.
+
+    **parameters:**
+        complexes (list of Atoms): Host + guest complexes, guest last.
+        neb_name (str): Name of the ``.run`` script.
+        directory (str): Output directory.
+        n_images (int): Number of NEB images.
+        n_host_atoms (int, optional): Number of leading host atoms that are
+            fixed. Defaults to all but the last atom.
+        archive (bool): Also write a gzip compressed ``.run.gz`` copy.
+        interpolate (str, optional): ``'linear'`` or ``'idpp'`` to write
+            interpolated guest images between the complexes (see
+            :func:`mofbattery.prop.neb_path.interpolate_path`) instead of
+            leaving the initial path to AMS. The supplied intermediate
+            complexes are kept, so ``n_images`` intermediates are written,
+            or one per complex when there are more, and ``Images`` matches
+            their number.
+
+    **returns:**
+        str: Path to the ``.run`` script.
+    """
     assert len(complexes) >= 2, "At least two complexes required for NEB"
     os.makedirs(directory, exist_ok=True)
 
+    if n_host_atoms is None:
+        n_host_atoms = len(complexes[0]) - 1  # assumes a single guest atom added at the end
+    if interpolate is not None:
+        # the supplied intermediate complexes count towards the n_images
+        n_new = max(n_images - (len(complexes) - 2), 0)
+        complexes = interpolate_path(complexes, n_new, method=interpolate, n_host_atoms=n_host_atoms)
+        n_images = len(complexes) - 2
+
     initial = complexes[0]
     final = complexes[-1]
     intermediates = complexes[1:-1]
-    all_images = [initial] + intermediates + [final]
-    n_host_atoms = len(complexes[0]) - len(complexes[0][-1:])  # assumes guest is added at the end
+
+    host_symbols = initial.get_chemical_symbols()[:n_host_atoms]
+    host_positions = initial.positions[:n_host_atoms]
+    host_text = format_atoms_block(host_symbols, host_positions)
+    constraints_text = format_constraints_block(n_host_atoms)
+    lattice_text = {}
+
+    def system_block(name, atoms):
+        symbols = atoms.get_chemical_symbols()
+        if symbols[:n_host_atoms] == host_symbols and \
+                np.array_equal(atoms.positions[:n_host_atoms], host_positions):
+            atoms_text = host_text + format_atoms_block(symbols[n_host_atoms:], atoms.positions[n_host_atoms:])
+        else:
+            atoms_text = format_atoms_block(symbols, atoms.positions)
+
+        block = [f"System {name}\n", "  Atoms\n", atoms_text, "  End\n"]
+        if atoms.get_pbc().any():
+            cell = np.array(atoms.get_cell())
+            key = cell.tobytes()
+            if key not in lattice_text:
+                lattice_text[key] = format_lattice_block(cell)
+            block.append(lattice_text[key])
+        block.extend([constraints_text, "End\n"])
+        return block
+
+    text = ["#!/bin/sh\n\n",
+            "$AMSBIN/ams <<eor\n",
+            "Task NEB\n",
+            "NEB\n",
+            f"  Images {n_images}\n",
+            "End\n"]
+    text.extend(system_block("Initial", initial))
+    for i, intermediate in enumerate(intermediates):
+        text.extend(system_block(f"Intermediate-{i+1}", intermediate))
+    text.extend(system_block("Final", final))
+    text.extend(["Engine DFTB\n",
+                 "EndEngine\n",
+                 "eor\n"])
+    text = "".join(text)
 
     neb_input_path = os.path.join(directory, f"{neb_name}.run")
     with open(neb_input_path, "w") as f:
-        f.write("#!/bin/sh\n\n")
-        f.write("$AMSBIN/ams <<eor\n")
-        f.write("Task NEB\n")
-        f.write("NEB\n")
-        f.write("  Images 30\n")
-        f.write("End\n")
-
-        def write_system_block(name, atoms):
-            f.write(f"System {name}\n")
-            f.write("  Atoms\n")
-            for atom in atoms:
-                f.write(f"{atom.symbol:<2} {atom.position[0]:>10.6f} {atom.position[1]:>10.6f} {atom.position[2]:>10.6f}\n")
-            f.write("  End\n")
-
-            if atoms.get_pbc().any():
-                f.write("  Lattice\n")
-                for vec in atoms.get_cell():
-                    f.write(f" {vec[0]:>10.6f} {vec[1]:>10.6f} {vec[2]:>10.6f}\n")
-                f.write("  End\n")
-
-            f.write("  Constraints\n")
-            f.write("    Atoms\n")
-            f.write("      ")
-            f.write(" ".join(str(i+1) for i in range(n_host_atoms)))  # AMS uses 1-based indexing
-            f.write(" : Fixed\n")
-            f.write("    End\n")
-            f.write("  End\n")
-            f.write("End\n")
-
-        # Write initial system
-        write_system_block("Initial", initial)
-
-        # Write intermediates
-        for i, intermediate in enumerate(intermediates):
-            write_system_block(f"Intermediate-{i+1}", intermediate)
-
-        # Write final system
-        write_system_block("Final", final)
-
-        f.write("Engine DFTB\n")
-        f.write("EndEngine\n")
-        f.write("eor\n")
-
+        f.write(text)
     os.chmod(neb_input_path, 0o755)
-    print(f"NEB input written to {neb_input_path}")
-
-
-
-
-
-# #host_path = '../Saturation/MOFs/Al_cluster_1/DUMJAY_fair_gfn_opt.out'
 
-# host_path = sorted(glob.glob( "/Volumes/scratch/hpc-prf-pfmof/Battery_Result_folder/Redox/MOFs_bands/*/*opt.out"))
-# guest_path = '../Saturation/metal_atoms/'
+    if archive:
+        with gzip.open(f"{neb_input_path}.gz", "wt") as f:
+            f.write(text)
 
-# ned_path = '../NEB'
-
-# for host_file in host_path:
-#     basename = os.path.basename(host_file).split('_')[0]
-#     foldername = host_file.split('/')[-2]
-#     try:
-#         data = filetyper.get_contents(host_file)
-
-#         atom_name = foldername.split('_c')[0]
-#         guest_atom = read(f'{guest_path}/{atom_name}.xyz' )
-#         _, charges = get_charge(data)
-#         host_atom = get_ase_atom(data)
-
-#         complexes = generate_guest_complexes3(host_atom, guest_atom, charges)
-#         final_neb_folder = f'{ned_path}/{foldername}'
-#         if len(complexes) < 4:
-#             complexes = generate_guest_complexes(host_atom, guest_atom, charges)
-
-#         generate_ams_neb_input(complexes, neb_name=basename,directory=final_neb_folder)
-
-#         print(basename, foldername, atom_name)
-#     except Exception:
-#         print ('failed', foldername, basename)
-
-
-#guest = read('../Saturation/metal_atoms/Al.xyz')
-#data = filetyper.get_contents(host_path)
-
-#charges = get_test_charges(data)
-#host_atoms = get_test_atom(data)
-#
-#complexes = generate_guest_complexes3(host_atoms, guest, charges)
-#generate_ams_neb_input(complexes)
+    print(f"NEB input written to {neb_input_path}")
+    return neb_input_path
@@ -0,0 +1,196 @@
+import numpy as np
+from ase import Atoms
+
+
+def minimum_image(vectors, cell, pbc):
+    """
+    Minimum image of displacement vectors by rounding their fractional
+    coordinates along the periodic directions.
+
+    **parameters:**
+        vectors (np.ndarray): [..., 3] Cartesian displacements.
+        cell (np.ndarray): [3, 3] lattice vectors.
+        pbc (array-like): Periodic directions.
+
+    **returns:**
+        np.ndarray: [..., 3] minimum image displacements.
+    """
+    pbc = np.asarray(pbc, dtype=bool)
+    if not pbc.any():
+        return vectors
+    frac = vectors @ np.linalg.inv(cell)
+    frac = frac - np.where(pbc, np.round(frac), 0.0)
+    return frac @ cell
+
+
+def _guest_indices(initial, final, n_host_atoms):
+    """Host size and sanity checks shared by the interpolators."""
+    if n_host_atoms is None:
+        n_host_atoms = len(initial) - 1  # assumes a single guest atom added at the end
+    assert len(initial) == len(final), "Initial and final systems must have the same atoms"
+    assert initial.get_chemical_symbols() == final.get_chemical_symbols(), \
+        "Initial and final systems must have the same atom order"
+    assert np.allclose(initial.positions[:n_host_atoms], final.positions[:n_host_atoms]), \
+        "The host must be identical in the initial and final systems"
+    return n_host_atoms
+
+
+def linear_guest_path(initial: Atoms, final: Atoms, n_images, n_host_atoms=None):
+    """
+    Linearly interpolate the guest atoms between two complexes, keeping the
+    host fixed. The guest displacement is taken under the minimum image
+    convention, so a guest hopping through a cell face takes the short way.
+
+    **parameters:**
+        initial (Atoms): Initial host + guest complex, guest last.
+        final (Atoms): Final complex with the same host.
+        n_images (int): Number of intermediate images.
+        n_host_atoms (int, optional): Number of leading host atoms. Defaults
+            to all but the last atom.
+
+    **returns:**
+        np.ndarray: [n_images + 2, n_guest, 3] guest positions, endpoints
+        included.
+    """
+    n_host_atoms = _guest_indices(initial, final, n_host_atoms)
+    start = initial.positions[n_host_atoms:]
+    shift = minimum_image(final.positions[n_host_atoms:] - start, initial.get_cell(), initial.get_pbc())
+    t = np.linspace(0.0, 1.0, n_images + 2)
+    return start[None, :, :] + t[:, None, None] * shift[None, :, :]
+
+
+def _idpp_pairs(guest, host, cell, pbc):
+    """Guest-host and guest-guest pair distances and displacements of all images."""
+    guest_host = minimum_image(guest[:, :, None, :] - host[None, None, :, :], cell, pbc)
+    guest_guest = minimum_image(guest[:, :, None, :] - guest[:, None, :, :], cell, pbc)
+    return guest_host, guest_guest
+
+
+def idpp_guest_path(initial: Atoms,
+                    final: Atoms,
+                    n_images,
+                    n_host_atoms=None,
+                    cutoff=6.0,
+                    steps=500,
+                    max_step=0.1,
+                    fmax=0.01):
+    """
+    Image dependent pair potential (IDPP) interpolation of the guest atoms
+    with the host fixed.
+
+    Every image targets pair distances that are linearly interpolated
+    between the endpoint distances, weighted by ``1 / d**4`` so that close
+    contacts dominate. Only guest-host pairs within ``cutoff`` of the linear
+    path and guest-guest pairs are included, and all images are relaxed
+    together by steepest descent starting from :func:`linear_guest_path`.
+
+    **parameters:**
+        initial (Atoms): Initial host + guest complex, guest last.
+        final (Atoms): Final complex with the same host.
+        n_images (int): Number of intermediate images.
+        n_host_atoms (int, optional): Number of leading host atoms.
+        cutoff (float): Host atoms farther than this from the linear path
+            are ignored, in Å.
+        steps (int): Maximum number of descent steps.
+        max_step (float): Largest displacement of an atom per step, in Å.
+        fmax (float): Stop when no guest gradient exceeds this value.
+
+    **returns:**
+        np.ndarray: [n_images + 2, n_guest, 3] guest positions, endpoints
+        included.
+    """
+    n_host_atoms = _guest_indices(initial, final, n_host_atoms)
+    cell, pbc = np.array(initial.get_cell()), initial.get_pbc()
+    path = linear_guest_path(initial, final, n_images, n_host_atoms)
+    if n_images == 0:
+        return path
+
+    host = initial.positions[:n_host_atoms]
+    distance = np.linalg.norm(minimum_image(path[:, :, None, :] - host[None, None, :, :], cell, pbc), axis=-1)
+    host = host[np.any(distance < cutoff, axis=(0, 1))]
+
+    guest_host, guest_guest = _idpp_pairs(path[[0, -1]], host, cell, pbc)
+    t = np.linspace(0.0, 1.0, n_images + 2)[1:-1, None, None]
+    d_host = np.linalg.norm(guest_host, axis=-1)
+    d_guest = np.linalg.norm(guest_guest, axis=-1)
+    target_host = d_host[0] + t * (d_host[1] - d_host[0])
+    target_guest = d_guest[0] + t * (d_guest[1] - d_guest[0])
+    off_diagonal = ~np.eye(path.shape[1], dtype=bool)
+
+    images = path[1:-1].copy()
+    for _ in range(steps):
+        guest_host, guest_guest = _idpp_pairs(images, host, cell, pbc)
+        d_host = np.maximum(np.linalg.norm(guest_host, axis=-1), 1e-6)
+        d_guest = np.where(off_diagonal, np.linalg.norm(guest_guest, axis=-1), 1.0)
+
+        # dS/dd for S = sum w(d) (d - target)^2 with w = d**-4
+        dh = (d_host - target_host) * (2.0 * d_host - 4.0 * (d_host - target_host)) / d_host ** 5
+        dg = (d_guest - target_guest) * (2.0 * d_guest - 4.0 * (d_guest - target_guest)) / d_guest ** 5
+        dg = np.where(off_diagonal, dg, 0.0)
+        gradient = np.einsum('kgh,kghx->kgx', dh / d_host, guest_host) + \
+            2.0 * np.einsum('kgj,kgjx->kgx', dg / d_guest, guest_guest)
+
+        norm = np.linalg.norm(gradient, axis=-1)
+        if norm.max() < fmax:
+            break
+        step = -gradient * np.minimum(1.0, max_step / np.maximum(norm, 1e-12))[..., None]
+        images += step
+    path[1:-1] = images
+    return path
+
+
+INTERPOLATORS = {
+    'linear': linear_guest_path,
+    'idpp': idpp_guest_path,
+}
+
+
+def interpolate_path(complexes, n_images, method='idpp', n_host_atoms=None, **kwargs):
+    """
+    NEB images through a sequence of complexes that share the same host.
+
+    The ``n_images`` intermediate images are distributed over the segments
+    between consecutive complexes in proportion to the guest displacement of
+    each segment, and every segment is interpolated with ``method``. The
+    host coordinates of the first complex are reused by every image.
+
+    **parameters:**
+        complexes (list of Atoms): Host + guest complexes, guest last.
+        n_images (int): Total number of new intermediate images.
+        method (str): ``'linear'`` or ``'idpp'``.
+        n_host_atoms (int, optional): Number of leading host atoms.
+        **kwargs: Passed to :func:`idpp_guest_path`.
+
+    **returns:**
+        list of Atoms: The interpolated path, the supplied complexes
+        included.
+    """
+    if method not in INTERPOLATORS:
+        raise ValueError(f"Unknown interpolation: {method}. Choose from {list(INTERPOLATORS)}.")
+    assert len(complexes) >= 2, "At least two complexes required for a path"
+    if n_host_atoms is None:
+        n_host_atoms = len(complexes[0]) - 1
+
+    cell, pbc = complexes[0].get_cell(), complexes[0].get_pbc()
+    lengths = np.array([np.linalg.norm(minimum_image(b.positions[n_host_atoms:] - a.positions[n_host_atoms:],
+                                                     cell, pbc))
+                        for a, b in zip(complexes[:-1], complexes[1:])])
+    weights = lengths / lengths.sum() if lengths.sum() > 0 else np.full(len(lengths), 1.0 / len(lengths))
+    # largest remainder rounding so the segments add up to n_images
+    share = weights * n_images
+    counts = np.floor(share).astype(int)
+    counts[np.argsort(counts - share)[:n_images - counts.sum()]] += 1
+
+    interpolate = INTERPOLATORS[method]
+    template = complexes[0]
+    images = [template.copy()]
+    for (a, b), count in zip(zip(complexes[:-1], complexes[1:]), counts):
+        if method == 'idpp':
+            guest_path = interpolate(a, b, int(count), n_host_atoms, **kwargs)
+        else:
+            guest_path = interpolate(a, b, int(count), n_host_atoms)
+        for guest_positions in guest_path[1:]:
+            image = template.copy()
+            image.positions[n_host_atoms:] = guest_positions
+            images.append(image)
+    return images
@@ -0,0 +1,114 @@
+import numpy as np
+from ase import Atoms
+from ase.data import covalent_radii
+from mofbattery.prop.clearance_grid import ClearanceGrid
+
+
+def _voxel_stencil(grid, radius):
+    """Integer voxel offsets and their Cartesian vectors within ``radius``."""
+    voxel = grid.cell / np.array(grid.shape)[:, None]
+    heights = abs(np.linalg.det(voxel)) / np.array(
+        [np.linalg.norm(np.cross(voxel[(k + 1) % 3], voxel[(k + 2) % 3])) for k in range(3)])
+    n = np.ceil(radius / heights).astype(int) + 1
+    offsets = np.stack(np.meshgrid(*[np.arange(-k, k + 1) for k in n], indexing='ij'), axis=-1).reshape(-1, 3)
+    vectors = offsets @ voxel
+    keep = np.linalg.norm(vectors, axis=1) <= radius + np.linalg.norm(voxel.sum(axis=0))
+    return offsets[keep], vectors[keep]
+
+
+def saturate(host: Atoms,
+             guest: Atoms,
+             grid=None,
+             max_guests=None,
+             spacing=0.5,
+             tolerance=0.4,
+             return_configurations=False,
+             verbose=False):
+    """
+    Load guests into a host one after another until no feasible site is left.
+
+    Candidate sites are the voxels of a :class:`ClearanceGrid`. The guest
+    centre of mass is put at the most open remaining voxel, the position is
+    checked exactly against the host and all guests loaded so far, and on
+    success the guest is added to the spatial index and the clearance of the
+    voxels around it is lowered in place. Neither the host + guest ``Atoms``
+    nor a distance matrix is rebuilt between insertions.
+
+    **parameters:**
+        host (Atoms): Host framework with a unit cell.
+        guest (Atoms): Guest atom or molecule, e.g. ``Atoms('Li')``.
+        grid (ClearanceGrid, optional): Clearance grid of the empty host,
+            built with ``spacing`` and ``tolerance`` when not given.
+        max_guests (int, optional): Stop after this many guests.
+        spacing (float): Voxel size in Å when the grid is built here.
+        tolerance (float): Extra clearance in Å added to radius sums.
+        return_configurations (bool): Also build the host + guests
+            structure of every loading, which takes time and memory
+            quadratic in the number of guests. The fully loaded structure
+            is always returned.
+        verbose (bool): Print every accepted guest.
+
+    **returns:**
+        dict: ``positions`` ([n_loaded, n_guest_atoms, 3] guest positions in
+        insertion order), ``clearance`` (grid clearance of each accepted
+        site), ``loading`` (number of guests per configuration), ``final``
+        (the host with all guests) and, with ``return_configurations``,
+        ``configurations`` where entry ``k`` holds the host with the first
+        ``k + 1`` guests.
+    """
+    if grid is None:
+        grid = ClearanceGrid(host, spacing=spacing, tolerance=tolerance)
+    index = grid.index.copy()
+
+    guest_radii = covalent_radii[guest.numbers]
+    guest_offsets = guest.positions - guest.get_center_of_mass()
+    # bounding sphere of the guest around its centre of mass
+    required = np.max(np.linalg.norm(guest_offsets, axis=1) + guest_radii) + grid.tolerance
+    offsets, vectors = _voxel_stencil(grid, grid.cutoff + guest_radii.max() + np.linalg.norm(guest_offsets, axis=1).max())
+
+    available = grid.values.copy()
+    shape = np.array(grid.shape)
+    loaded, site_clearance = [], []
+    while max_guests is None or len(loaded) < max_guests:
+        flat = np.argmax(available)
+        best = available.flat[flat]
+        if best < required:
+            break
+        voxel = np.array(np.unravel_index(flat, grid.shape))
+        points = grid.positions(voxel)[0] + guest_offsets
+        if not index.no_overlap(points, guest.numbers):
+            available.flat[flat] = -np.inf
+            continue
+
+        index.add_atoms(points, guest.numbers)
+        loaded.append(points)
+        site_clearance.append(best)
+        if verbose:
+            print(f"Guest {len(loaded)} placed at {np.round(points.mean(axis=0), 3)} (clearance: {best:.2f})")
+
+        for point, radius in zip(points, guest_radii):
+            centre = grid.voxel_index(point)[0]
+            idx = centre + offsets
+            idx = np.where(grid.pbc, idx % shape, idx)
+            inside = np.all((idx >= 0) & (idx < shape), axis=1)
+            idx = idx[inside]
+            distance = np.linalg.norm(grid.positions(centre)[0] + vectors[inside] - point, axis=1) - radius
+            np.minimum.at(available, tuple(idx.T), distance)
+
+    result = {'positions': np.array(loaded).reshape(-1, len(guest), 3),
+              'clearance': np.array(site_clearance),
+              'loading': np.arange(1, len(loaded) + 1)}
+    # all guests in one Atoms, so the final structure is built in one step
+    guests = Atoms(numbers=np.tile(guest.numbers, len(loaded)),
+                   positions=result['positions'].reshape(-1, 3))
+    result['final'] = host + guests
+    if return_configurations:
+        configurations = []
+        current = host.copy()
+        for points in loaded:
+            guest_shifted = guest.copy()
+            guest_shifted.positions = points
+            current = current + guest_shifted
+            configurations.append(current)
+        result['configurations'] = configurations
+    return result
@@ -0,0 +1,217 @@
+import os
+import mmap
+import numpy as np
+from ase import Atoms
+
+# name: (start key, stop key, start offset, stop offset), same convention as
+# mofbattery.prop.neb_complexes.get_section
+SECTIONS = {
+    'aim_charges': ('Atomic Charge Analysis', 'Total:', 8, -2),
+    'geometry': ('G E O M E T R Y    I N    X - Y - Z    F O R M A T', 'Total nr. of atoms:', 3, -2),
+    'mulliken_charges': ('Mulliken Charges', 'Total ', 3, -1),
+    'dftb_geometry': ('Index Symbol   x (angstrom)   y (angstrom)   z (angstrom)',
+                      'Lattice vectors (angstrom)', 1, -2),
+    'lattice': ('Lattice vectors', None, 1, 3),
+}
+
+
+class AMSOutputIndex:
+    """
+    Indexed reader for large AMS/ADF/DFTB text outputs.
+
+    The file is scanned once to record the byte offset of the last
+    occurrence of every section start key. Sections are then parsed
+    directly from those offsets, so only the final block of each quantity is
+    ever decoded, no matter how many optimisation steps the log contains.
+
+    With ``use_mmap=True`` the file is memory-mapped and the last occurrence
+    of each key is found with a reverse search from the end of the file;
+    otherwise the file is streamed line by line in a single forward pass.
+
+    **parameters:**
+        path (str): Path to the ``.out``/``.log`` file.
+        use_mmap (bool): Memory-map the file instead of streaming it.
+        sections (dict, optional): Section definitions, defaults to
+            ``SECTIONS``.
+    """
+
+    def __init__(self, path, use_mmap=True, sections=None):
+        self.path = path
+        self.use_mmap = use_mmap
+        self.sections = SECTIONS if sections is None else sections
+        self.offsets = {}
+        self._file = open(path, 'rb')
+        self._buffer = None
+        if use_mmap and os.path.getsize(path) > 0:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._build_index()
+
+    @classmethod
+    def from_lines(cls, lines, sections=None):
+        """
+        Index an output that was already read into a list of lines, e.g. by
+        ``filetyper.get_contents``. The lines are joined into one in-memory
+        buffer, which is searched like a memory-mapped file.
+
+        **parameters:**
+            lines (list of str): Lines of the output, with or without line
+                endings.
+            sections (dict, optional): Section definitions, defaults to
+                ``SECTIONS``.
+
+        **returns:**
+            AMSOutputIndex: Index over the lines.
+        """
+        index = cls.__new__(cls)
+        index.path = '<lines>'
+        index.use_mmap = True
+        index.sections = SECTIONS if sections is None else sections
+        index.offsets = {}
+        index._file = None
+        index._buffer = ''.join(line if line.endswith('\n') else line + '\n' for line in lines).encode()
+        index._build_index()
+        return index
+
+    def close(self):
+        """Release the memory map and file handle."""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._buffer = None
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _build_index(self):
+        """Record the line offset of the last occurrence of every start key."""
+        keys = {name: spec[0].encode() for name, spec in self.sections.items()}
+        if self._buffer is not None:
+            for name, key in keys.items():
+                pos = self._buffer.rfind(key)
+                if pos >= 0:
+                    self.offsets[name] = self._buffer.rfind(b'\n', 0, pos) + 1
+            return
+
+        offset = 0
+        self._file.seek(0)
+        for line in self._file:
+            for name, key in keys.items():
+                if key in line:
+                    self.offsets[name] = offset
+            offset += len(line)
+
+    def _iter_lines(self, offset):
+        """Yield decoded lines starting at a byte offset."""
+        if self._buffer is not None:
+            buffer = self._buffer
+            end = len(buffer)
+            while offset < end:
+                stop = buffer.find(b'\n', offset)
+                stop = end if stop < 0 else stop + 1
+                yield buffer[offset:stop].decode(errors='replace')
+                offset = stop
+        else:
+            self._file.seek(offset)
+            for line in self._file:
+                yield line.decode(errors='replace')
+
+    def has_section(self, name):
+        """Whether the start key of a section occurs in the file."""
+        return name in self.offsets
+
+    def section_lines(self, name):
+        """
+        Lines of the last occurrence of a section.
+
+        Follows ``get_section``: skip ``start_offset`` lines from the start
+        key, read up to and including the first line containing the stop
+        key and add ``stop_offset`` lines to the end index. Sections without
+        a stop key return ``stop_offset`` lines.
+
+        **parameters:**
+            name (str): Section name in ``sections``.
+
+        **returns:**
+            list of str: Section lines.
+        """
+        if name not in self.offsets:
+            raise KeyError(f"Section '{name}' not found in {self.path}")
+        _, stop_key, start_offset, stop_offset = self.sections[name]
+
+        lines = []
+        n_lines = None
+        for i, line in enumerate(self._iter_lines(self.offsets[name])):
+            if i < start_offset:
+                continue
+            lines.append(line)
+            if n_lines is None:
+                if stop_key is None:
+                    n_lines = stop_offset
+                elif stop_key in line:
+                    n_lines = len(lines) + stop_offset
+            if n_lines is not None and len(lines) >= n_lines:
+                return lines[:max(n_lines, 0)]
+        if n_lines is None:
+            raise ValueError(f"Stop key '{stop_key}' of section '{name}' not found in {self.path}")
+        return lines
+
+    def _columns(self, name):
+        """Split the lines of a section into whitespace separated fields."""
+        return [line.split() for line in self.section_lines(name)]
+
+    def get_charge(self):
+        """
+        AIM charges of the final geometry.
+
+        **returns:**
+            tuple: Element symbols (list) and AIM charges (np.ndarray).
+        """
+        parts = self._columns('aim_charges')
+        elements = [p[1] for p in parts]
+        return elements, np.array([p[6] for p in parts], dtype=float)
+
+    def get_ase_atom(self):
+        """
+        Final geometry from the ``G E O M E T R Y    I N    X - Y - Z`` block.
+
+        **returns:**
+            ase.Atoms: Final structure with its lattice vectors, periodic
+            when a lattice is given.
+        """
+        parts = self._columns('geometry')
+        cell = np.array([p[1:] for p in parts if p[0].startswith('VEC')], dtype=float)
+        atoms = [p for p in parts if not p[0].startswith('VEC')]
+        positions = np.array([p[1:] for p in atoms], dtype=float).reshape(-1, 3)
+        return Atoms(symbols=[p[0] for p in atoms],
+                     positions=positions,
+                     cell=cell if len(cell) else None,
+                     pbc=len(cell) > 0)
+
+    def get_test_charges(self):
+        """
+        Mulliken charges of the final geometry.
+
+        **returns:**
+            np.ndarray: Mulliken charges.
+        """
+        return np.array([p[2] for p in self._columns('mulliken_charges')], dtype=float)
+
+    def get_test_atom(self):
+        """
+        Final geometry from the DFTB ``Index Symbol x y z`` table and the last
+        ``Lattice vectors`` block.
+
+        **returns:**
+            ase.Atoms: Final structure, periodic when a lattice is given.
+        """
+        parts = self._columns('dftb_geometry')
+        positions = np.array([p[2:] for p in parts], dtype=float).reshape(-1, 3)
+        lattice = np.array([p[1:] for p in self._columns('lattice')], dtype=float)
+        return Atoms(symbols=[p[1] for p in parts],
+                     positions=positions,
+                     cell=lattice if len(lattice) else None,
+                     pbc=len(lattice) > 0)
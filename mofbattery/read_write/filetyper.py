@@ -50,6 +50,90 @@ def write_minified_json_gz(data, output_path='data_min.json.gz', precision=4):
     print(f"Saved minified, compressed JSON to {output_path}")
 
 
+ARRAY_CACHE_MAGIC = b'MOFBARR1'
+ARRAY_CACHE_ALIGNMENT = 64
+
+
+def write_array_cache(path, arrays, metadata=None):
+    """
+    Save NumPy arrays losslessly as raw binary blocks behind a JSON header.
+
+    The file starts with an 8 byte magic, the header length as a little
+    endian uint64 and the JSON header listing dtype, shape and offset of
+    every array, followed by the raw array data aligned to 64 bytes. The
+    file is written to a temporary name and moved into place, so readers
+    never see a half written cache.
+
+    Args:
+        path (str): Output path.
+        arrays (dict): Name to NumPy array.
+        metadata (dict, optional): JSON serialisable extra information.
+    """
+    arrays = {name: np.ascontiguousarray(value) for name, value in arrays.items()}
+    layout, offset = {}, 0
+    for name, value in arrays.items():
+        offset = -(-offset // ARRAY_CACHE_ALIGNMENT) * ARRAY_CACHE_ALIGNMENT
+        layout[name] = {'dtype': value.dtype.str, 'shape': list(value.shape), 'offset': offset}
+        offset += value.nbytes
+    header = json.dumps({'metadata': metadata or {}, 'arrays': layout}, cls=NumpyJSONEncoder).encode()
+    data_start = -(-(len(ARRAY_CACHE_MAGIC) + 8 + len(header)) // ARRAY_CACHE_ALIGNMENT) * ARRAY_CACHE_ALIGNMENT
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(ARRAY_CACHE_MAGIC)
+        f.write(np.uint64(len(header)).astype('<u8').tobytes())
+        f.write(header)
+        for name, value in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(value.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_array_cache_header(path):
+    """
+    Read the JSON header of an array cache without touching the arrays.
+
+    Args:
+        path (str): Cache path.
+
+    Returns:
+        tuple: The header dict and the byte offset of the array data.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(ARRAY_CACHE_MAGIC)) != ARRAY_CACHE_MAGIC:
+            raise ValueError(f"{path} is not an array cache")
+        header_length = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+        header = json.loads(f.read(header_length).decode())
+    data_start = -(-(len(ARRAY_CACHE_MAGIC) + 8 + header_length) // ARRAY_CACHE_ALIGNMENT) * ARRAY_CACHE_ALIGNMENT
+    return header, data_start
+
+
+def read_array_cache(path, mmap=True):
+    """
+    Load an array cache written by :func:`write_array_cache`.
+
+    Args:
+        path (str): Cache path.
+        mmap (bool): Memory-map the arrays read-only instead of reading
+            them into memory.
+
+    Returns:
+        tuple: Dict of arrays and the metadata dict.
+    """
+    header, data_start = read_array_cache_header(path)
+    arrays = {}
+    for name, info in header['arrays'].items():
+        dtype = np.dtype(info['dtype'])
+        shape = tuple(info['shape'])
+        count = int(np.prod(shape))
+        if mmap and count > 0:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=data_start + info['offset'], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=count,
+                                       offset=data_start + info['offset']).reshape(shape)
+    return arrays, header['metadata']
+
+
 def load_data(file_path):
     """
     Load data from a file based on its type.
@@ -0,0 +1,147 @@
+"""
+Direct NumPy reads of large numeric KF/RKF variables.
+
+``KFFile.read`` decodes a variable into a Python list of floats before it
+can be turned into an array, so a ``[n_rows, n_columns]`` matrix is
+materialised several times. The functions here walk the same data blocks
+as ``read_rkf.parserkf.KFReader`` but view each block with
+``np.frombuffer`` over a memory map and copy only the requested columns
+into a preallocated output array.
+"""
+
+import mmap
+import numpy as np
+
+# KFReader variable types
+KF_INTEGER = 1
+KF_DOUBLE = 2
+
+
+def _variable_location(reader, section, variable):
+    """Type, first logical block, start position and length of a variable."""
+    if reader._sections is None:
+        reader._create_index()
+    try:
+        return reader._sections[section][variable]
+    except KeyError:
+        raise KeyError(f'Variable {variable} not present in section {section} of {reader.path}')
+
+
+def iter_variable_chunks(reader, buffer, section, variable):
+    """
+    Yield the values of a numeric variable block by block as NumPy views.
+
+    **parameters:**
+        reader (KFReader): Reader of the file, e.g. ``KFFile(path).reader``.
+        buffer (mmap.mmap): Read-only memory map of the same file.
+        section (str): Section name.
+        variable (str): Variable name.
+
+    **yields:**
+        np.ndarray: Consecutive, non-overlapping pieces of the variable.
+    """
+    vtype, vlb, vstart, vlen = _variable_location(reader, section, variable)
+    if vtype not in (KF_INTEGER, KF_DOUBLE):
+        raise TypeError(f'{section}%{variable} is not a numeric variable')
+
+    word = reader._sizes[reader.word]
+    word_dtype = np.dtype(f'{reader.endian}i{word}')
+    double_dtype = np.dtype(f'{reader.endian}f8')
+    header_length = 4 * word
+
+    remaining = vlen
+    skip = vstart - 1
+    for block in reader._datablocks(reader._data[section], vlb):
+        offset = (block - 1) * reader._blocksize
+        n_int, n_double, _, _ = np.frombuffer(buffer, dtype=word_dtype, count=4, offset=offset)
+        if vtype == KF_DOUBLE:
+            values = np.frombuffer(buffer, dtype=double_dtype, count=int(n_double),
+                                   offset=offset + header_length + int(n_int) * word)
+        else:
+            values = np.frombuffer(buffer, dtype=word_dtype, count=int(n_int),
+                                   offset=offset + header_length)
+        values = values[skip:skip + remaining]
+        skip = 0
+        remaining -= len(values)
+        yield values
+        if remaining <= 0:
+            return
+
+
+def read_kf_array(reader, section, variable, dtype=None):
+    """
+    Read a numeric variable straight into a preallocated NumPy array.
+
+    **parameters:**
+        reader (KFReader): Reader of the file.
+        section (str): Section name.
+        variable (str): Variable name.
+        dtype (np.dtype, optional): Output dtype, defaults to float64 for
+            real and int64 for integer variables.
+
+    **returns:**
+        np.ndarray: [n] values.
+    """
+    vtype, _, _, vlen = _variable_location(reader, section, variable)
+    if dtype is None:
+        dtype = np.float64 if vtype == KF_DOUBLE else np.int64
+    out = np.empty(vlen, dtype=dtype)
+    with open(reader.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        position = 0
+        for values in iter_variable_chunks(reader, buffer, section, variable):
+            out[position:position + len(values)] = values
+            position += len(values)
+        # release the last view so the memory map can close
+        values = None
+    return out
+
+
+def read_kf_matrix_window(reader, section, variable, n_columns, start=0, stop=None, dtype=np.float32):
+    """
+    Read columns ``start:stop`` of a row-major ``[n_rows, n_columns]``
+    variable, without ever holding the full matrix.
+
+    Only the requested columns of every block are converted and copied into
+    a preallocated ``[n_rows, stop - start]`` array.
+
+    **parameters:**
+        reader (KFReader): Reader of the file.
+        section (str): Section name.
+        variable (str): Variable name.
+        n_columns (int): Length of one row, e.g. the number of energies.
+        start (int): First column.
+        stop (int, optional): End column (exclusive), defaults to
+            ``n_columns``.
+        dtype (np.dtype): Output dtype.
+
+    **returns:**
+        np.ndarray: [n_rows, stop - start] window.
+    """
+    if stop is None:
+        stop = n_columns
+    _, _, _, vlen = _variable_location(reader, section, variable)
+    if vlen % n_columns:
+        raise ValueError(f'{section}%{variable} has {vlen} values, not a multiple of {n_columns}')
+    n_rows = vlen // n_columns
+    width = stop - start
+    out = np.empty((n_rows, width), dtype=dtype)
+    if width <= 0 or n_rows == 0:
+        return out
+    flat = out.reshape(-1)
+
+    with open(reader.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        position = 0
+        for values in iter_variable_chunks(reader, buffer, section, variable):
+            first = position
+            position += len(values)
+            # rows touched by this chunk
+            row0, row1 = first // n_columns, (position - 1) // n_columns
+            for row in range(row0, row1 + 1):
+                lo = max(row * n_columns + start, first)
+                hi = min(row * n_columns + stop, position)
+                if lo < hi:
+                    target = row * width + (lo - row * n_columns - start)
+                    flat[target:target + hi - lo] = values[lo - first:hi - first]
+        # release the last view so the memory map can close
+        values = None
+    return out